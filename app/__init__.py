@@ -1,10 +1,23 @@
-from flask import Flask
+from flask import Flask, jsonify
 from app.config import Config
+from app.cache import init_post_cache
+from app.contact_imports import init_contact_imports
+from app.db import init_db_pool
+from app.events import init_comment_events
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    init_db_pool(app)
+    init_post_cache(app)
+    init_comment_events(app)
+    init_contact_imports(app)
+
+    @app.errorhandler(413)
+    def request_entity_too_large(e):
+        return jsonify({'error': 'Request body is too large.'}), 413
+
     # Register Blueprints
     from app.endpoints.contacts import contacts_bp
     from app.endpoints.users import users_bp
@@ -15,4 +28,10 @@ def create_app():
     app.register_blueprint(posts_bp, url_prefix='/posts')
     app.register_blueprint(comments_bp, url_prefix='/comments')
 
+    # Maintenance commands (flask --app run <command>)
+    from app.purge import purge_deleted_command
+    app.cli.add_command(purge_deleted_command)
+    from app.contact_imports import run_contact_imports_command
+    app.cli.add_command(run_contact_imports_command)
+
     return app
@@ -0,0 +1,257 @@
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import current_app
+
+
+class TTLCache:
+    """
+    Small thread-safe in-process cache with per-entry expiry and LRU eviction.
+
+    Entries are dropped when their TTL elapses or, once `maxsize` entries are
+    held, when they are the least recently used. `hits` and `misses` count
+    lookups so callers can report the cache's effectiveness. Counters kept with
+    incr() live in a separate map that LRU eviction does not touch.
+    """
+
+    def __init__(self, maxsize=1024, default_ttl=None):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._versions.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def get_version(self, key):
+        """
+        Current value of a counter maintained by incr(), 0 if there is none.
+        """
+        with self._lock:
+            entry = self._versions.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                return entry[0]
+            return 0
+
+    def incr(self, key, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            now = time.monotonic()
+            entry = self._versions.get(key)
+            value = 1
+            if entry is not None and (entry[1] is None or entry[1] > now):
+                value = entry[0] + 1
+            self._versions[key] = (value, now + ttl if ttl is not None else None)
+            if len(self._versions) > max(self.maxsize, 1024):
+                # Counters are never evicted while live; drop the expired ones.
+                self._versions = {
+                    k: v for k, v in self._versions.items() if v[1] is None or v[1] > now
+                }
+            return value
+
+
+class RedisCache:
+    """
+    TTLCache-compatible front for a shared Redis (or Valkey) server, so every
+    worker process sees the same entries. Values are pickled; only point this
+    at a trusted, private server. Counters (incr/get_version) are stored as plain
+    Redis integers and are not readable with get().
+    """
+
+    def __init__(self, url, default_ttl=None):
+        import redis  # only needed when this backend is configured
+
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key, default=None):
+        raw = self._client.get(key)
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self._client.set(key, pickle.dumps(value), ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def clear(self):
+        self._client.flushdb()
+
+    def get_version(self, key):
+        """
+        Current value of a counter maintained by incr(), 0 if there is none.
+        """
+        raw = self._client.get(key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key, ttl=None):
+        pipe = self._client.pipeline()
+        pipe.incr(key)
+        if ttl:
+            pipe.expire(key, int(ttl))
+        return pipe.execute()[0]
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+class VersionedCache:
+    """
+    Read-through cache of documents with versioned invalidation.
+
+    Each entity has a version counter; documents are stored under
+    <namespace>:<id>:v<version>. invalidate() bumps the counter, so a document
+    built from data read before a write can never be served after it, even if
+    the slow reader stores it late.
+    """
+
+    def __init__(self, backend, namespace, ttl):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _version_key(self, entity_id):
+        return f"{self.namespace}:{entity_id}:version"
+
+    def _document_key(self, entity_id, version):
+        return f"{self.namespace}:{entity_id}:v{version}"
+
+    def get_or_load(self, entity_id, loader):
+        """
+        Return the cached document for entity_id, calling loader() on a miss.
+        None results are not cached.
+        """
+        version = self.backend.get_version(self._version_key(entity_id))
+        document_key = self._document_key(entity_id, version)
+        document = self.backend.get(document_key)
+        if document is not None:
+            return document
+        document = loader()
+        if document is not None:
+            self.backend.set(document_key, document, self.ttl)
+        return document
+
+    def invalidate(self, entity_id):
+        # Version counters outlive the documents they guard.
+        version = self.backend.incr(self._version_key(entity_id), ttl=self.ttl * 10)
+        self.backend.delete(self._document_key(entity_id, version - 1))
+
+
+def init_post_cache(app):
+    """
+    Create the post document cache selected by POST_CACHE_BACKEND:
+    'memory' (per process), 'redis' (shared, POST_CACHE_URL) or 'none'.
+    The per-post commenter cache (see commenter_cache) shares its backend.
+    """
+    backend_name = app.config['POST_CACHE_BACKEND']
+    if backend_name == 'redis':
+        backend = RedisCache(app.config['POST_CACHE_URL'])
+    elif backend_name == 'memory':
+        backend = TTLCache(maxsize=app.config['POST_CACHE_SIZE'])
+    else:
+        # Nothing is retained; every read is a miss.
+        backend = TTLCache(maxsize=0)
+    post_cache = VersionedCache(backend, 'post', app.config['POST_CACHE_TTL'])
+    app.extensions['post_cache'] = post_cache
+    app.extensions['commenter_cache'] = VersionedCache(
+        backend, 'post-commenters', app.config['COMMENT_PERMISSION_CACHE_TTL']
+    )
+    return post_cache
+
+
+def post_document_cache(app=None):
+    """
+    The application's post document cache (see init_post_cache).
+    """
+    return (app or current_app).extensions['post_cache']
+
+
+def canonical_post_id(post_id):
+    """
+    The form post caches are keyed on: the hyphenated lower-case UUID, whatever
+    spelling (or uuid.UUID) the caller has. Raises ValueError for a non-UUID.
+    """
+    return str(uuid.UUID(str(post_id)))
+
+
+def invalidate_post_documents(post_ids, app=None):
+    """
+    Drop cached documents of the given posts after a committed write. Cache errors
+    are logged, not raised: the write has already succeeded.
+    """
+    try:
+        post_cache = post_document_cache(app)
+        for post_id in post_ids:
+            post_cache.invalidate(canonical_post_id(post_id))
+    except Exception as e:
+        print(f"Error invalidating cached posts {list(post_ids)}: {e}")
+
+
+def commenter_cache(app=None):
+    """
+    Cache of the set of user IDs allowed to comment on each post (see init_post_cache).
+    """
+    return (app or current_app).extensions['commenter_cache']
+
+
+def invalidate_post_commenters(post_ids, app=None):
+    """
+    Drop cached commenter sets of the given posts after a committed change to their
+    owner, mentions or shares. Cache errors are logged, not raised.
+    """
+    try:
+        cache = commenter_cache(app)
+        for post_id in post_ids:
+            cache.invalidate(canonical_post_id(post_id))
+    except Exception as e:
+        print(f"Error invalidating cached commenters of posts {list(post_ids)}: {e}")
@@ -11,7 +11,82 @@ class Config:
     DB_NAME = os.environ.get('DB_NAME', 'postgres')
     DB_USER = os.environ.get('DB_USER', 'postgres.hdesapbxgxecjzfuggjo')
     DB_PASSWORD = os.environ.get('DB_PASSWORD', '0oocbYXnrWknAbt7')
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 10))
+    # Connection pool shared by all blueprints (see app/db.py)
+    DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_HEALTHCHECK_INTERVAL = int(os.environ.get('DB_POOL_HEALTHCHECK_INTERVAL', 30))
+    DB_POOL_ACQUIRE_TIMEOUT = int(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', 10))
+    # LISTEN needs a session-mode connection; the transaction-mode pooler on 6543 drops it
+    DB_LISTEN_HOST = os.environ.get('DB_LISTEN_HOST', DB_HOST)
+    DB_LISTEN_PORT = os.environ.get('DB_LISTEN_PORT', '5432')
+    # Keyset pagination of post listings
+    POSTS_PAGE_DEFAULT_LIMIT = int(os.environ.get('POSTS_PAGE_DEFAULT_LIMIT', 20))
+    POSTS_PAGE_MAX_LIMIT = int(os.environ.get('POSTS_PAGE_MAX_LIMIT', 100))
+    # Keyset pagination of a post's comments
+    COMMENTS_PAGE_DEFAULT_LIMIT = int(os.environ.get('COMMENTS_PAGE_DEFAULT_LIMIT', 50))
+    COMMENTS_PAGE_MAX_LIMIT = int(os.environ.get('COMMENTS_PAGE_MAX_LIMIT', 200))
+    # Build get_post's document in one statement with json_agg instead of four queries
+    POST_JSON_AGGREGATION = os.environ.get('POST_JSON_AGGREGATION', 'true').lower() in ('1', 'true', 'yes')
     S3_URL = os.getenv('S3_URL')
     S3_ACCESS_KEY = os.getenv('S3_ACCESS_KEY')
     S3_SECRET_KEY = os.getenv('S3_SECRET_KEY')
+    # Presigned GET URLs are reused until this fraction of their lifetime has passed
+    PRESIGNED_URL_CACHE_SIZE = int(os.environ.get('PRESIGNED_URL_CACHE_SIZE', 4096))
+    # At most 0.5: a response may embed a URL signed one reuse window earlier, and 304s keep that
+    # response in use until its ETag epoch ends (presign_epoch), up to one more window
+    PRESIGNED_URL_REUSE_FRACTION = min(float(os.environ.get('PRESIGNED_URL_REUSE_FRACTION', 0.5)), 0.5)
+    # Post attachments are spooled to a temp file and uploaded to S3 in the background
+    ATTACHMENT_MAX_BYTES = int(os.environ.get('ATTACHMENT_MAX_BYTES', 25 * 1024 * 1024))
+    ATTACHMENT_SPOOL_MEMORY_BYTES = int(os.environ.get('ATTACHMENT_SPOOL_MEMORY_BYTES', 1024 * 1024))
+    ATTACHMENT_UPLOAD_WORKERS = int(os.environ.get('ATTACHMENT_UPLOAD_WORKERS', 4))
+    # An object still 'pending' after this long lost its upload and is uploaded again
+    ATTACHMENT_UPLOAD_STALE_SECONDS = int(os.environ.get('ATTACHMENT_UPLOAD_STALE_SECONDS', 900))
+    ATTACHMENT_MULTIPART_THRESHOLD = int(os.environ.get('ATTACHMENT_MULTIPART_THRESHOLD', 8 * 1024 * 1024))
+    ATTACHMENT_MULTIPART_CHUNKSIZE = int(os.environ.get('ATTACHMENT_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+    # Lifetime of presigned POST policies for direct-to-storage uploads
+    ATTACHMENT_PRESIGN_EXPIRES_IN = int(os.environ.get('ATTACHMENT_PRESIGN_EXPIRES_IN', 900))
+    # Background media processing (image renditions, mp3 metadata), see app/media.py
+    MEDIA_PROCESSING_ENABLED = os.environ.get('MEDIA_PROCESSING_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    MEDIA_PROCESSING_WORKERS = int(os.environ.get('MEDIA_PROCESSING_WORKERS', 2))
+    MEDIA_THUMBNAIL_SIZE = int(os.environ.get('MEDIA_THUMBNAIL_SIZE', 320))
+    MEDIA_DISPLAY_SIZE = int(os.environ.get('MEDIA_DISPLAY_SIZE', 1080))
+    # Cached get_post documents: 'memory' (per worker), 'redis' (shared by all workers) or 'none'
+    POST_CACHE_BACKEND = os.environ.get('POST_CACHE_BACKEND', 'memory')
+    POST_CACHE_URL = os.environ.get('POST_CACHE_URL', 'redis://localhost:6379/0')
+    POST_CACHE_TTL = int(os.environ.get('POST_CACHE_TTL', 300))
+    POST_CACHE_SIZE = int(os.environ.get('POST_CACHE_SIZE', 10000))
+    # Cached per-post sets of users allowed to comment; stored in the post cache backend
+    COMMENT_PERMISSION_CACHE_TTL = int(os.environ.get('COMMENT_PERMISSION_CACHE_TTL', 60))
+    # Real-time comment streams (Server-Sent Events fed by LISTEN/NOTIFY, see app/events.py)
+    COMMENT_EVENTS_CHANNEL = os.environ.get('COMMENT_EVENTS_CHANNEL', 'comment_events')
+    COMMENT_STREAM_HEARTBEAT = int(os.environ.get('COMMENT_STREAM_HEARTBEAT', 15))
+    COMMENT_STREAM_QUEUE_SIZE = int(os.environ.get('COMMENT_STREAM_QUEUE_SIZE', 100))
+    # Group commit of add_comment: concurrent inserts share one multi-row INSERT and commit
+    COMMENT_GROUP_COMMIT = os.environ.get('COMMENT_GROUP_COMMIT', 'false').lower() in ('1', 'true', 'yes')
+    COMMENT_GROUP_COMMIT_WINDOW_MS = float(os.environ.get('COMMENT_GROUP_COMMIT_WINDOW_MS', 5))
+    COMMENT_GROUP_COMMIT_MAX_BATCH = int(os.environ.get('COMMENT_GROUP_COMMIT_MAX_BATCH', 100))
+    COMMENT_GROUP_COMMIT_TIMEOUT = int(os.environ.get('COMMENT_GROUP_COMMIT_TIMEOUT', 30))
+    # Idempotency-Key handling for create_post and add_comment (see app/idempotency.py)
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 3600))
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get('IDEMPOTENCY_LOCK_TIMEOUT', 120))
+    # Contact CSV imports are parsed and inserted in batches of this many rows
+    CONTACT_IMPORT_BATCH_SIZE = int(os.environ.get('CONTACT_IMPORT_BATCH_SIZE', 1000))
+    # Load contact imports with COPY into a staging table and one set-based merge
+    CONTACT_IMPORT_COPY = os.environ.get('CONTACT_IMPORT_COPY', 'true').lower() in ('1', 'true', 'yes')
+    # Parse contact CSVs in a process pool of this many workers (0 or 1 parses in the request/job thread)
+    CONTACT_IMPORT_PARSE_WORKERS = int(os.environ.get('CONTACT_IMPORT_PARSE_WORKERS', 0))
+    CONTACT_IMPORT_PARSE_CHUNK_BYTES = int(os.environ.get('CONTACT_IMPORT_PARSE_CHUNK_BYTES', 4 * 1024 * 1024))
+    # Background contact import jobs (POST /contacts/imports/<user_id>, see app/contact_imports.py)
+    CONTACT_IMPORT_WORKERS = int(os.environ.get('CONTACT_IMPORT_WORKERS', 2))
+    CONTACT_IMPORT_MAX_ACTIVE_PER_USER = int(os.environ.get('CONTACT_IMPORT_MAX_ACTIVE_PER_USER', 2))
+    CONTACT_IMPORT_MAX_ERRORS = int(os.environ.get('CONTACT_IMPORT_MAX_ERRORS', 100))
+    CONTACT_IMPORT_STALE_SECONDS = int(os.environ.get('CONTACT_IMPORT_STALE_SECONDS', 300))
+    # Each worker process drains queued and stalled imports at startup and this often (0 disables)
+    CONTACT_IMPORT_POLL_SECONDS = int(os.environ.get('CONTACT_IMPORT_POLL_SECONDS', 60))
+    # Purge of soft-deleted posts and unreferenced attachments (flask purge-deleted, see app/purge.py)
+    PURGE_RETENTION_DAYS = int(os.environ.get('PURGE_RETENTION_DAYS', 30))
+    PURGE_ORPHAN_GRACE_HOURS = int(os.environ.get('PURGE_ORPHAN_GRACE_HOURS', 24))
+    PURGE_BATCH_SIZE = int(os.environ.get('PURGE_BATCH_SIZE', 500))
+    PURGE_BATCH_PAUSE = float(os.environ.get('PURGE_BATCH_PAUSE', 0.5))
 
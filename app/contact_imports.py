@@ -0,0 +1,390 @@
+import csv
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import click
+import psycopg2
+from flask import current_app
+from psycopg2.extras import Json, execute_values
+
+from app.config import Config
+from app.db import get_db_connection
+from app.storage import ATTACHMENT_BUCKET, s3_client, transfer_config
+
+# Uploaded CSVs wait here until their import job has run.
+IMPORT_FOLDER = 'imports'
+
+# Import jobs run here so request workers are not pinned by large files.
+import_executor = ThreadPoolExecutor(
+    max_workers=Config.CONTACT_IMPORT_WORKERS,
+    thread_name_prefix='contact-import'
+)
+
+
+class ImportLimitReached(Exception):
+    """Raised when a user already has CONTACT_IMPORT_MAX_ACTIVE_PER_USER imports queued or running."""
+
+
+class ImportJobLost(Exception):
+    """Raised when another worker has claimed the import job this worker was running."""
+
+
+def _active_import_count(cur, user_id):
+    # A running job whose worker stopped reporting does not hold a slot.
+    cur.execute("""
+        SELECT COUNT(*) FROM relyexchange.contact_import_jobs
+        WHERE user_id = %s
+          AND (status = 'queued'
+               OR (status = 'running' AND heartbeat_at >= NOW() - make_interval(secs => %s)))
+    """, (user_id, current_app.config['CONTACT_IMPORT_STALE_SECONDS']))
+    return cur.fetchone()[0]
+
+
+def submit_import_job(user_id, file_storage, bucket_name=ATTACHMENT_BUCKET):
+    """
+    Store an uploaded CSV and queue a job importing it into user_id's contacts.
+    Raises ImportLimitReached if the user has too many imports in flight.
+
+    Returns:
+      str: The job id.
+    """
+    limit = current_app.config['CONTACT_IMPORT_MAX_ACTIVE_PER_USER']
+    # Cheap early check, so a rejected file is not uploaded first.
+    with get_db_connection() as conn, conn.cursor() as cur:
+        if _active_import_count(cur, user_id) >= limit:
+            raise ImportLimitReached()
+
+    job_id = str(uuid.uuid4())
+    object_key = f"{IMPORT_FOLDER}/{user_id}/{job_id}.csv"
+    s3_client.upload_fileobj(file_storage.stream, bucket_name, object_key, Config=transfer_config)
+
+    try:
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Serialise submissions of one user so the cap holds under concurrent uploads.
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"contact-import:{user_id}",))
+            if _active_import_count(cur, user_id) >= limit:
+                raise ImportLimitReached()
+            cur.execute("""
+                INSERT INTO relyexchange.contact_import_jobs (job_id, user_id, object_key, filename)
+                VALUES (%s, %s, %s, %s)
+            """, (job_id, user_id, object_key, file_storage.filename))
+            conn.commit()
+    except Exception:
+        _delete_upload(bucket_name, object_key)
+        raise
+
+    import_executor.submit(drain_import_jobs, current_app._get_current_object(), bucket_name)
+    return job_id
+
+
+def _delete_upload(bucket_name, object_key):
+    try:
+        s3_client.delete_object(Bucket=bucket_name, Key=object_key)
+    except Exception as e:
+        print(f"Error deleting contact import upload {object_key}: {e}")
+
+
+def import_job_from_row(row):
+    (job_id, user_id, filename, status, csv_type, processed, inserted, skipped,
+     errors, error, created_at, started_at, finished_at) = row
+    return {
+        'job_id': str(job_id),
+        'user_id': str(user_id),
+        'filename': filename,
+        'status': status,
+        'csv_type': csv_type,
+        'processed': processed,
+        'inserted': inserted,
+        'skipped': skipped,
+        'errors': errors,
+        'error': error,
+        'created_at': created_at.isoformat(),
+        'started_at': started_at.isoformat() if started_at else None,
+        'finished_at': finished_at.isoformat() if finished_at else None,
+    }
+
+
+IMPORT_JOB_COLUMNS = """
+    job_id, user_id, filename, status, csv_type, processed_rows, inserted_rows, skipped_rows,
+    errors, error, created_at, started_at, finished_at
+"""
+
+
+def load_import_job(cur, user_id, job_id):
+    cur.execute(f"""
+        SELECT {IMPORT_JOB_COLUMNS}
+        FROM relyexchange.contact_import_jobs
+        WHERE job_id = %s AND user_id = %s
+    """, (job_id, user_id))
+    row = cur.fetchone()
+    return import_job_from_row(row) if row else None
+
+
+def list_import_jobs(cur, user_id, limit):
+    cur.execute(f"""
+        SELECT {IMPORT_JOB_COLUMNS}
+        FROM relyexchange.contact_import_jobs
+        WHERE user_id = %s
+        ORDER BY created_at DESC
+        LIMIT %s
+    """, (user_id, limit))
+    return [import_job_from_row(row) for row in cur.fetchall()]
+
+
+def _claim_import_job(cur, stale_after):
+    """
+    Take the oldest queued job, or a running one whose worker stopped reporting
+    progress stale_after seconds ago (it resumes after the rows already counted).
+    The job gets a new worker_token, which the claiming worker's updates must match.
+    """
+    cur.execute("""
+        UPDATE relyexchange.contact_import_jobs
+        SET status = 'running', started_at = COALESCE(started_at, NOW()), heartbeat_at = NOW(),
+            worker_token = %s
+        WHERE job_id = (
+            SELECT job_id FROM relyexchange.contact_import_jobs
+            WHERE status = 'queued'
+               OR (status = 'running' AND heartbeat_at < NOW() - make_interval(secs => %s))
+            ORDER BY created_at
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING job_id, user_id, object_key, processed_rows, jsonb_array_length(errors), worker_token
+    """, (str(uuid.uuid4()), stale_after))
+    return cur.fetchone()
+
+
+def insert_import_batch(cur, rows, key_index, seen):
+    """
+    Insert one batch of (row_number, record) pairs, skipping records whose dedup key
+    is empty, already seen in this file (seen is updated) or already stored. If the
+    batch is rejected, its rows are inserted one by one so a bad row only fails itself.
+
+    Returns:
+      tuple: (rows inserted, rows skipped, [{'row': n, 'error': message}, ...])
+    """
+    # Imported here: app.endpoints.contacts imports this module.
+    from app.endpoints.contacts import CONTACT_INSERT_QUERY, dedup_key
+
+    candidates = []
+    for row_number, record in rows:
+        key = dedup_key(record, key_index)
+        if key and key not in seen:
+            seen.add(key)
+            candidates.append((row_number, record))
+
+    inserted = 0
+    errors = []
+    if candidates:
+        cur.execute("SAVEPOINT import_batch")
+        try:
+            execute_values(cur, CONTACT_INSERT_QUERY, [record for _, record in candidates],
+                           page_size=len(candidates))
+            inserted = cur.rowcount
+        except psycopg2.DatabaseError:
+            cur.execute("ROLLBACK TO SAVEPOINT import_batch")
+            for row_number, record in candidates:
+                cur.execute("SAVEPOINT import_row")
+                try:
+                    execute_values(cur, CONTACT_INSERT_QUERY, [record])
+                    inserted += cur.rowcount
+                except psycopg2.DatabaseError as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT import_row")
+                    errors.append({'row': row_number, 'error': str(e).strip()})
+                else:
+                    cur.execute("RELEASE SAVEPOINT import_row")
+        cur.execute("RELEASE SAVEPOINT import_batch")
+    return inserted, len(rows) - inserted - len(errors), errors
+
+
+def _finish_import_job(app, job_id, token, status, error=None, csv_type=None):
+    with get_db_connection(app) as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE relyexchange.contact_import_jobs
+            SET status = %s, error = %s, csv_type = COALESCE(%s, csv_type), finished_at = NOW()
+            WHERE job_id = %s AND worker_token = %s
+        """, (status, error, csv_type, job_id, token))
+        if cur.rowcount == 0:
+            raise ImportJobLost(job_id)
+        conn.commit()
+
+
+def _touch_import_job(app, job_id, token):
+    """Refresh the heartbeat of a job; raises ImportJobLost if this worker no longer owns it."""
+    with get_db_connection(app) as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE relyexchange.contact_import_jobs
+            SET heartbeat_at = NOW()
+            WHERE job_id = %s AND worker_token = %s AND status = 'running'
+        """, (job_id, token))
+        if cur.rowcount == 0:
+            raise ImportJobLost(job_id)
+        conn.commit()
+
+
+class ImportHeartbeat:
+    """
+    Refreshes the heartbeat of a running job every `interval` seconds from a
+    background thread, so a slow download or batch is not taken for a dead worker.
+    check() raises ImportJobLost once a refresh found the job owned by another worker.
+    """
+
+    def __init__(self, app, job_id, token, interval):
+        self.app = app
+        self.job_id = job_id
+        self.token = token
+        self.interval = interval
+        self._lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='contact-import-heartbeat', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                _touch_import_job(self.app, self.job_id, self.token)
+            except ImportJobLost:
+                self._lost.set()
+                return
+            except Exception as e:
+                print(f"Error refreshing contact import {self.job_id} heartbeat: {e}")
+
+    def check(self):
+        if self._lost.is_set():
+            raise ImportJobLost(self.job_id)
+
+
+def _process_import_job(app, job, bucket_name):
+    # Imported here: app.endpoints.contacts imports this module.
+    from app.endpoints.contacts import DEDUP_KEY_INDEX, batched, open_csv_records
+
+    job_id, user_id, object_key, processed, error_count, token = job
+    config = app.config
+    interval = max(config['CONTACT_IMPORT_STALE_SECONDS'] / 3, 1)
+    with tempfile.TemporaryFile() as spool, ImportHeartbeat(app, job_id, token, interval) as heartbeat:
+        s3_client.download_fileobj(bucket_name, object_key, spool)
+        spool.seek(0)
+        _touch_import_job(app, job_id, token)
+        row_number = processed
+        try:
+            _, csv_type, records = open_csv_records(spool, str(user_id))
+            if not csv_type:
+                _finish_import_job(app, job_id, token, 'failed', 'Unrecognized CSV format.')
+                return
+            key_index = DEDUP_KEY_INDEX[csv_type]
+            rows = enumerate(records, start=1)
+            # A resumed job skips the rows its previous worker already committed.
+            seen = set()
+            for batch in batched(islice(rows, processed, None), config['CONTACT_IMPORT_BATCH_SIZE']):
+                heartbeat.check()
+                with get_db_connection(app) as conn, conn.cursor() as cur:
+                    inserted, skipped, errors = insert_import_batch(cur, batch, key_index, seen)
+                    errors = errors[:max(config['CONTACT_IMPORT_MAX_ERRORS'] - error_count, 0)]
+                    error_count += len(errors)
+                    cur.execute("""
+                        UPDATE relyexchange.contact_import_jobs
+                        SET csv_type = %s, processed_rows = processed_rows + %s,
+                            inserted_rows = inserted_rows + %s, skipped_rows = skipped_rows + %s,
+                            errors = errors || %s, heartbeat_at = NOW()
+                        WHERE job_id = %s AND worker_token = %s
+                    """, (csv_type, len(batch), inserted, skipped, Json(errors), job_id, token))
+                    if cur.rowcount == 0:
+                        # Taken over: the batch is rolled back for the new worker to redo.
+                        raise ImportJobLost(job_id)
+                    conn.commit()
+                row_number = batch[-1][0]
+        except (UnicodeDecodeError, csv.Error) as e:
+            _finish_import_job(app, job_id, token, 'failed', f'Error reading file after row {row_number}: {e}')
+            return
+    _finish_import_job(app, job_id, token, 'done', csv_type=csv_type)
+
+
+def run_next_import_job(app, bucket_name=ATTACHMENT_BUCKET):
+    """
+    Claim and run one import job.
+
+    Returns:
+      bool: False if there was no job to run.
+    """
+    with get_db_connection(app) as conn, conn.cursor() as cur:
+        job = _claim_import_job(cur, app.config['CONTACT_IMPORT_STALE_SECONDS'])
+        conn.commit()
+    if not job:
+        return False
+
+    job_id, object_key, token = job[0], job[2], job[5]
+    try:
+        _process_import_job(app, job, bucket_name)
+    except ImportJobLost:
+        # The new owner finishes the job and deletes the upload.
+        print(f"Contact import {job_id} was taken over by another worker")
+        return True
+    except Exception as e:
+        print(f"Error running contact import {job_id}: {e}")
+        try:
+            _finish_import_job(app, job_id, token, 'failed', str(e))
+        except Exception as e:
+            # Left 'running'; another worker takes it over once it is stale.
+            print(f"Error recording contact import {job_id} failure: {e}")
+            return True
+    _delete_upload(bucket_name, object_key)
+    return True
+
+
+def drain_import_jobs(app, bucket_name=ATTACHMENT_BUCKET):
+    """
+    Executor job: run import jobs until none are waiting.
+
+    Returns:
+      int: Number of jobs run.
+    """
+    count = 0
+    while run_next_import_job(app, bucket_name):
+        count += 1
+    return count
+
+
+def _poll_import_jobs(app, interval, bucket_name):
+    while True:
+        try:
+            import_executor.submit(drain_import_jobs, app, bucket_name).result()
+        except Exception as e:
+            print(f"Error draining contact imports: {e}")
+        time.sleep(interval)
+
+
+def init_contact_imports(app, bucket_name=ATTACHMENT_BUCKET):
+    """
+    Start the worker's import poller, which drains queued and stalled import jobs
+    right away and then every CONTACT_IMPORT_POLL_SECONDS, so jobs left behind by a
+    restart are run without waiting for the next upload. 0 disables the poller
+    (run `flask run-contact-imports` instead).
+    """
+    interval = app.config['CONTACT_IMPORT_POLL_SECONDS']
+    if interval <= 0:
+        return None
+    poller = threading.Thread(
+        target=_poll_import_jobs, args=(app, interval, bucket_name),
+        name='contact-import-poller', daemon=True
+    )
+    poller.start()
+    app.extensions['contact_import_poller'] = poller
+    return poller
+
+
+@click.command('run-contact-imports')
+def run_contact_imports_command():
+    """Run queued contact import jobs, and stalled ones, until none are left."""
+    count = drain_import_jobs(current_app._get_current_object())
+    click.echo(f"Ran {count} contact import jobs")
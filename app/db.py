@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions, pool
+from flask import current_app
+
+
+class DatabasePool:
+    """
+    Application-wide pool of psycopg2 connections.
+
+    The underlying ThreadedConnectionPool is opened lazily on first use (and
+    re-opened after a fork) so that create_app() does not need a reachable
+    database. Callers that find the pool exhausted block for up to
+    `acquire_timeout` seconds instead of failing immediately.
+    """
+
+    def __init__(self, dsn_kwargs, minconn=1, maxconn=10,
+                 healthcheck_interval=30, acquire_timeout=10):
+        self.dsn_kwargs = dsn_kwargs
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.healthcheck_interval = healthcheck_interval
+        self.acquire_timeout = acquire_timeout
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        # Last time each pooled connection was handed back, keyed by id(conn).
+        self._last_used = {}
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            dsn_kwargs={
+                'host': config['DB_HOST'],
+                'port': config['DB_PORT'],
+                'dbname': config['DB_NAME'],
+                'user': config['DB_USER'],
+                'password': config['DB_PASSWORD'],
+                'connect_timeout': config['DB_CONNECT_TIMEOUT'],
+            },
+            minconn=config['DB_POOL_MIN_SIZE'],
+            maxconn=config['DB_POOL_MAX_SIZE'],
+            healthcheck_interval=config['DB_POOL_HEALTHCHECK_INTERVAL'],
+            acquire_timeout=config['DB_POOL_ACQUIRE_TIMEOUT'],
+        )
+
+    def _get_pool(self):
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    # Connections inherited from a parent process must not be reused.
+                    self._pool = pool.ThreadedConnectionPool(
+                        self.minconn, self.maxconn, **self.dsn_kwargs
+                    )
+                    self._pid = os.getpid()
+                    self._slots = threading.BoundedSemaphore(self.maxconn)
+                    self._last_used = {}
+        return self._pool
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        # Freshly opened connections and recently used ones are trusted as-is.
+        if last_used is None or time.monotonic() - last_used < self.healthcheck_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """
+        Check a healthy connection out of the pool.
+        Raises pool.PoolError if none becomes available within acquire_timeout.
+        """
+        db_pool = self._get_pool()
+        slots = self._slots
+        if not slots.acquire(timeout=self.acquire_timeout):
+            raise pool.PoolError('Timed out waiting for a database connection')
+        try:
+            conn = db_pool.getconn()
+            # Stale connections (server restart, pooler idle timeout) are replaced. After
+            # a restart every idle one is stale; the loop ends at the latest with a
+            # freshly opened connection, which is trusted.
+            while not self._is_healthy(conn):
+                self._last_used.pop(id(conn), None)
+                db_pool.putconn(conn, close=True)
+                conn = db_pool.getconn()
+            return conn
+        except Exception:
+            slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        """
+        Return a connection to the pool, rolling back any open transaction.
+        Broken connections are closed instead of being reused.
+        """
+        try:
+            if not conn.closed and not close:
+                status = conn.get_transaction_status()
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+        except psycopg2.Error:
+            close = True
+        try:
+            if close or conn.closed:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.putconn(conn, close=close or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+
+
+def init_db_pool(app):
+    """
+    Create the application's connection pool from its config.
+    """
+    db_pool = DatabasePool.from_config(app.config)
+    app.extensions['db_pool'] = db_pool
+    return db_pool
+
+
+@contextmanager
+def get_db_connection(app=None):
+    """
+    Borrow a pooled connection for the duration of a `with` block.
+
+    The connection is always handed back, also on early returns and
+    exceptions; uncommitted work is rolled back when it is returned.
+    Pass `app` explicitly when running outside of an application context.
+    """
+    db_pool = (app or current_app).extensions['db_pool']
+    conn = db_pool.getconn()
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        db_pool.putconn(conn, close=broken)
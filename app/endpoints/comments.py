@@ -1,18 +1,35 @@
-from flask import Blueprint, request, jsonify
-import uuid, psycopg2
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+import uuid, json, queue, threading
+from collections import Counter
+from psycopg2.extras import execute_values
+from app.cache import canonical_post_id, commenter_cache, invalidate_post_documents
 from app.config import Config
+from app.db import get_db_connection
+from app.events import comment_events, notify_comment_event, notify_comment_events
+from app.etags import bump_post_versions, make_etag, not_modified, with_etag
+from app.group_commit import GroupCommitter
+from app.idempotency import idempotent
+from app.pagination import (
+    decode_cursor, decode_since_cursor, encode_cursor, encode_since_cursor, parse_page_limit
+)
 
 comments_bp = Blueprint('comments', __name__)
 
-def get_db_connection():
-    conn = psycopg2.connect(
-         host=Config.DB_HOST,
-         port=Config.DB_PORT,
-         dbname=Config.DB_NAME,
-         user=Config.DB_USER,
-         password=Config.DB_PASSWORD
-    )
-    return conn
+def load_allowed_commenters(post_id, cur):
+    """
+    Read the set of user IDs allowed to comment on a post. A post that does not
+    exist yields an empty set, which is cached like any other.
+    """
+    query = """
+        SELECT user_id FROM relyexchange.posts WHERE post_id = %s
+        UNION
+        SELECT mentioned_user_id FROM relyexchange.post_mentions WHERE post_id = %s
+        UNION
+        SELECT shared_with_user_id FROM relyexchange.post_shares WHERE post_id = %s
+    """
+    cur.execute(query, (post_id, post_id, post_id))
+    return frozenset(str(row[0]) for row in cur.fetchall() if row[0])
+
 
 def is_user_allowed_to_comment(post_id, user_id, cur):
     """
@@ -21,24 +38,104 @@ def is_user_allowed_to_comment(post_id, user_id, cur):
       - The owner of the post.
       - Users mentioned in the post.
       - Users with whom the post is shared.
+    The per-post set is cached (COMMENT_PERMISSION_CACHE_TTL) and dropped by
+    invalidate_post_commenters() when the post's owner, mentions or shares change.
     """
-    query = """
-    SELECT EXISTS (
-        SELECT 1 FROM (
-            SELECT user_id FROM relyexchange.posts WHERE post_id = %s
-            UNION
-            SELECT mentioned_user_id FROM relyexchange.post_mentions WHERE post_id = %s
-            UNION
-            SELECT shared_with_user_id FROM relyexchange.post_shares WHERE post_id = %s
-        ) AS allowed_users
-        WHERE allowed_users.user_id = %s
-    )
-    """
-    cur.execute(query, (post_id, post_id, post_id, user_id))
-    allowed = cur.fetchone()[0]
-    return allowed
+    post_id = canonical_post_id(post_id)
+    allowed = commenter_cache().get_or_load(post_id, lambda: load_allowed_commenters(post_id, cur))
+    return str(uuid.UUID(user_id)) in allowed
+
+
+# Sorts after every comment_id; paired with a seq it means "everything up to seq".
+MAX_UUID = 'ffffffff-ffff-ffff-ffff-ffffffffffff'
+
+
+class CommentNotAllowed(Exception):
+    """Raised for a comment whose author may not comment on the post."""
+
+
+def insert_comments(cur, items):
+    """
+    Check permissions for and insert several (post_id, user_id, content) comments with
+    one multi-row INSERT, updating the posts' versions and counters and queueing the
+    comment events in the caller's transaction.
+    Each comment's seq is its post's new version. The post row stays locked until
+    commit, so per post seq grows in commit order, which `since` polling relies on.
+
+    Returns:
+      list: Per item, in order, the inserted (comment_id, post_id, user_id, content,
+            created_at, seq) row or a CommentNotAllowed instance.
+    """
+    # One instance per item: each waiter raises its own, with its own traceback.
+    results = [CommentNotAllowed('User is not allowed to comment on this post') for _ in items]
+    allowed = [i for i, (post_id, user_id, _) in enumerate(items)
+               if is_user_allowed_to_comment(post_id, user_id, cur)]
+    if not allowed:
+        return results
+
+    # Lock posts in a fixed order so concurrent batches cannot deadlock.
+    versions = {}
+    counts = Counter(str(uuid.UUID(items[i][0])) for i in allowed)
+    for post_id in sorted(counts):
+        versions.update(bump_post_versions(cur, [post_id], comment_delta=counts[post_id]))
+
+    rows = execute_values(cur, """
+        INSERT INTO relyexchange.comments (post_id, user_id, content, created_at, seq)
+        VALUES %s
+        RETURNING comment_id, post_id, user_id, content, created_at, seq
+    """, [items[i] + (versions[str(uuid.UUID(items[i][0]))],) for i in allowed],
+        template="(%s, %s, %s, NOW(), %s)", page_size=len(allowed), fetch=True)
+
+    # RETURNING order is not guaranteed; match rows back by their values. Identical
+    # comments are interchangeable (created_at is the same within the transaction).
+    rows_by_key = {}
+    for row in rows:
+        rows_by_key.setdefault((str(row[1]), str(row[2]), row[3]), []).append(row)
+    for i in allowed:
+        post_id, user_id, content = items[i]
+        results[i] = rows_by_key[(str(uuid.UUID(post_id)), str(uuid.UUID(user_id)), content)].pop()
+
+    # Comments of one post in one batch share a seq; send their events in cursor
+    # order, (seq, comment_id), so a watcher resuming from the last cursor it saw
+    # cannot skip one with a smaller comment_id.
+    notify_comment_events(cur, 'created', sorted(
+        (results[i] for i in allowed), key=lambda row: (row[5], str(row[0]))
+    ))
+    return results
+
+
+def _after_comment_batch(items, results):
+    invalidate_post_documents({
+        str(uuid.UUID(item[0])) for item, result in zip(items, results)
+        if not isinstance(result, Exception)
+    })
+
+
+_committer_lock = threading.Lock()
+
+
+def comment_committer(app=None):
+    """
+    The application's group committer for add_comment (COMMENT_GROUP_COMMIT), created on first use.
+    """
+    app = app or current_app._get_current_object()
+    committer = app.extensions.get('comment_committer')
+    if committer is None:
+        with _committer_lock:
+            committer = app.extensions.get('comment_committer')
+            if committer is None:
+                committer = GroupCommitter(
+                    app, insert_comments,
+                    window=app.config['COMMENT_GROUP_COMMIT_WINDOW_MS'] / 1000,
+                    max_batch=app.config['COMMENT_GROUP_COMMIT_MAX_BATCH'],
+                    after_commit=_after_comment_batch,
+                    name='comment-group-commit'
+                )
+                app.extensions['comment_committer'] = committer
+    return committer
 
 @comments_bp.route('/posts/<post_id>/comments', methods=['POST'])
+@idempotent
 def add_comment(post_id):
     """
     Add a comment to a post.
@@ -46,6 +143,9 @@ def add_comment(post_id):
       - user_id: ID of the commenting user
       - content: the comment text
     The endpoint checks that the user is allowed to comment (post owner, mentioned, or shared).
+    With COMMENT_GROUP_COMMIT enabled, concurrent comments are written together in one
+    transaction (see insert_comments); each request still gets its own comment back.
+    Retries sent with the same Idempotency-Key header get the first response back.
     """
     data = request.get_json()
     if not data:
@@ -63,21 +163,23 @@ def add_comment(post_id):
         return jsonify({'error': 'Invalid UUID format'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        if not is_user_allowed_to_comment(post_id, user_id, cur):
-            return jsonify({'error': 'User is not allowed to comment on this post'}), 403
-
-        insert_query = """
-            INSERT INTO relyexchange.comments (post_id, user_id, content, created_at)
-            VALUES (%s, %s, %s, NOW())
-            RETURNING comment_id, post_id, user_id, content, created_at
-        """
-        cur.execute(insert_query, (post_id, user_id, content))
-        comment = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
+        if Config.COMMENT_GROUP_COMMIT:
+            future = comment_committer().submit((post_id, user_id, content))
+            try:
+                comment = future.result(timeout=Config.COMMENT_GROUP_COMMIT_TIMEOUT)
+            except TimeoutError:
+                if future.cancel():
+                    # Never written, so a retry cannot duplicate it.
+                    return jsonify({'error': 'Timed out waiting to save the comment; retry later.'}), 503
+                # Already being written: its outcome is decided by the database now.
+                comment = future.result()
+        else:
+            with get_db_connection() as conn, conn.cursor() as cur:
+                comment = insert_comments(cur, [(post_id, user_id, content)])[0]
+                if isinstance(comment, CommentNotAllowed):
+                    raise comment
+                conn.commit()
+            invalidate_post_documents([post_id])
         return jsonify({
             'message': 'Comment added successfully',
             'comment': {
@@ -89,13 +191,33 @@ def add_comment(post_id):
             }
         }), 201
 
+    except CommentNotAllowed:
+        return jsonify({'error': 'User is not allowed to comment on this post'}), 403
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @comments_bp.route('/posts/<post_id>/comments', methods=['GET'])
 def get_comments(post_id):
     """
-    Retrieve all comments for a given post.
+    Retrieve the comments of a post, oldest first, one page at a time.
+    Query parameters (at most one cursor):
+      - limit: page size (defaults to COMMENTS_PAGE_DEFAULT_LIMIT, at most COMMENTS_PAGE_MAX_LIMIT).
+      - after: next_cursor of a previous page; returns the following (newer) comments.
+      - before: prev_cursor of a previous page; returns the preceding (older) comments.
+      - since: since_cursor of a previous response; returns the comments committed
+               after the ones the client holds, in commit order (late commits of
+               comments with an earlier created_at included).
+    Without a cursor the first page of the thread is returned.
+    The response carries:
+      - next_cursor: pass as `after` for newer comments; null when there are none yet.
+      - prev_cursor: pass as `before` for older comments; null at the start of the thread.
+      - since_cursor: pass as `since` on the next poll, null for `before` pages. For
+                      other pages it covers every comment committed before the
+                      request, so a poll may repeat comments the client already
+                      holds; deduplicate by comment_id. If a `since` response
+                      has has_more, poll again straight away.
+    The response carries an ETag derived from the post's version and the query; a
+    matching If-None-Match is answered with 304 without reading the comments.
     """
     try:
         uuid.UUID(post_id)
@@ -103,29 +225,160 @@ def get_comments(post_id):
         return jsonify({'error': 'Invalid post_id format'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT comment_id, post_id, user_id, content, created_at 
-            FROM relyexchange.comments
-            WHERE post_id = %s
-            ORDER BY created_at ASC
-        """, (post_id,))
-        rows = cur.fetchall()
-        comments = [{
-            'comment_id': row[0],
-            'post_id': row[1],
-            'user_id': row[2],
-            'content': row[3],
-            'created_at': row[4]
-        } for row in rows]
-        cur.close()
-        conn.close()
-        return jsonify({'comments': comments}), 200
+        limit = parse_page_limit(request.args, Config.COMMENTS_PAGE_DEFAULT_LIMIT, Config.COMMENTS_PAGE_MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cursors = {name: request.args.get(name) for name in ('after', 'before', 'since') if request.args.get(name)}
+    if len(cursors) > 1:
+        return jsonify({'error': 'Only one of after, before and since may be given'}), 400
+    direction, position = None, None
+    if cursors:
+        direction, cursor = next(iter(cursors.items()))
+        try:
+            position = decode_since_cursor(cursor) if direction == 'since' else decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    try:
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT version FROM relyexchange.posts WHERE post_id = %s", (post_id,))
+            post = cur.fetchone()
+            etag = make_etag('comments', post_id, post[0], limit, sorted(cursors.items())) if post else None
+            if etag:
+                response = not_modified(etag)
+                if response:
+                    return response
+
+            # One extra row tells us whether the page is followed by more comments
+            # in the direction being read.
+            if direction == 'since':
+                cur.execute("""
+                    SELECT comment_id, post_id, user_id, content, created_at, seq
+                    FROM relyexchange.comments
+                    WHERE post_id = %s AND (seq, comment_id) > (%s, %s::uuid)
+                    ORDER BY seq ASC, comment_id ASC
+                    LIMIT %s
+                """, (post_id, position[0], position[1], limit + 1))
+                rows = cur.fetchall()
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+            elif direction == 'before':
+                cur.execute("""
+                    SELECT comment_id, post_id, user_id, content, created_at
+                    FROM relyexchange.comments
+                    WHERE post_id = %s AND (created_at, comment_id) < (%s, %s::uuid)
+                    ORDER BY created_at DESC, comment_id DESC
+                    LIMIT %s
+                """, (post_id, position[0], position[1], limit + 1))
+                rows = cur.fetchall()
+                has_more = len(rows) > limit
+                rows = rows[:limit][::-1]
+            elif direction:
+                cur.execute("""
+                    SELECT comment_id, post_id, user_id, content, created_at
+                    FROM relyexchange.comments
+                    WHERE post_id = %s AND (created_at, comment_id) > (%s, %s::uuid)
+                    ORDER BY created_at ASC, comment_id ASC
+                    LIMIT %s
+                """, (post_id, position[0], position[1], limit + 1))
+                rows = cur.fetchall()
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+            else:
+                cur.execute("""
+                    SELECT comment_id, post_id, user_id, content, created_at
+                    FROM relyexchange.comments
+                    WHERE post_id = %s
+                    ORDER BY created_at ASC, comment_id ASC
+                    LIMIT %s
+                """, (post_id, limit + 1))
+                rows = cur.fetchall()
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+
+            comments = [{
+                'comment_id': row[0],
+                'post_id': row[1],
+                'user_id': row[2],
+                'content': row[3],
+                'created_at': row[4]
+            } for row in rows]
+
+            first = encode_cursor(rows[0][4], rows[0][0]) if rows else None
+            last = encode_cursor(rows[-1][4], rows[-1][0]) if rows else None
+            if direction == 'since':
+                # Commit order is not created_at order: a since page cannot be paged by time.
+                prev_cursor = next_cursor = None
+                since_cursor = encode_since_cursor(rows[-1][5], rows[-1][0]) if rows else cursor
+            elif direction == 'before':
+                prev_cursor = first if has_more else None
+                # We paged back from `before`, so newer comments exist.
+                next_cursor = last or cursor
+                since_cursor = None
+            else:
+                prev_cursor = (first or cursor) if direction else None
+                next_cursor = last if has_more else None
+                # The post's version was read before the comments, and every comment
+                # with a seq up to it had committed by then.
+                since_cursor = encode_since_cursor(post[0], MAX_UUID) if post else None
+
+            response = jsonify({
+                'comments': comments,
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor,
+                'since_cursor': since_cursor,
+                'has_more': has_more
+            })
+            if etag:
+                with_etag(response, etag)
+            return response, 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@comments_bp.route('/posts/<post_id>/comments/stream', methods=['GET'])
+def stream_comments(post_id):
+    """
+    Push the comments of a post as they are added, updated or deleted (Server-Sent Events).
+    Each event is named created/updated/deleted; its data is the comment (without content
+    for deletions, or with truncated=true when the content is too large to push).
+    Created events carry the comment's since cursor as data.cursor and as the event id.
+    A 'resync' event means events were dropped: the client should catch up with
+    GET .../comments?since=<last cursor>, as it should after connecting or reconnecting.
+    """
+    try:
+        post_id = str(uuid.UUID(post_id))
+    except ValueError:
+        return jsonify({'error': 'Invalid post_id format'}), 400
+
+    hub = comment_events()
+    heartbeat = Config.COMMENT_STREAM_HEARTBEAT
+
+    def generate():
+        events = hub.subscribe(post_id)
+        try:
+            yield f"retry: {heartbeat * 1000}\n\n"
+            while True:
+                try:
+                    event = events.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Keeps proxies from closing an idle stream and detects gone clients.
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    yield "event: resync\ndata: {}\n\n"
+                    continue
+                event_id = f"id: {event['cursor']}\n" if 'cursor' in event else ''
+                yield f"event: {event['event']}\n{event_id}data: {json.dumps(event)}\n\n"
+        finally:
+            hub.unsubscribe(post_id, events)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @comments_bp.route('/comments/<comment_id>', methods=['PUT'])
 def update_comment(comment_id):
     """
@@ -150,33 +403,33 @@ def update_comment(comment_id):
         return jsonify({'error': 'Invalid UUID format'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT user_id FROM relyexchange.comments WHERE comment_id = %s", (comment_id,))
-        row = cur.fetchone()
-        if not row or row[0] != user_id:
-            return jsonify({'error': 'Comment not found or unauthorized'}), 403
-
-        cur.execute("""
-            UPDATE relyexchange.comments
-            SET content = %s
-            WHERE comment_id = %s
-            RETURNING comment_id, post_id, user_id, content, created_at
-        """, (content, comment_id))
-        updated_comment = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({
-            'message': 'Comment updated successfully',
-            'comment': {
-                'comment_id': updated_comment[0],
-                'post_id': updated_comment[1],
-                'user_id': updated_comment[2],
-                'content': updated_comment[3],
-                'created_at': updated_comment[4]
-            }
-        }), 200
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT user_id FROM relyexchange.comments WHERE comment_id = %s", (comment_id,))
+            row = cur.fetchone()
+            if not row or row[0] != user_id:
+                return jsonify({'error': 'Comment not found or unauthorized'}), 403
+
+            cur.execute("""
+                UPDATE relyexchange.comments
+                SET content = %s
+                WHERE comment_id = %s
+                RETURNING comment_id, post_id, user_id, content, created_at, seq
+            """, (content, comment_id))
+            updated_comment = cur.fetchone()
+            bump_post_versions(cur, [updated_comment[1]])
+            notify_comment_event(cur, 'updated', updated_comment)
+            conn.commit()
+            invalidate_post_documents([updated_comment[1]])
+            return jsonify({
+                'message': 'Comment updated successfully',
+                'comment': {
+                    'comment_id': updated_comment[0],
+                    'post_id': updated_comment[1],
+                    'user_id': updated_comment[2],
+                    'content': updated_comment[3],
+                    'created_at': updated_comment[4]
+                }
+            }), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -198,18 +451,27 @@ def delete_comment(comment_id):
         return jsonify({'error': 'Invalid UUID format'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT user_id FROM relyexchange.comments WHERE comment_id = %s", (comment_id,))
-        row = cur.fetchone()
-        if not row or row[0] != user_id:
-            return jsonify({'error': 'Comment not found or unauthorized'}), 403
-
-        cur.execute("DELETE FROM relyexchange.comments WHERE comment_id = %s", (comment_id,))
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({'message': 'Comment deleted successfully'}), 200
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT user_id, post_id, is_deleted FROM relyexchange.comments WHERE comment_id = %s",
+                (comment_id,)
+            )
+            row = cur.fetchone()
+            if not row or row[0] != user_id:
+                return jsonify({'error': 'Comment not found or unauthorized'}), 403
+
+            cur.execute("""
+                DELETE FROM relyexchange.comments
+                WHERE comment_id = %s
+                RETURNING comment_id, post_id, user_id, content, created_at, seq
+            """, (comment_id,))
+            deleted_comment = cur.fetchone()
+            # Soft-deleted comments were already taken out of comment_count.
+            bump_post_versions(cur, [row[1]], comment_delta=0 if row[2] else -1)
+            notify_comment_event(cur, 'deleted', deleted_comment)
+            conn.commit()
+            invalidate_post_documents([row[1]])
+            return jsonify({'message': 'Comment deleted successfully'}), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
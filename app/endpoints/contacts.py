@@ -1,24 +1,26 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, url_for
+import codecs
 import csv
-from io import StringIO
+import io
+from itertools import chain, islice
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import uuid
 from datetime import datetime
 import psycopg2
+import psycopg2.errors
 from psycopg2.extras import execute_values
 from app.config import Config
+from app.contact_imports import ImportLimitReached, list_import_jobs, load_import_job, submit_import_job
+from app.db import get_db_connection
 import re
 
 contacts_bp = Blueprint('contacts', __name__)
 
-def get_db_connection():
-    conn = psycopg2.connect(
-        host=Config.DB_HOST,
-        port=Config.DB_PORT,
-        dbname=Config.DB_NAME,
-        user=Config.DB_USER,
-        password=Config.DB_PASSWORD
-    )
-    return conn
+_parse_executor = None
+_parse_executor_lock = threading.Lock()
 
 # Parser for contacts.csv – URL is not provided, so set to None.
 def parse_contacts_csv(reader, user_id):
@@ -27,10 +29,9 @@ def parse_contacts_csv(reader, user_id):
       FirstName, LastName, Companies, Title, Emails, PhoneNumbers,
       Addresses, Sites, InstantMessageHandles, FullName, Birthday,
       Location, BookmarkedAt, Profiles
-    Returns a list of tuples ready for bulk insertion.
-    The tuple structure now includes an extra field for URL.
+    Yields one tuple per row, ready for bulk insertion, so rows are parsed as
+    they are read. The tuple structure now includes an extra field for URL.
     """
-    records = []
     for row in reader:
         # Parse 'Birthday'
         birthday = None
@@ -69,8 +70,7 @@ def parse_contacts_csv(reader, user_id):
             None   # ConnectedAt: not applicable for contacts.csv
             , None # URL: not provided in contacts.csv
         )
-        records.append(record)
-    return records
+        yield record
 
 # Parser for connections.csv – maps columns from connections CSV including URL.
 def parse_connections_csv(reader, user_id):
@@ -78,9 +78,8 @@ def parse_connections_csv(reader, user_id):
     Parses a 'connections.csv' file.
     Suppose it has columns like:
       First Name, Last Name, Email Address, Company, Position, Connected On, URL, ...
-    We'll map them into our contacts table.
+    We'll map them into our contacts table, yielding one tuple per row.
     """
-    records = []
     for row in reader:
         # Parse 'Connected On'
         connected_at = None
@@ -113,8 +112,432 @@ def parse_connections_csv(reader, user_id):
             connected_at,                   # ConnectedAt
             url                             # URL from connections.csv
         )
-        records.append(record)
-    return records
+        yield record
+
+
+# Row parser of each CSV type, see detect_csv_type.
+CSV_PARSERS = {'contacts': parse_contacts_csv, 'connections': parse_connections_csv}
+
+
+def detect_csv_type(fieldnames):
+    """
+    Tell a connections CSV from a contacts CSV by its header.
+
+    Returns:
+      str: 'connections', 'contacts', or None if the header matches neither.
+    """
+    # Normalize header names to lower case and strip whitespace
+    normalized_header = {col.strip().lower() for col in fieldnames}
+
+    # Here we assume that if the header contains a "url" column, it's a connections CSV.
+    if 'url' in normalized_header:
+        return 'connections'
+    if 'firstname' in normalized_header or 'first name' in normalized_header:
+        return 'contacts'
+    return None
+
+
+def _first_record_end(data):
+    """
+    Offset just past the first newline of data that is outside a quoted field, or None.
+    """
+    quotes = 0
+    start = 0
+    while True:
+        pos = data.find(b'\n', start)
+        if pos < 0:
+            return None
+        quotes += data.count(b'"', start, pos)
+        if quotes % 2 == 0:
+            return pos + 1
+        start = pos + 1
+
+
+def _last_record_end(data):
+    """
+    Offset just past the last newline of data that is outside a quoted field, or None.
+    data must start at a record boundary.
+    """
+    total = data.count(b'"')
+    quotes_after = 0
+    end = len(data)
+    while True:
+        pos = data.rfind(b'\n', 0, end)
+        if pos < 0:
+            return None
+        quotes_after += data.count(b'"', pos, end)
+        if (total - quotes_after) % 2 == 0:
+            return pos + 1
+        end = pos
+
+
+def csv_record_chunks(stream, chunk_bytes):
+    """
+    Split a binary UTF-8 CSV stream into chunks of roughly chunk_bytes that should
+    end at record boundaries, i.e. newlines outside quoted fields (an even number of
+    quote characters precedes them). Quotes and newlines are ASCII, so a split never
+    lands inside a multi-byte character. The first chunk is the header record alone;
+    a UTF-8 byte order mark is dropped.
+
+    Quote counting is only a guess: a literal quote inside an unquoted field (27"
+    monitor) throws it off. When no boundary shows up within 2 * chunk_bytes, the
+    chunk is cut at its last newline so memory stays bounded; either way the parser
+    of a chunk checks that it really ended between records (see ChunkRows).
+    """
+    pending = stream.read(chunk_bytes)
+    if pending.startswith(codecs.BOM_UTF8):
+        pending = pending[len(codecs.BOM_UTF8):]
+    find_end = _first_record_end
+    while True:
+        end = find_end(pending)
+        if end is None and len(pending) >= 2 * chunk_bytes:
+            end = pending.rfind(b'\n') + 1 or None
+        if end is not None:
+            yield pending[:end]
+            pending = pending[end:]
+            find_end = _last_record_end
+        block = stream.read(chunk_bytes)
+        if not block:
+            break
+        pending += block
+    if pending:
+        yield pending
+
+
+# Record appended to a chunk to find out whether the chunk ended between records.
+CHUNK_END = '\x00end of chunk\x00'
+
+
+def _with_chunk_end(text):
+    if text and not text.endswith(('\n', '\r')):
+        text += '\n'
+    return text + CHUNK_END + '\n'
+
+
+class ChunkRows:
+    """
+    The rows of one chunk of CSV text, read with csv.DictReader. CHUNK_END is
+    appended to the text; it comes back as a record of its own only if the chunk
+    ends outside a quoted field, otherwise it ends up inside the last field. Once
+    the rows are exhausted, ended_cleanly tells which happened.
+    """
+
+    def __init__(self, text, fieldnames):
+        self.fieldnames = fieldnames
+        self.reader = csv.DictReader(io.StringIO(_with_chunk_end(text), newline=''), fieldnames=fieldnames)
+        self.ended_cleanly = False
+
+    def __iter__(self):
+        previous = None
+        for row in self.reader:
+            if previous is not None:
+                yield previous
+            previous = row
+        self.ended_cleanly = previous is not None and previous[self.fieldnames[0]] == CHUNK_END
+
+
+class ChunkStream(io.RawIOBase):
+    """Binary stream over an iterable of bytes chunks, read as they are needed."""
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self._data = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._data:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self._data = memoryview(chunk)
+        size = min(len(buffer), len(self._data))
+        buffer[:size] = self._data[:size]
+        self._data = self._data[size:]
+        return size
+
+
+def _parse_csv_chunk(chunk, fieldnames, csv_type, user_id):
+    """
+    Process pool job: parse one chunk of CSV records. A CSV error does not discard
+    the records before it; it is returned instead of raised. records is None if the
+    chunk cannot be parsed on its own: it does not end between records or it is not
+    valid UTF-8 (the sequential reader then reports the bad byte).
+
+    Returns:
+      tuple: (records or None, error or None)
+    """
+    try:
+        text = chunk.decode('utf-8')
+    except UnicodeDecodeError:
+        return None, None
+    rows = ChunkRows(text, fieldnames)
+    records = []
+    try:
+        for record in CSV_PARSERS[csv_type](rows, user_id):
+            records.append(record)
+    except csv.Error as e:
+        return records, e
+    if not rows.ended_cleanly:
+        return None, None
+    return records, None
+
+
+def _get_parse_executor():
+    """
+    Process pool for parallel CSV parsing, created on first use. Workers are spawned
+    rather than forked so they do not inherit the web process's threads and sockets.
+    """
+    global _parse_executor
+    if _parse_executor is None:
+        with _parse_executor_lock:
+            if _parse_executor is None:
+                _parse_executor = ProcessPoolExecutor(
+                    max_workers=Config.CONTACT_IMPORT_PARSE_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _parse_executor
+
+
+def parse_csv_parallel(chunks, fieldnames, csv_type, user_id):
+    """
+    Parse chunks from csv_record_chunks() in the process pool and yield their
+    records in file order. Only a few chunks per worker are in flight, so the file
+    is still read as it is consumed. A decode or CSV error is raised after the
+    records that precede it, like the sequential parsers do.
+
+    From the first chunk that does not end between records on, the rest of the file
+    is parsed sequentially, so the records are always those of the sequential reader.
+    """
+    executor = _get_parse_executor()
+    chunks = iter(chunks)
+    in_flight = deque()
+    try:
+        while True:
+            for chunk in chunks:
+                in_flight.append((chunk, executor.submit(_parse_csv_chunk, chunk, fieldnames, csv_type, user_id)))
+                if len(in_flight) >= 2 * Config.CONTACT_IMPORT_PARSE_WORKERS:
+                    break
+            if not in_flight:
+                return
+            records, error = in_flight[0][1].result()
+            if records is None:
+                break
+            in_flight.popleft()
+            yield from records
+            if error:
+                raise error
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+
+    remaining = chain([chunk for chunk, _ in in_flight], chunks)
+    text = io.TextIOWrapper(io.BufferedReader(ChunkStream(remaining)), encoding='utf-8', newline='')
+    reader = csv.DictReader(text, fieldnames=fieldnames)
+    yield from CSV_PARSERS[csv_type](reader, user_id)
+
+
+def open_csv_records(stream, user_id):
+    """
+    Read the header of a binary CSV stream and set up parsing of its rows. The rows
+    are decoded and parsed as they are consumed, instead of reading the file into
+    memory; with CONTACT_IMPORT_PARSE_WORKERS above 1 in a process pool (see
+    parse_csv_parallel). A UTF-8 byte order mark is skipped.
+    Raises UnicodeDecodeError or csv.Error if the header cannot be read.
+
+    Returns:
+      tuple: (fieldnames, csv_type, records); csv_type and records are None if the
+             header is missing or not recognised (see detect_csv_type).
+    """
+    if Config.CONTACT_IMPORT_PARSE_WORKERS > 1:
+        chunks = csv_record_chunks(stream, Config.CONTACT_IMPORT_PARSE_CHUNK_BYTES)
+        header = next(chunks, b'')
+        rows = list(csv.reader(io.StringIO(_with_chunk_end(header.decode('utf-8')), newline='')))
+        if len(rows) == 2 and rows[0] and rows[1] == [CHUNK_END]:
+            fieldnames = rows[0]
+            csv_type = detect_csv_type(fieldnames)
+            if not csv_type:
+                return fieldnames, None, None
+            return fieldnames, csv_type, parse_csv_parallel(chunks, fieldnames, csv_type, user_id)
+        # The header was not split off as one record: read the whole file sequentially.
+        stream = io.BufferedReader(ChunkStream(chain([header], chunks)))
+
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    fieldnames = reader.fieldnames
+    csv_type = detect_csv_type(fieldnames) if fieldnames else None
+    if not csv_type:
+        return fieldnames, None, None
+    return fieldnames, csv_type, CSV_PARSERS[csv_type](reader, user_id)
+
+
+# Columns written by contact imports, in the order of the parsed record tuples.
+CONTACT_COLUMNS = [
+    'user_id', 'FirstName', 'LastName', 'Companies', 'Title', 'Emails', 'PhoneNumbers',
+    'Addresses', 'Sites', 'InstantMessageHandles', 'FullName', 'Birthday', 'Location',
+    'BookmarkedAt', 'Profiles', 'ConnectedAt', 'URL'
+]
+# Multi-row insert for execute_values; rows whose dedup key is already stored are skipped.
+CONTACT_INSERT_QUERY = f"""
+    INSERT INTO relyexchange.contacts ({', '.join(CONTACT_COLUMNS)})
+    VALUES %s
+    ON CONFLICT DO NOTHING
+"""
+# Record field each CSV type is deduplicated on: PhoneNumbers for contacts, URL for connections.
+# Unique indexes on (user_id, phone_key) and (user_id, URL) enforce it (migration 011).
+DEDUP_KEY_INDEX = {'contacts': 6, 'connections': 16}
+
+
+def normalize_phone(value):
+    """
+    Phone number as compared for dedup: digits and '+' only. Must match the
+    phone_key column of relyexchange.contacts.
+    """
+    return re.sub(r'[^0-9+]', '', value or '')
+
+
+# Internal columns of relyexchange.contacts left out of API responses.
+HIDDEN_CONTACT_COLUMNS = {'phone_key'}
+
+
+def contact_from_row(columns, row):
+    """A contacts row as returned by the API, without internal columns."""
+    return {column: value for column, value in zip(columns, row)
+            if column not in HIDDEN_CONTACT_COLUMNS}
+
+
+def dedup_key(record, key_index):
+    """
+    The value a record is deduplicated on, or '' if it has none.
+    """
+    if key_index == DEDUP_KEY_INDEX['contacts']:
+        return normalize_phone(record[key_index])
+    return record[key_index] or ''
+
+
+def unique_records(records, key_index, counts):
+    """
+    Yield the records that have a non-empty dedup key, only the first one per key
+    within the file. counts['parsed'] is incremented for every record read, so the
+    caller can report skipped rows. Rows already stored are left to the unique
+    indexes; only the keys of this file are held in memory.
+    """
+    seen = set()
+    for record in records:
+        counts['parsed'] += 1
+        key = dedup_key(record, key_index)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        yield record
+
+
+def _copy_text_value(value):
+    """
+    Render one value in COPY's text format: \\N for NULL, with backslash, tab,
+    newline and carriage return escaped.
+    """
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class RecordCopyStream:
+    """
+    File-like object feeding records to cursor.copy_expert() in COPY text format.
+    Records are pulled from the iterable only as COPY reads, so a generator of
+    parsed rows is streamed into Postgres without being materialised.
+    """
+
+    def __init__(self, records):
+        self.records = iter(records)
+        self.count = 0
+        self.error = None
+        self._buffer = ''
+
+    def read(self, size=-1):
+        try:
+            while size < 0 or len(self._buffer) < size:
+                record = next(self.records, None)
+                if record is None:
+                    break
+                self.count += 1
+                self._buffer += '\t'.join(_copy_text_value(value) for value in record) + '\n'
+        except Exception as e:
+            # psycopg2 reports read() failures as a generic COPY error; keep the cause.
+            self.error = e
+            raise
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    readline = read
+
+
+def insert_contacts_batched(cur, records, key_index):
+    """
+    Insert parsed contact records with multi-row INSERTs of CONTACT_IMPORT_BATCH_SIZE,
+    skipping records whose dedup key is empty, repeated in the file or already stored
+    for the user.
+
+    Returns:
+      tuple: (rows parsed, rows inserted)
+    """
+    counts = {'parsed': 0}
+    inserted_count = 0
+    # Decode, parse and insert one batch at a time; only the current batch is held in memory.
+    for batch in batched(unique_records(records, key_index, counts), Config.CONTACT_IMPORT_BATCH_SIZE):
+        # One page per batch, so rowcount covers the whole batch.
+        execute_values(cur, CONTACT_INSERT_QUERY, batch, page_size=len(batch))
+        inserted_count += cur.rowcount
+    return counts['parsed'], inserted_count
+
+
+def copy_contacts(cur, records, key_index):
+    """
+    COPY parsed contact records into a temporary staging table, then merge them into
+    relyexchange.contacts with one INSERT ... SELECT ... ON CONFLICT DO NOTHING, so
+    records whose dedup key is empty, repeated in the file or already stored for the
+    user are skipped. Runs in the caller's transaction; the staging table is dropped
+    on commit.
+
+    Returns:
+      tuple: (rows parsed, rows inserted)
+    """
+    columns = ', '.join(CONTACT_COLUMNS)
+    cur.execute(f"""
+        CREATE TEMP TABLE contact_import_staging ON COMMIT DROP AS
+        SELECT {columns} FROM relyexchange.contacts WITH NO DATA
+    """)
+    counts = {'parsed': 0}
+    stream = RecordCopyStream(unique_records(records, key_index, counts))
+    try:
+        cur.copy_expert(f"COPY contact_import_staging ({columns}) FROM STDIN", stream)
+    except Exception:
+        if stream.error:
+            raise stream.error
+        raise
+    cur.execute(f"""
+        INSERT INTO relyexchange.contacts ({columns})
+        SELECT {columns} FROM contact_import_staging
+        ON CONFLICT DO NOTHING
+    """)
+    return counts['parsed'], cur.rowcount
+
+
+def batched(records, size):
+    """
+    Group an iterable of records into lists of at most size records.
+    """
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
 
 @contacts_bp.route('/upload/<user_id>', methods=['POST'])
 def upload_csv(user_id):
@@ -122,7 +545,12 @@ def upload_csv(user_id):
     Upload a CSV file that could be either a contacts CSV or a connections CSV.
     The file type is detected by inspecting the CSV header.
     This version performs duplicate checking based on PhoneNumbers for contacts
-    and URL for connections.
+    and URL for connections, both within the file and against stored contacts.
+    The upload is decoded and parsed as it is read and streamed into the database, so
+    memory use does not grow with the size of the file: with CONTACT_IMPORT_COPY via
+    COPY into a staging table (see copy_contacts), otherwise in multi-row INSERTs of
+    CONTACT_IMPORT_BATCH_SIZE rows.
+    The response reports how many rows were inserted and how many were skipped.
     """
     # Validate user_id
     try:
@@ -141,77 +569,120 @@ def upload_csv(user_id):
         return jsonify({'error': 'File is not a CSV file.'}), 400
 
     try:
-        file_stream = StringIO(file.stream.read().decode("UTF8"), newline=None)
-    except Exception as e:
+        # Decide parser based on header content.
+        fieldnames, csv_type, records = open_csv_records(file.stream, user_id)
+    except (UnicodeDecodeError, csv.Error) as e:
         return jsonify({'error': f'Error reading file: {str(e)}'}), 400
-
-    reader = csv.DictReader(file_stream)
-    if not reader.fieldnames:
+    if not fieldnames:
         return jsonify({'error': 'CSV file is empty or missing header row.'}), 400
+    if not csv_type:
+        return jsonify({'error': 'Unrecognized CSV format.'}), 400
 
-    # Normalize header names to lower case and strip whitespace
-    normalized_header = {col.strip().lower() for col in reader.fieldnames}
+    try:
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Duplicate Check (enforced by unique indexes):
+            # For contacts CSV, check by normalised PhoneNumbers.
+            # For connections CSV, check by URL.
+            ingest = copy_contacts if Config.CONTACT_IMPORT_COPY else insert_contacts_batched
+            try:
+                parsed_count, inserted_count = ingest(cur, records, DEDUP_KEY_INDEX[csv_type])
+            except (UnicodeDecodeError, csv.Error) as e:
+                return jsonify({'error': f'Error reading file: {str(e)}'}), 400
 
-    # Decide parser based on header content.
-    # Here we assume that if the header contains a "url" column, it's a connections CSV.
-    if 'url' in normalized_header:
-        csv_type = 'connections'
-        records = parse_connections_csv(reader, user_id)
-    elif 'firstname' in normalized_header or 'first name' in normalized_header:
-        csv_type = 'contacts'
-        records = parse_contacts_csv(reader, user_id)
-    else:
-        return jsonify({'error': 'Unrecognized CSV format.'}), 400
+            if not parsed_count:
+                return jsonify({'error': 'No data found in CSV file.'}), 400
+            counts = {'inserted': inserted_count, 'skipped': parsed_count - inserted_count}
+            if not inserted_count:
+                return jsonify({'message': 'No new contacts to insert.', **counts}), 200
 
-    if not records:
-        return jsonify({'error': 'No data found in CSV file.'}), 400
+            conn.commit()
+            return jsonify({'message': f'Successfully inserted {inserted_count} contacts.', **counts}), 201
 
-    # Build the INSERT query. Now includes URL column.
-    insert_query = """
-        INSERT INTO relyexchange.contacts (
-            user_id, FirstName, LastName, Companies, Title, Emails, PhoneNumbers,
-            Addresses, Sites, InstantMessageHandles, FullName, Birthday, Location,
-            BookmarkedAt, Profiles, ConnectedAt, URL
-        )
-        VALUES %s
+    except Exception as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+
+
+@contacts_bp.route('/imports/<user_id>', methods=['POST'])
+def create_import_job(user_id):
+    """
+    Queue a contacts or connections CSV for import in the background, for files too
+    large to import within a request (see upload_csv for the format). The upload is
+    stored and a worker imports it in batches of CONTACT_IMPORT_BATCH_SIZE rows.
+    Poll GET /contacts/imports/<user_id>/<job_id> for progress.
+    At most CONTACT_IMPORT_MAX_ACTIVE_PER_USER imports per user are queued or running.
     """
+    try:
+        uuid.UUID(user_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid user_id format. Must be a UUID.'}), 400
 
+    if 'contact' not in request.files:
+        return jsonify({'error': 'No file part in the request.'}), 400
+
+    file = request.files['contact']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected for uploading.'}), 400
+
+    if not file.filename.endswith('.csv'):
+        return jsonify({'error': 'File is not a CSV file.'}), 400
+
+    try:
+        job_id = submit_import_job(user_id, file)
+    except ImportLimitReached:
+        response = jsonify({'error': 'Too many contact imports in progress for this user.'})
+        response.headers['Retry-After'] = '30'
+        return response, 429
+    except Exception as e:
+        return jsonify({'error': f'Could not queue import: {str(e)}'}), 500
+
+    response = jsonify({'job_id': job_id, 'status': 'queued'})
+    response.headers['Location'] = url_for('contacts.get_import_job', user_id=user_id, job_id=job_id)
+    return response, 202
+
+
+@contacts_bp.route('/imports/<user_id>', methods=['GET'])
+def get_import_jobs(user_id):
+    """
+    List the user's most recent import jobs, newest first (?limit=, default 20, max 100).
+    """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Duplicate Check:
-        # For contacts CSV, check by PhoneNumbers.
-        # For connections CSV, check by URL.
-        if csv_type == 'connections':
-            # Fetch existing URLs for the user.
-            cur.execute("SELECT URL FROM relyexchange.contacts WHERE user_id = %s", (user_id,))
-            existing_records = cur.fetchall()
-            existing_urls = {rec[0] for rec in existing_records if rec[0]}
-            new_records = [r for r in records if r[16] and r[16] not in existing_urls]
-        else:
-            # For contacts CSV, use PhoneNumbers duplicate check.
-            cur.execute("SELECT PhoneNumbers FROM relyexchange.contacts WHERE user_id = %s", (user_id,))
-            existing_records = cur.fetchall()
-            existing_numbers = {rec[0] for rec in existing_records if rec[0]}
-            new_records = [r for r in records if r[6] and r[6] not in existing_numbers]
-
-        if not new_records:
-            cur.close()
-            conn.close()
-            return jsonify({'message': 'No new contacts to insert.'}), 200
-
-        execute_values(cur, insert_query, new_records)
-        conn.commit()
-        inserted_count = len(new_records)
-        cur.close()
-        conn.close()
-        return jsonify({'message': f'Successfully inserted {inserted_count} contacts.'}), 201
+        uuid.UUID(user_id)
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    except ValueError:
+        return jsonify({'error': 'Invalid user_id or limit.'}), 400
 
+    try:
+        with get_db_connection() as conn, conn.cursor() as cur:
+            jobs = list_import_jobs(cur, user_id, limit)
+        return jsonify({'imports': jobs}), 200
     except Exception as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
 
+@contacts_bp.route('/imports/<user_id>/<job_id>', methods=['GET'])
+def get_import_job(user_id, job_id):
+    """
+    Status of an import job: status ('queued', 'running', 'done' or 'failed'), rows
+    processed, inserted and skipped so far, per-row errors (up to
+    CONTACT_IMPORT_MAX_ERRORS, as {'row': n, 'error': message}) and, for a failed
+    job, the error that stopped it.
+    """
+    try:
+        uuid.UUID(user_id)
+        uuid.UUID(job_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid user_id or job_id format. Must be a UUID.'}), 400
+
+    try:
+        with get_db_connection() as conn, conn.cursor() as cur:
+            job = load_import_job(cur, user_id, job_id)
+    except Exception as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    if not job:
+        return jsonify({'error': 'Import job not found.'}), 404
+    return jsonify(job), 200
+
 
 # @contacts_bp.route('/upload/<user_id>', methods=['POST'])
 # def upload_csv(user_id):
@@ -340,65 +811,60 @@ def get_contact(user_id):
         return jsonify({'error': 'Invalid user_id format. Must be a UUID.'}), 400
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Get total count of contacts for pagination metadata
+            cur.execute(
+                "SELECT COUNT(*) FROM relyexchange.contacts WHERE user_id = %s",
+                (user_id,)
+            )
+            total_contacts = cur.fetchone()[0]
         
-        # Get total count of contacts for pagination metadata
-        cur.execute(
-            "SELECT COUNT(*) FROM relyexchange.contacts WHERE user_id = %s",
-            (user_id,)
-        )
-        total_contacts = cur.fetchone()[0]
+            # Execute paginated query
+            cur.execute("""
+                SELECT * FROM relyexchange.contacts 
+                WHERE user_id = %s 
+                ORDER BY id 
+                LIMIT %s OFFSET %s
+            """, (user_id, per_page, offset))
+            rows = cur.fetchall()
         
-        # Execute paginated query
-        cur.execute("""
-            SELECT * FROM relyexchange.contacts 
-            WHERE user_id = %s 
-            ORDER BY id 
-            LIMIT %s OFFSET %s
-        """, (user_id, per_page, offset))
-        rows = cur.fetchall()
+            # If no contacts are found, return an empty list with pagination metadata
+            if not rows:
+                pagination = {
+                    'total': total_contacts,
+                    'page': page,
+                    'per_page': per_page,
+                    'total_pages': (total_contacts + per_page - 1) // per_page,
+                    'has_next': False,
+                    'has_prev': page > 1
+                }
+                return jsonify({
+                    'contacts': [],
+                    'pagination': pagination,
+                    'message': 'No contacts found for this page.'
+                }), 200
+
+            # Get column names from the cursor description
+            columns = [desc[0] for desc in cur.description]
+            # Create a list of dictionaries, each representing a contact
+            contacts = [contact_from_row(columns, row) for row in rows]
         
-        # If no contacts are found, return an empty list with pagination metadata
-        if not rows:
+            # Calculate pagination metadata
+            total_pages = (total_contacts + per_page - 1) // per_page
             pagination = {
                 'total': total_contacts,
                 'page': page,
                 'per_page': per_page,
-                'total_pages': (total_contacts + per_page - 1) // per_page,
-                'has_next': False,
+                'total_pages': total_pages,
+                'has_next': page < total_pages,
                 'has_prev': page > 1
             }
+        
+            # Return the response with pagination metadata
             return jsonify({
-                'contacts': [],
-                'pagination': pagination,
-                'message': 'No contacts found for this page.'
+                'contacts': contacts,
+                'pagination': pagination
             }), 200
-
-        # Get column names from the cursor description
-        columns = [desc[0] for desc in cur.description]
-        # Create a list of dictionaries, each representing a contact
-        contacts = [dict(zip(columns, row)) for row in rows]
-        
-        # Calculate pagination metadata
-        total_pages = (total_contacts + per_page - 1) // per_page
-        pagination = {
-            'total': total_contacts,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': total_pages,
-            'has_next': page < total_pages,
-            'has_prev': page > 1
-        }
-        
-        cur.close()
-        conn.close()
-        
-        # Return the response with pagination metadata
-        return jsonify({
-            'contacts': contacts,
-            'pagination': pagination
-        }), 200
         
     except Exception as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -444,48 +910,43 @@ def update_contact(user_id, contact_id):
                 return jsonify({'error': 'BookmarkedAt must be in YYYY-MM-DD HH:MM:SS or YYYY-MM-DD format'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # First verify the contact belongs to the user
-        cur.execute(
-            "SELECT id FROM relyexchange.contacts WHERE id = %s AND user_id = %s",
-            (contact_id, user_id)
-        )
-        if not cur.fetchone():
-            cur.close()
-            conn.close()
-            return jsonify({'error': 'Contact not found or does not belong to the user'}), 404
-
-        # Build the update query dynamically
-        set_clause = ", ".join([f"{key} = %s" for key in data.keys()])
-        values = list(data.values())
-        values.extend([contact_id, user_id])  # Add WHERE clause parameters
-
-        update_query = f"""
-            UPDATE relyexchange.contacts 
-            SET {set_clause}
-            WHERE id = %s AND user_id = %s
-            RETURNING *
-        """
-
-        cur.execute(update_query, values)
-        updated_contact = cur.fetchone()
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # First verify the contact belongs to the user
+            cur.execute(
+                "SELECT id FROM relyexchange.contacts WHERE id = %s AND user_id = %s",
+                (contact_id, user_id)
+            )
+            if not cur.fetchone():
+                return jsonify({'error': 'Contact not found or does not belong to the user'}), 404
+
+            # Build the update query dynamically
+            set_clause = ", ".join([f"{key} = %s" for key in data.keys()])
+            values = list(data.values())
+            values.extend([contact_id, user_id])  # Add WHERE clause parameters
+
+            update_query = f"""
+                UPDATE relyexchange.contacts 
+                SET {set_clause}
+                WHERE id = %s AND user_id = %s
+                RETURNING *
+            """
+
+            cur.execute(update_query, values)
+            updated_contact = cur.fetchone()
         
-        conn.commit()
-
-        # Convert the returned tuple to a dictionary
-        columns = [desc[0] for desc in cur.description]
-        updated_contact_dict = dict(zip(columns, updated_contact))
+            conn.commit()
 
-        cur.close()
-        conn.close()
+            # Convert the returned tuple to a dictionary
+            columns = [desc[0] for desc in cur.description]
+            updated_contact_dict = contact_from_row(columns, updated_contact)
 
-        return jsonify({
-            'message': 'Contact updated successfully',
-            'contact': updated_contact_dict
-        }), 200
+            return jsonify({
+                'message': 'Contact updated successfully',
+                'contact': updated_contact_dict
+            }), 200
 
+    except psycopg2.errors.UniqueViolation:
+        return jsonify({'error': 'Contact with this phone number already exists for the user.'}), 409
     except Exception as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
@@ -498,29 +959,24 @@ def get_specific_contact(user_id, contact_id):
         return jsonify({'error': 'Invalid user_id or contact_id format. Must be UUIDs.'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Get the specific contact
-        cur.execute("""
-            SELECT * FROM relyexchange.contacts 
-            WHERE user_id = %s AND id = %s
-        """, (user_id, contact_id))
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Get the specific contact
+            cur.execute("""
+                SELECT * FROM relyexchange.contacts 
+                WHERE user_id = %s AND id = %s
+            """, (user_id, contact_id))
         
-        row = cur.fetchone()
+            row = cur.fetchone()
         
-        if not row:
-            return jsonify({'error': 'Contact not found or does not belong to the user'}), 404
+            if not row:
+                return jsonify({'error': 'Contact not found or does not belong to the user'}), 404
 
-        # Get column names from the cursor description
-        columns = [desc[0] for desc in cur.description]
-        # Create a dictionary representing the contact
-        contact = dict(zip(columns, row))
-        
-        cur.close()
-        conn.close()
+            # Get column names from the cursor description
+            columns = [desc[0] for desc in cur.description]
+            # Create a dictionary representing the contact
+            contact = contact_from_row(columns, row)
         
-        return jsonify({'contact': contact}), 200
+            return jsonify({'contact': contact}), 200
         
     except Exception as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -534,22 +990,17 @@ def get_user_contacts_count(user_id):
         return jsonify({'error': 'Invalid user_id format. Must be a UUID.'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Query to count contacts for the specific user_id
-        cur.execute("""
-            SELECT COUNT(*) as contact_count
-            FROM relyexchange.contacts
-            WHERE user_id = %s
-        """, (user_id,))
-        
-        contact_count = cur.fetchone()[0]
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Query to count contacts for the specific user_id
+            cur.execute("""
+                SELECT COUNT(*) as contact_count
+                FROM relyexchange.contacts
+                WHERE user_id = %s
+            """, (user_id,))
         
-        cur.close()
-        conn.close()
+            contact_count = cur.fetchone()[0]
         
-        return jsonify({'user_id': user_id, 'contact_count': contact_count}), 200
+            return jsonify({'user_id': user_id, 'contact_count': contact_count}), 200
         
     except Exception as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -598,63 +1049,60 @@ def add_contact(user_id):
                 return jsonify({'error': 'BookmarkedAt must be in YYYY-MM-DD HH:MM:SS or YYYY-MM-DD format'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Check if the phone number already exists for the user
-        phone_number = data.get('PhoneNumbers')
-        if phone_number:
-            cur.execute("""
-                SELECT 1 FROM relyexchange.contacts 
-                WHERE user_id = %s AND PhoneNumbers = %s
-            """, (user_id, phone_number))
-            if cur.fetchone():
-                cur.close()
-                conn.close()
-                return jsonify({'error': 'Contact with this phone number already exists for the user.'}), 409
-
-        # Insert the new contact
-        insert_query = """
-            INSERT INTO relyexchange.contacts (
-                user_id, FirstName, LastName, Companies, Title, Emails, PhoneNumbers,
-                Addresses, Sites, InstantMessageHandles, FullName, Birthday, Location,
-                BookmarkedAt, Profiles
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING *
-        """
-        cur.execute(insert_query, (
-            user_id,
-            data.get('FirstName'),
-            data.get('LastName'),
-            data.get('Companies'),
-            data.get('Title'),
-            data.get('Emails'),
-            data.get('PhoneNumbers'),
-            data.get('Addresses'),
-            data.get('Sites'),
-            data.get('InstantMessageHandles'),
-            data.get('FullName'),
-            birthday,
-            data.get('Location'),
-            bookmarked_at,
-            data.get('Profiles')
-        ))
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Check if the phone number already exists for the user, compared the way
+            # the (user_id, phone_key) unique index compares it.
+            phone_key = normalize_phone(data.get('PhoneNumbers'))
+            if phone_key:
+                cur.execute("""
+                    SELECT 1 FROM relyexchange.contacts 
+                    WHERE user_id = %s AND phone_key = %s
+                """, (user_id, phone_key))
+                if cur.fetchone():
+                    return jsonify({'error': 'Contact with this phone number already exists for the user.'}), 409
+
+            # Insert the new contact
+            insert_query = """
+                INSERT INTO relyexchange.contacts (
+                    user_id, FirstName, LastName, Companies, Title, Emails, PhoneNumbers,
+                    Addresses, Sites, InstantMessageHandles, FullName, Birthday, Location,
+                    BookmarkedAt, Profiles
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING *
+            """
+            cur.execute(insert_query, (
+                user_id,
+                data.get('FirstName'),
+                data.get('LastName'),
+                data.get('Companies'),
+                data.get('Title'),
+                data.get('Emails'),
+                data.get('PhoneNumbers'),
+                data.get('Addresses'),
+                data.get('Sites'),
+                data.get('InstantMessageHandles'),
+                data.get('FullName'),
+                birthday,
+                data.get('Location'),
+                bookmarked_at,
+                data.get('Profiles')
+            ))
         
-        new_contact = cur.fetchone()
-        conn.commit()
-
-        # Convert the returned tuple to a dictionary
-        columns = [desc[0] for desc in cur.description]
-        new_contact_dict = dict(zip(columns, new_contact))
+            new_contact = cur.fetchone()
+            conn.commit()
 
-        cur.close()
-        conn.close()
+            # Convert the returned tuple to a dictionary
+            columns = [desc[0] for desc in cur.description]
+            new_contact_dict = contact_from_row(columns, new_contact)
 
-        return jsonify({
-            'message': 'Contact added successfully',
-            'contact': new_contact_dict
-        }), 201
+            return jsonify({
+                'message': 'Contact added successfully',
+                'contact': new_contact_dict
+            }), 201
 
+    except psycopg2.errors.UniqueViolation:
+        # A concurrent insert of the same phone number won the race.
+        return jsonify({'error': 'Contact with this phone number already exists for the user.'}), 409
     except Exception as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
@@ -673,22 +1121,19 @@ def search_contacts(user_id):
         return jsonify({'error': 'Invalid user_id format. Must be a UUID.'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        pattern = f'%{search_term}%'
-        query = """
-            SELECT * FROM relyexchange.contacts
-            WHERE user_id = %s AND (
-                FirstName ILIKE %s OR LastName ILIKE %s OR FullName ILIKE %s OR PhoneNumbers ILIKE %s
-            )
-        """
-        cur.execute(query, (user_id, pattern, pattern, pattern, pattern))
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        results = [dict(zip(columns, row)) for row in rows]
-        cur.close()
-        conn.close()
-        return jsonify({'contacts': results, 'count': len(results)}), 200
+        with get_db_connection() as conn, conn.cursor() as cur:
+            pattern = f'%{search_term}%'
+            query = """
+                SELECT * FROM relyexchange.contacts
+                WHERE user_id = %s AND (
+                    FirstName ILIKE %s OR LastName ILIKE %s OR FullName ILIKE %s OR PhoneNumbers ILIKE %s
+                )
+            """
+            cur.execute(query, (user_id, pattern, pattern, pattern, pattern))
+            rows = cur.fetchall()
+            columns = [desc[0] for desc in cur.description]
+            results = [contact_from_row(columns, row) for row in rows]
+            return jsonify({'contacts': results, 'count': len(results)}), 200
     except Exception as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
@@ -721,56 +1166,51 @@ def filter_contacts(user_id):
     offset = (page - 1) * per_page
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Base queries
-        count_query = "SELECT COUNT(*) FROM relyexchange.contacts WHERE user_id = %s"
-        query = "SELECT * FROM relyexchange.contacts WHERE user_id = %s"
-        params = [user_id]
-
-        # Apply ordering based on parameter
-        if order == 'oldest':
-            query += " ORDER BY createdat ASC"
-        elif order == 'newest':
-            query += " ORDER BY createdat DESC"
-        else:  # alphabet
-            query += " ORDER BY FirstName ASC"
-
-        # Add pagination
-        query += " LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
-
-        # Get total count first
-        cur.execute(count_query, [user_id])
-        total_contacts = cur.fetchone()[0]
-
-        # Execute the main query with pagination
-        cur.execute(query, tuple(params))
-        rows = cur.fetchall()
-        columns = [desc[0] for desc in cur.description]
-        contacts = [dict(zip(columns, row)) for row in rows]
-
-        # Calculate pagination metadata
-        total_pages = (total_contacts + per_page - 1) // per_page
-        pagination = {
-            'total': total_contacts,
-            'page': page,
-            'per_page': per_page,
-            'total_pages': total_pages,
-            'has_next': page < total_pages,
-            'has_prev': page > 1
-        }
-
-        cur.close()
-        conn.close()
-
-        return jsonify({
-            'contacts': contacts,
-            'pagination': pagination,
-            'count': len(contacts),
-            'order': order
-        }), 200
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Base queries
+            count_query = "SELECT COUNT(*) FROM relyexchange.contacts WHERE user_id = %s"
+            query = "SELECT * FROM relyexchange.contacts WHERE user_id = %s"
+            params = [user_id]
+
+            # Apply ordering based on parameter
+            if order == 'oldest':
+                query += " ORDER BY createdat ASC"
+            elif order == 'newest':
+                query += " ORDER BY createdat DESC"
+            else:  # alphabet
+                query += " ORDER BY FirstName ASC"
+
+            # Add pagination
+            query += " LIMIT %s OFFSET %s"
+            params.extend([per_page, offset])
+
+            # Get total count first
+            cur.execute(count_query, [user_id])
+            total_contacts = cur.fetchone()[0]
+
+            # Execute the main query with pagination
+            cur.execute(query, tuple(params))
+            rows = cur.fetchall()
+            columns = [desc[0] for desc in cur.description]
+            contacts = [contact_from_row(columns, row) for row in rows]
+
+            # Calculate pagination metadata
+            total_pages = (total_contacts + per_page - 1) // per_page
+            pagination = {
+                'total': total_contacts,
+                'page': page,
+                'per_page': per_page,
+                'total_pages': total_pages,
+                'has_next': page < total_pages,
+                'has_prev': page > 1
+            }
+
+            return jsonify({
+                'contacts': contacts,
+                'pagination': pagination,
+                'count': len(contacts),
+                'order': order
+            }), 200
     except Exception as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
@@ -783,33 +1223,28 @@ def get_simple_contacts(user_id):
         return jsonify({'error': 'Invalid user_id format. Must be a UUID.'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Query to get only id, name, and phone number
-        cur.execute("""
-            SELECT id, FirstName, LastName, PhoneNumbers
-            FROM relyexchange.contacts 
-            WHERE user_id = %s 
-            ORDER BY FirstName, LastName
-        """, (user_id,))
-        
-        rows = cur.fetchall()
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Query to get only id, name, and phone number
+            cur.execute("""
+                SELECT id, FirstName, LastName, PhoneNumbers
+                FROM relyexchange.contacts 
+                WHERE user_id = %s 
+                ORDER BY FirstName, LastName
+            """, (user_id,))
         
-        # Create a list of simplified contact information
-        simple_contacts = [{
-            'id': row[0],
-            'name': f"{row[1] or ''} {row[2] or ''}".strip(),
-            'phone_number': row[3]
-        } for row in rows]
+            rows = cur.fetchall()
         
-        cur.close()
-        conn.close()
+            # Create a list of simplified contact information
+            simple_contacts = [{
+                'id': row[0],
+                'name': f"{row[1] or ''} {row[2] or ''}".strip(),
+                'phone_number': row[3]
+            } for row in rows]
         
-        return jsonify({
-            'contacts': simple_contacts,
-            'count': len(simple_contacts)
-        }), 200
+            return jsonify({
+                'contacts': simple_contacts,
+                'count': len(simple_contacts)
+            }), 200
         
     except Exception as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -1,144 +1,383 @@
-from flask import Blueprint, request, jsonify
-import uuid, psycopg2, json
+from flask import Blueprint, current_app, request, jsonify
+import uuid, json
+from psycopg2.extras import execute_values
 from datetime import datetime
+from app.cache import (
+    canonical_post_id, invalidate_post_commenters, invalidate_post_documents, post_document_cache
+)
 from app.config import Config
-import boto3
-from botocore.exceptions import NoCredentialsError
+from app.db import get_db_connection
+from app.idempotency import idempotent
+from app.etags import make_etag, not_modified, presign_epoch, with_etag
+from app.media import media_for_response, schedule_media_processing
+from app.pagination import encode_cursor, decode_cursor, parse_page_limit
+from app.storage import (
+    ATTACHMENT_BUCKET, ATTACHMENT_FOLDERS, AttachmentTooLarge, acquire_attachment_object,
+    attachment_extension, attachment_request_limit, convert_to_presigned_url, direct_upload_key,
+    head_attachment, is_direct_upload_key, object_url, presign_attachment_upload,
+    release_attachment_object, spool_attachment, start_attachment_upload
+)
 
 posts_bp = Blueprint('posts', __name__)
 
-def get_db_connection():
-    conn = psycopg2.connect(
-        host=Config.DB_HOST,
-        port=Config.DB_PORT,
-        dbname=Config.DB_NAME,
-        user=Config.DB_USER,
-        password=Config.DB_PASSWORD
-    )
-    return conn
-
-def is_registered_user(user_id, cur):
+def resolve_tagged_ids(tagged_ids, owner_id, cur):
     """
-    Check if a given user_id exists in the registered users table.
+    Classify the IDs a post tags (mentions and shares) with two set-based queries:
+    one against registered users and one against the owner's contacts.
+
+    Returns:
+      dict: Maps each tagged ID, as sent by the client, to ('registered', id),
+            ('contact', id), or None when it is neither a registered user nor a
+            contact of the owner. Resolved IDs are in canonical UUID form.
     """
+    canonical = {}
+    for tagged_id in tagged_ids:
+        try:
+            canonical[tagged_id] = str(uuid.UUID(tagged_id))
+        except (ValueError, TypeError, AttributeError):
+            canonical[tagged_id] = None
+
+    candidate_ids = sorted({value for value in canonical.values() if value})
+    registered = set()
+    contacts = set()
+    if candidate_ids:
+        cur.execute(
+            "SELECT id FROM relyexchange.users WHERE id = ANY(%s::uuid[])",
+            (candidate_ids,)
+        )
+        registered = {str(row[0]) for row in cur.fetchall()}
+
+        remaining = [value for value in candidate_ids if value not in registered]
+        if remaining:
+            cur.execute('''SELECT id
+                           FROM relyexchange.contacts
+                           WHERE user_id = %s AND id = ANY(%s::uuid[])''', (owner_id, remaining))
+            contacts = {str(row[0]) for row in cur.fetchall()}
+
+    resolved = {}
+    for tagged_id, value in canonical.items():
+        if value in registered:
+            resolved[tagged_id] = ('registered', value)
+        elif value in contacts:
+            resolved[tagged_id] = ('contact', value)
+        else:
+            resolved[tagged_id] = None
+    return resolved
 
-    try:
-        uuid.UUID(user_id)
-    except ValueError:
-        return False
 
-    cur.execute("SELECT id FROM relyexchange.users WHERE id = %s", (user_id,))
-    return cur.fetchone() is not None
+def tag_rows(post_id, tagged_ids, resolved):
+    """
+    Build (post_id, user_id, contact_id) rows for post_mentions / post_shares,
+    dropping repeated IDs while keeping the client's order.
+    """
+    rows = []
+    seen = set()
+    for tagged_id in tagged_ids:
+        kind, value = resolved[tagged_id]
+        if value in seen:
+            continue
+        seen.add(value)
+        if kind == 'registered':
+            rows.append((post_id, value, None))
+        else:
+            rows.append((post_id, None, value))
+    return rows
 
 
-def is_contact_of_user(contact_id, owner_id, cur):
+def inbox_rows(post_id, author_id, created_at, mention_rows, share_rows):
+    """
+    Build (user_id, post_id, author_id, created_at, mentioned, shared) rows for
+    relyexchange.post_inbox: one per registered user that was mentioned in or shared with the post.
+    Contacts have no feed and are skipped.
     """
-    Check if the provided contact_id belongs to the owner's contacts.
-    Also return the contact's name.
+    reasons = {}
+    for _, tagged_user_id, _ in mention_rows:
+        if tagged_user_id:
+            reasons.setdefault(tagged_user_id, [False, False])[0] = True
+    for _, tagged_user_id, _ in share_rows:
+        if tagged_user_id:
+            reasons.setdefault(tagged_user_id, [False, False])[1] = True
+    return [
+        (tagged_user_id, post_id, author_id, created_at, mentioned, shared)
+        for tagged_user_id, (mentioned, shared) in reasons.items()
+    ]
+
+
+def tagged_person_from_row(user_id, user_name, contact_id, firstname, lastname):
     """
-    cur.execute('''SELECT id, "firstname", "lastname" 
-                   FROM relyexchange.contacts 
-                   WHERE id = %s AND user_id = %s''', (contact_id, owner_id))
-    return cur.fetchone()
+    Build the mention/share entry for a post_mentions or post_shares row.
+    Returns None when the row references neither a user nor a contact.
+    """
+    if user_id:  # Registered user.
+        return {
+            'user_id': user_id,
+            'name': user_name,
+            'type': 'registered'
+        }
+    if contact_id:  # Contact of the posting user.
+        return {
+            'contact_id': contact_id,
+            'name': f"{firstname} {lastname}" if firstname and lastname else None,
+            'type': 'contact'
+        }
+    return None
 
-# --- Supabase Storage / S3 configuration ---
 
-print(Config.S3_URL)
-s3_url = Config.S3_URL 
-access_key = Config.S3_ACCESS_KEY 
-secret_key = Config.S3_SECRET_KEY
-session = boto3.session.Session()
-s3_client = session.client(
-    's3',
-    endpoint_url=s3_url,
-    aws_access_key_id=access_key,
-    aws_secret_access_key=secret_key
-)
+def load_post_relations(post_ids, cur):
+    """
+    Batch-load mentions, shares and non-deleted comments for several posts.
+    Issues one query per relation regardless of how many posts are given.
 
-def upload_file_to_supabase(bucket_name, file_obj, folder_name, file_name):
+    Returns:
+      tuple: (mentions_by_post, shares_by_post, comments_by_post), three dicts mapping
+             post_id to the list of entries in the same shape get_post returns.
     """
-    Uploads a file object to Supabase Storage (S3) under a given folder and returns the public URL.
+    mentions_by_post = {}
+    shares_by_post = {}
+    comments_by_post = {}
+    if not post_ids:
+        return mentions_by_post, shares_by_post, comments_by_post
+
+    post_ids = list(post_ids)
+
+    cur.execute("""
+        SELECT pm.post_id, pm.mentioned_user_id, u.name,
+               pm.mentioned_contact_id, c."firstname", c."lastname"
+        FROM relyexchange.post_mentions pm
+        LEFT JOIN relyexchange.users u ON pm.mentioned_user_id = u.id
+        LEFT JOIN relyexchange.contacts c ON pm.mentioned_contact_id = c.id
+        WHERE pm.post_id = ANY(%s::uuid[])
+    """, (post_ids,))
+    for row in cur.fetchall():
+        mention = tagged_person_from_row(*row[1:])
+        if mention:
+            mentions_by_post.setdefault(row[0], []).append(mention)
+
+    cur.execute("""
+        SELECT ps.post_id, ps.shared_with_user_id, u.name,
+               ps.shared_contact_id, c."firstname", c."lastname"
+        FROM relyexchange.post_shares ps
+        LEFT JOIN relyexchange.users u ON ps.shared_with_user_id = u.id
+        LEFT JOIN relyexchange.contacts c ON ps.shared_contact_id = c.id
+        WHERE ps.post_id = ANY(%s::uuid[])
+    """, (post_ids,))
+    for row in cur.fetchall():
+        share = tagged_person_from_row(*row[1:])
+        if share:
+            shares_by_post.setdefault(row[0], []).append(share)
+
+    cur.execute("""
+        SELECT c.comment_id, c.post_id, c.user_id, u.name, c.content, c.created_at
+        FROM relyexchange.comments c
+        LEFT JOIN relyexchange.users u ON c.user_id = u.id
+        WHERE c.post_id = ANY(%s::uuid[]) AND c.is_deleted = false
+        ORDER BY c.created_at ASC
+    """, (post_ids,))
+    for row in cur.fetchall():
+        comments_by_post.setdefault(row[1], []).append({
+            'comment_id': row[0],
+            'post_id': row[1],
+            'user_id': row[2],
+            'user_name': row[3],
+            'content': row[4],
+            'created_at': row[5]
+        })
+
+    return mentions_by_post, shares_by_post, comments_by_post
+
+
+POST_VIEWS = ['full', 'counts']
+
+
+def parse_post_view(args):
     """
-    try:
-        object_key = f"{folder_name}/{file_name}"
-        s3_client.upload_fileobj(file_obj, bucket_name, object_key)
-        file_url = f"{s3_client.meta.endpoint_url}/{bucket_name}/{object_key}"
-        return file_url
-    except FileNotFoundError:
-        print("The file was not found.")
-        return None
-    except NoCredentialsError:
-        print("Credentials not available.")
-        return None
-
-
-def convert_to_presigned_url(url, bucket, expires_in=3600):
-    """
-    Convert a stored S3 URL to a presigned URL.
-    
-    Parameters:
-      url (str): The original S3 URL.
-      bucket (str): The name of the S3 bucket.
-      expires_in (int): Time in seconds for the presigned URL to remain valid.
-    
+    Read and validate the `view` query parameter of post listings.
+
     Returns:
-      str: A presigned URL if url is not None and the object key can be determined; otherwise, the original URL or None.
+      str: 'full' (default) or 'counts'.
+
+    Raises:
+      ValueError: If the view is not one of POST_VIEWS.
     """
-    if not url:
-        return None
+    view = args.get('view', 'full')
+    if view not in POST_VIEWS:
+        raise ValueError(f"view must be one of {', '.join(POST_VIEWS)}")
+    return view
 
-    try:
-        # Assume the URL is formatted as: <endpoint_url>/<bucket>/<object_key>
-        parts = url.split(f"/{bucket}/")
-        if len(parts) < 2:
-            # If the URL doesn't match our expected format, return it unchanged.
-            return url
-        
-        object_key = parts[-1]
-        # Generate a presigned URL using the globally configured s3_client.
-        presigned_url = s3_client.generate_presigned_url(
-            ClientMethod="get_object",
-            Params={"Bucket": bucket, "Key": object_key},
-            ExpiresIn=expires_in
+
+def posts_from_rows(rows, cur, view='full'):
+    """
+    Build response entries for a page of rows starting with (post_id, user_id, content,
+    attachment_url, created_at, attachment_status, media, comment_count, mention_count,
+    share_count). The 'full' view adds mentions, shares and comments; the 'counts'
+    view returns only the counters and reads nothing else.
+    """
+    if view == 'full':
+        # One query per relation for the whole page instead of three per post.
+        mentions_by_post, shares_by_post, comments_by_post = load_post_relations(
+            [row[0] for row in rows], cur
         )
-        return presigned_url
-    except Exception as e:
-        print(f"Error generating presigned URL: {e}")
-        return url
+    posts = []
+    for row in rows:
+        post_id = row[0]
+        attachment_url = row[3]
+        presigned_url = convert_to_presigned_url(attachment_url, bucket="relyexchange", expires_in=3600)
+        post = {
+            'post_id': row[0],
+            'user_id': row[1],
+            'content': row[2],
+            'attachment_url': presigned_url,
+            'created_at': row[4],
+            'attachment_status': row[5],
+            'attachment_media': media_for_response(row[6], "relyexchange"),
+            'comment_count': row[7],
+            'mention_count': row[8],
+            'share_count': row[9]
+        }
+        if view == 'full':
+            post['mentions'] = mentions_by_post.get(post_id, [])
+            post['shares'] = shares_by_post.get(post_id, [])
+            post['comments'] = comments_by_post.get(post_id, [])
+        posts.append(post)
+    return posts
+
+
+def _tagged_person_json(alias, user_column, contact_column):
+    """
+    SQL expression building the same object as tagged_person_from_row() for one
+    post_mentions/post_shares row, with users joined as u and contacts as c.
+    """
+    return f"""
+        CASE WHEN {alias}.{user_column} IS NOT NULL THEN
+            json_build_object('user_id', {alias}.{user_column}, 'name', u.name, 'type', 'registered')
+        ELSE
+            json_build_object(
+                'contact_id', {alias}.{contact_column},
+                'name', CASE WHEN COALESCE(c."firstname", '') <> '' AND COALESCE(c."lastname", '') <> ''
+                             THEN c."firstname" || ' ' || c."lastname" END,
+                'type', 'contact'
+            )
+        END"""
+
+
+POST_DOCUMENT_QUERY = f"""
+    SELECT p.post_id, p.user_id, p.content, p.attachment_url, p.created_at, p.attachment_status,
+        COALESCE((
+            SELECT json_agg({_tagged_person_json('pm', 'mentioned_user_id', 'mentioned_contact_id')})
+            FROM relyexchange.post_mentions pm
+            LEFT JOIN relyexchange.users u ON pm.mentioned_user_id = u.id
+            LEFT JOIN relyexchange.contacts c ON pm.mentioned_contact_id = c.id
+            WHERE pm.post_id = p.post_id
+              AND (pm.mentioned_user_id IS NOT NULL OR pm.mentioned_contact_id IS NOT NULL)
+        ), '[]'::json) AS mentions,
+        COALESCE((
+            SELECT json_agg({_tagged_person_json('ps', 'shared_with_user_id', 'shared_contact_id')})
+            FROM relyexchange.post_shares ps
+            LEFT JOIN relyexchange.users u ON ps.shared_with_user_id = u.id
+            LEFT JOIN relyexchange.contacts c ON ps.shared_contact_id = c.id
+            WHERE ps.post_id = p.post_id
+              AND (ps.shared_with_user_id IS NOT NULL OR ps.shared_contact_id IS NOT NULL)
+        ), '[]'::json) AS shares,
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                       'comment_id', cm.comment_id,
+                       'post_id', cm.post_id,
+                       'user_id', cm.user_id,
+                       'user_name', u.name,
+                       'content', cm.content,
+                       'created_at', cm.created_at
+                   ) ORDER BY cm.created_at ASC)
+            FROM relyexchange.comments cm
+            LEFT JOIN relyexchange.users u ON cm.user_id = u.id
+            WHERE cm.post_id = p.post_id AND cm.is_deleted = false
+        ), '[]'::json) AS comments,
+        ao.media AS attachment_media,
+        p.version
+    FROM relyexchange.posts p
+    LEFT JOIN relyexchange.attachment_objects ao ON ao.object_key = p.attachment_key
+    WHERE p.post_id = %s AND p.is_deleted = false
+"""
+
+
+def load_post_document(post_id, cur):
+    """
+    Load a non-deleted post together with its mentions, shares and comments.
+
+    With POST_JSON_AGGREGATION enabled, Postgres assembles the nested lists in a
+    single statement (POST_DOCUMENT_QUERY); otherwise the post row is read first
+    and load_post_relations() fetches the rest.
+
+    Returns:
+      dict: The post in get_post's response shape with the stored (not presigned)
+            attachment_url and attachment_media plus its version, or None if the post
+            does not exist or is deleted.
+    """
+    if Config.POST_JSON_AGGREGATION:
+        cur.execute(POST_DOCUMENT_QUERY, (post_id,))
+        post = cur.fetchone()
+        if not post:
+            return None
+        mentions, shares, comments, media, version = post[6], post[7], post[8], post[9], post[10]
+        # json_agg renders timestamps as ISO 8601 strings; restore datetimes so
+        # the response is serialized exactly like the row-based path.
+        for comment in comments:
+            comment['created_at'] = datetime.fromisoformat(comment['created_at'])
+    else:
+        cur.execute("""
+            SELECT p.post_id, p.user_id, p.content, p.attachment_url, p.created_at, p.attachment_status,
+                   ao.media, p.version
+            FROM relyexchange.posts p
+            LEFT JOIN relyexchange.attachment_objects ao ON ao.object_key = p.attachment_key
+            WHERE p.post_id = %s AND p.is_deleted = false
+        """, (post_id,))
+        post = cur.fetchone()
+        if not post:
+            return None
+        media, version = post[6], post[7]
+        mentions_by_post, shares_by_post, comments_by_post = load_post_relations([post[0]], cur)
+        mentions = mentions_by_post.get(post[0], [])
+        shares = shares_by_post.get(post[0], [])
+        comments = comments_by_post.get(post[0], [])
+
+    return {
+        'post_id': post[0],
+        'user_id': post[1],
+        'content': post[2],
+        'attachment_url': post[3],
+        'created_at': post[4],
+        'attachment_status': post[5],
+        'attachment_media': media,
+        'mentions': mentions,
+        'shares': shares,
+        'comments': comments,
+        'version': version
+    }
 
 
 @posts_bp.route('/posts/<user_id>', methods=['POST'])
+@idempotent
 def create_post(user_id):
     """
     Create a new post.
     The client may send:
       - A JSON payload with "content", "mentions", and "shares", OR
       - A multipart/form-data payload that includes a file (key "file") along with "content", "mentions", and "shares".
-    If a file is provided (allowed types: mp3, jpeg, jpg, png, txt), it is uploaded to Supabase Storage,
-    and the returned URL is stored in the post record.
+    If a file is provided (allowed types: mp3, jpeg, jpg, png, txt, at most ATTACHMENT_MAX_BYTES), it is
+    spooled to a temporary file and uploaded to Supabase Storage in the background once the post is stored.
+    Files are stored under their SHA-256, so content that is already stored is not uploaded again.
+    The post is returned immediately with attachment_status 'pending', which becomes 'ready' (or 'failed')
+    when the upload completes.
     The post may tag users from our system and/or contacts. (In the response, tagged contact names are provided.)
+    Retries sent with the same Idempotency-Key header get the first response back without
+    creating another post or uploading the file again (see app/idempotency.py).
     """
     try:
         uuid.UUID(user_id)
     except ValueError:
         return jsonify({'error': 'Invalid user_id format'}), 400
 
-    content = None
-    mentions = []
-    shares = []
-    file_url = None
-
-    if 'file' in request.files:
-        file = request.files['file']
-        allowed_extensions = ['mp3', 'jpeg', 'jpg', 'png', 'txt']
-        filename = file.filename
-        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-        if ext not in allowed_extensions:
-            return jsonify({'error': 'Invalid file type. Allowed types: mp3, jpeg, jpg, png, txt'}), 400
-        
-        bucket_name_supabase = "relyexchange"
-        folder_name = "voicenotes"
-        file_url = upload_file_to_supabase(bucket_name_supabase, file, folder_name, filename)
+    # Oversized bodies are rejected by Werkzeug while the request is being read.
+    request.max_content_length = attachment_request_limit()
 
     content = request.form.get('content', '')
     try:
@@ -147,7 +386,6 @@ def create_post(user_id):
     except json.JSONDecodeError:
         return jsonify({'error': 'Invalid JSON format for mentions or shares'}), 400
 
-        
     # else:
     #     data = request.get_json()
     #     if not data:
@@ -159,82 +397,113 @@ def create_post(user_id):
     #     shares = data.get('shares', [])
     #     file_url = None
 
+    attachment = None
+    attachment_key = None
+    attachment_status = None
+    needs_upload = False
+    file_url = None
+    if 'file' in request.files:
+        file = request.files['file']
+        if not attachment_extension(file.filename):
+            return jsonify({'error': 'Invalid file type. Allowed types: mp3, jpeg, jpg, png, txt'}), 400
+
+        # Copy the file off the request; the S3 upload happens after the post is committed.
+        try:
+            attachment = spool_attachment(file)
+        except AttachmentTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        attachment_key = attachment.object_key
+        file_url = object_url(ATTACHMENT_BUCKET, attachment_key)
+
+    upload_started = False
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-
-        # Insert the post record (assumes posts table has an attachment_url and soft-delete fields)
-        insert_post_query = """
-            INSERT INTO relyexchange.posts (user_id, content, attachment_url, created_at, is_deleted)
-            VALUES (%s, %s, %s, NOW(), false)
-            RETURNING post_id, user_id, content, attachment_url, created_at
-        """
-        cur.execute(insert_post_query, (user_id, content, file_url))
-        post = cur.fetchone()
-        post_id = post[0]
-
-        # Process mentions: Insert into post_mentions table.
-        for mention in mentions:
-            reg_user = is_registered_user(mention, cur)
-            print("reg_user",reg_user)
-            if reg_user:
-                # Registered user; we store the mention.
-                cur.execute("""
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Resolve every tagged ID up front; nothing is written if one is invalid.
+            resolved = resolve_tagged_ids(list(mentions) + list(shares), user_id, cur)
+            for mention in mentions:
+                if not resolved[mention]:
+                    return jsonify({'error': f'Mentioned ID {mention} is neither a registered user nor a contact of the posting user.'}), 400
+            for share in shares:
+                if not resolved[share]:
+                    return jsonify({'error': f'Shared ID {share} is neither a registered user nor a contact of the posting user.'}), 400
+
+            if attachment:
+                # Identical content is stored once; only the first reference uploads it.
+                attachment_status, needs_upload = acquire_attachment_object(
+                    cur, attachment_key, attachment.sha256, attachment.size
+                )
+
+            # Repeated IDs are stored once (see tag_rows), so count distinct targets.
+            mention_count = len({resolved[mention][1] for mention in mentions})
+            share_count = len({resolved[share][1] for share in shares})
+
+            # Insert the post record (assumes posts table has an attachment_url and soft-delete fields)
+            insert_post_query = """
+                INSERT INTO relyexchange.posts (user_id, content, attachment_url, attachment_key,
+                                                attachment_status, mention_count, share_count,
+                                                created_at, is_deleted)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), false)
+                RETURNING post_id, user_id, content, attachment_url, created_at, attachment_status
+            """
+            cur.execute(insert_post_query, (user_id, content, file_url, attachment_key, attachment_status,
+                                            mention_count, share_count))
+            post = cur.fetchone()
+            post_id = post[0]
+
+            # Insert all mentions and all shares with one multi-row INSERT each.
+            mention_rows = tag_rows(post_id, mentions, resolved)
+            if mention_rows:
+                execute_values(cur, """
                     INSERT INTO relyexchange.post_mentions (post_id, mentioned_user_id, mentioned_contact_id)
-                    VALUES (%s, %s, NULL)
+                    VALUES %s
                     ON CONFLICT DO NOTHING
-                """, (post_id, mention))
-            else:
-                # Not a registered user; check if it's a contact.
-                contact = is_contact_of_user(mention, user_id, cur)
-                print("contact",contact)
-                if contact:
-                    cur.execute("""
-                        INSERT INTO relyexchange.post_mentions (post_id, mentioned_user_id, mentioned_contact_id)
-                        VALUES (%s, NULL, %s)
-                        ON CONFLICT DO NOTHING
-                    """, (post_id, mention))
-                else:
-                    return jsonify({'error': f'Mentioned ID {mention} is neither a registered user nor a contact of the posting user.'}), 400
+                """, mention_rows)
 
-        # Process shares: Similar to mentions.
-        for share in shares:
-            reg_user = is_registered_user(share, cur)
-            if reg_user:
-                cur.execute("""
+            share_rows = tag_rows(post_id, shares, resolved)
+            if share_rows:
+                execute_values(cur, """
                     INSERT INTO relyexchange.post_shares (post_id, shared_with_user_id, shared_contact_id)
-                    VALUES (%s, %s, NULL)
+                    VALUES %s
                     ON CONFLICT DO NOTHING
-                """, (post_id, share))
-            else:
-                contact = is_contact_of_user(share, user_id, cur)
-                if contact:
-                    cur.execute("""
-                        INSERT INTO relyexchange.post_shares (post_id, shared_with_user_id, shared_contact_id)
-                        VALUES (%s, NULL, %s)
-                        ON CONFLICT DO NOTHING
-                    """, (post_id, share))
-                else:
-                    return jsonify({'error': f'Shared ID {share} is neither a registered user nor a contact of the posting user.'}), 400
-
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        # Return basic post info. Additional details (e.g. tagged names) can be fetched in GET.
-        return jsonify({
-            'message': 'Post created successfully',
-            'post': {
-                'post_id': post[0],
-                'user_id': post[1],
-                'content': post[2],
-                'attachment_url': post[3],
-                'created_at': post[4]
-            }
-        }), 201
+                """, share_rows)
+
+            # Fan out to the feeds of the tagged registered users.
+            feed_rows = inbox_rows(post_id, post[1], post[4], mention_rows, share_rows)
+            if feed_rows:
+                execute_values(cur, """
+                    INSERT INTO relyexchange.post_inbox (user_id, post_id, author_id, created_at, mentioned, shared)
+                    VALUES %s
+                    ON CONFLICT (user_id, post_id) DO NOTHING
+                """, feed_rows)
+
+            conn.commit()
+            # Drops a negative entry cached for the new ID before it existed.
+            invalidate_post_commenters([post_id])
+
+            if needs_upload:
+                start_attachment_upload(attachment, ATTACHMENT_BUCKET, attachment_key,
+                                        on_ready=schedule_media_processing)
+                upload_started = True
+
+            # Return basic post info. Additional details (e.g. tagged names) can be fetched in GET.
+            # attachment_status stays 'pending' until the background upload finishes.
+            return jsonify({
+                'message': 'Post created successfully',
+                'post': {
+                    'post_id': post[0],
+                    'user_id': post[1],
+                    'content': post[2],
+                    'attachment_url': post[3],
+                    'created_at': post[4],
+                    'attachment_status': post[5]
+                }
+            }), 201
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    finally:
+        if attachment and not upload_started:
+            attachment.close()
 
 @posts_bp.route('/posts/<post_id>', methods=['GET'])
 def get_post(post_id):
@@ -246,115 +515,37 @@ def get_post(post_id):
                   if from a contact, return the contact’s first and last names.
       - Shares: Similarly include details.
       - Comments: All non-deleted comments with commenter details.
+    The response carries an ETag; a matching If-None-Match is answered with 304.
     """
     try:
-        uuid.UUID(post_id)
+        # Cached and invalidated under one spelling, however the URL writes it.
+        post_id = canonical_post_id(post_id)
     except ValueError:
         return jsonify({'error': 'Invalid post_id format'}), 400
 
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+    def load():
+        with get_db_connection() as conn, conn.cursor() as cur:
+            return load_post_document(post_id, cur)
 
-        # Get the post (only if not soft-deleted).
-        cur.execute("""
-            SELECT post_id, user_id, content, attachment_url, created_at 
-            FROM relyexchange.posts
-            WHERE post_id = %s AND is_deleted = false
-        """, (post_id,))
-        post = cur.fetchone()
-        if not post:
+    try:
+        # Hot posts are served from the document cache without touching Postgres.
+        post_data = post_document_cache().get_or_load(post_id, load)
+        if not post_data:
             return jsonify({'error': 'Post not found'}), 404
 
-        # Get mentions with user/contact details.
-        cur.execute("""
-            SELECT pm.mentioned_user_id, u.name,
-                   pm.mentioned_contact_id, c."firstname", c."lastname"
-            FROM relyexchange.post_mentions pm
-            LEFT JOIN relyexchange.users u ON pm.mentioned_user_id = u.id
-            LEFT JOIN relyexchange.contacts c ON pm.mentioned_contact_id = c.id
-            WHERE pm.post_id = %s
-        """, (post_id,))
-        mention_rows = cur.fetchall()
-        mentions = []
-        for row in mention_rows:
-            # row[0] is mentioned_user_id, row[1] is u.name
-            # row[2] is mentioned_contact_id, row[3] and row[4] are contact's firstname and lastname.
-            if row[0]:  # Registered user mention.
-                mentions.append({
-                    'user_id': row[0],
-                    'name': row[1],  # Directly use the single name column.
-                    'type': 'registered'
-                })
-            elif row[2]:  # Contact mention.
-                mentions.append({
-                    'contact_id': row[2],
-                    'name': f"{row[3]} {row[4]}" if row[3] and row[4] else None,
-                    'type': 'contact'
-                })
-
-        # Get shares (similar approach).
-        cur.execute("""
-            SELECT ps.shared_with_user_id, u.name,
-                   ps.shared_contact_id, c."firstname", c."lastname"
-            FROM relyexchange.post_shares ps
-            LEFT JOIN relyexchange.users u ON ps.shared_with_user_id = u.id
-            LEFT JOIN relyexchange.contacts c ON ps.shared_contact_id = c.id
-            WHERE ps.post_id = %s
-        """, (post_id,))
-        share_rows = cur.fetchall()
-        shares = []
-        for row in share_rows:
-            # row[0] is shared_with_user_id, row[1] is u.name,
-            # row[2] is shared_contact_id, row[3] and row[4] are contact names.
-            if row[0]:
-                shares.append({
-                    'user_id': row[0],
-                    'name': row[1],
-                    'type': 'registered'
-                })
-            elif row[2]:
-                shares.append({
-                    'contact_id': row[2],
-                    'name': f"{row[3]} {row[4]}" if row[3] and row[4] else None,
-                    'type': 'contact'
-                })
-
-        # Get comments with commenter details.
-        cur.execute("""
-            SELECT c.comment_id, c.post_id, c.user_id, u.name, c.content, c.created_at 
-            FROM relyexchange.comments c
-            LEFT JOIN relyexchange.users u ON c.user_id = u.id
-            WHERE c.post_id = %s AND c.is_deleted = false
-            ORDER BY c.created_at ASC
-        """, (post_id,))
-        comment_rows = cur.fetchall()
-        comments = []
-        for row in comment_rows:
-            comments.append({
-                'comment_id': row[0],
-                'post_id': row[1],
-                'user_id': row[2],
-                'user_name': row[3],  # Directly use the name column.
-                'content': row[4],
-                'created_at': row[5]
-            })
-
-        cur.close()
-        conn.close()
-        attachment_url = post[3]
-        presigned_url = convert_to_presigned_url(attachment_url, bucket="relyexchange", expires_in=3600)
-        post_data = {
-            'post_id': post[0],
-            'user_id': post[1],
-            'content': post[2],
-            'attachment_url': presigned_url,
-            'created_at': post[4],
-            'mentions': mentions,
-            'shares': shares,
-            'comments': comments
-        }
-        return jsonify({'post': post_data}), 200
+        etag = make_etag('post', post_id, post_data.get('version'), presign_epoch())
+        response = not_modified(etag)
+        if response:
+            return response
+
+        # The cached document is shared; presign on a copy.
+        post_data = dict(post_data)
+        post_data.pop('version', None)
+        post_data['attachment_url'] = convert_to_presigned_url(
+            post_data['attachment_url'], bucket="relyexchange", expires_in=3600
+        )
+        post_data['attachment_media'] = media_for_response(post_data['attachment_media'], "relyexchange")
+        return with_etag(jsonify({'post': post_data}), etag), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -367,16 +558,20 @@ def update_post(post_id):
     The client may update content and optionally provide a new file.
     Only the owner (provided as user_id in the payload) can update the post.
     All functionality (mentions, shares, attachment) is maintained.
+    A new file is uploaded in the background like in create_post; the response carries
+    attachment_status 'pending' until it is stored.
     """
+    # Oversized bodies are rejected by Werkzeug while the request is being read.
+    request.max_content_length = attachment_request_limit()
+
     data = {}
+    attachment = None
     if 'file' in request.files:
         file = request.files['file']
-        allowed_extensions = ['mp3', 'jpeg', 'jpg', 'png', 'txt']
-        filename = file.filename
-        ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
-        if ext not in allowed_extensions:
+        if not attachment_extension(file.filename):
             return jsonify({'error': 'Invalid file type. Allowed types: mp3, jpeg, jpg, png, txt'}), 400
 
+        data['user_id'] = request.form.get('user_id')
         data['content'] = request.form.get('content', '')
         try:
             data['mentions'] = json.loads(request.form.get('mentions', '[]'))
@@ -384,10 +579,12 @@ def update_post(post_id):
         except json.JSONDecodeError:
             return jsonify({'error': 'Invalid JSON format for mentions or shares'}), 400
 
-        bucket_name_supabase = "relyexchange"
-        folder_name = "posts"
-        file_url = upload_file_to_supabase(bucket_name_supabase, file, folder_name, filename)
-        data['attachment_url'] = file_url
+        try:
+            attachment = spool_attachment(file)
+        except AttachmentTooLarge as e:
+            return jsonify({'error': str(e)}), 413
+        data['attachment_key'] = attachment.object_key
+        data['attachment_url'] = object_url(ATTACHMENT_BUCKET, data['attachment_key'])
     else:
         data = request.get_json()
         if not data:
@@ -397,57 +594,197 @@ def update_post(post_id):
         if 'shares' not in data:
             data['shares'] = []
 
+    needs_upload = False
+    upload_started = False
+    try:
+        user_id = data.get('user_id')
+        content = data.get('content')
+        if not user_id or content is None:
+            return jsonify({'error': 'user_id and content are required'}), 400
+
+        try:
+            uuid.UUID(post_id)
+            uuid.UUID(user_id)
+        except ValueError:
+            return jsonify({'error': 'Invalid UUID format'}), 400
+
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Verify post ownership.
+            cur.execute("""
+                SELECT user_id, attachment_key FROM relyexchange.posts
+                WHERE post_id = %s AND is_deleted = false
+                FOR UPDATE
+            """, (post_id,))
+            row = cur.fetchone()
+            if not row or row[0] != user_id:
+                return jsonify({'error': 'Post not found or unauthorized'}), 403
+
+            if attachment:
+                attachment_status, needs_upload = acquire_attachment_object(
+                    cur, data['attachment_key'], attachment.sha256, attachment.size
+                )
+                # The replaced attachment loses this post's reference.
+                release_attachment_object(cur, row[1])
+                update_query = """
+                    UPDATE relyexchange.posts
+                    SET content = %s, attachment_url = %s, attachment_key = %s, attachment_status = %s,
+                        version = version + 1
+                    WHERE post_id = %s
+                    RETURNING post_id, user_id, content, attachment_url, created_at, attachment_status
+                """
+                cur.execute(update_query, (content, data['attachment_url'], data['attachment_key'],
+                                           attachment_status, post_id))
+            else:
+                update_query = """
+                    UPDATE relyexchange.posts
+                    SET content = %s, version = version + 1
+                    WHERE post_id = %s
+                    RETURNING post_id, user_id, content, attachment_url, created_at, attachment_status
+                """
+                cur.execute(update_query, (content, post_id))
+            updated_post = cur.fetchone()
+            conn.commit()
+            invalidate_post_documents([post_id])
+
+            if needs_upload:
+                start_attachment_upload(attachment, ATTACHMENT_BUCKET, data['attachment_key'],
+                                        on_ready=schedule_media_processing)
+                upload_started = True
+
+            return jsonify({
+                'message': 'Post updated successfully',
+                'post': {
+                    'post_id': updated_post[0],
+                    'user_id': updated_post[1],
+                    'content': updated_post[2],
+                    'attachment_url': updated_post[3],
+                    'created_at': updated_post[4],
+                    'attachment_status': updated_post[5]
+                }
+            }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    finally:
+        if attachment and not upload_started:
+            attachment.close()
+
+@posts_bp.route('/posts/attachments/presign', methods=['POST'])
+def presign_attachment():
+    """
+    Issue a presigned POST policy so the client can upload an attachment directly to storage.
+    Expects JSON with:
+      - user_id: ID of the uploading user
+      - filename: original file name (allowed types: mp3, jpeg, jpg, png, txt)
+      - folder: optional key prefix, "voicenotes" (default) or "posts"
+    The policy only accepts the returned object_key and at most ATTACHMENT_MAX_BYTES.
+    After uploading, the client attaches the object with POST /posts/posts/<post_id>/attachment.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    user_id = data.get('user_id')
+    filename = data.get('filename')
+    folder_name = data.get('folder', 'voicenotes')
+    if not user_id or not filename:
+        return jsonify({'error': 'user_id and filename are required'}), 400
+
+    try:
+        uuid.UUID(user_id)
+    except (ValueError, TypeError, AttributeError):
+        return jsonify({'error': 'Invalid user_id format'}), 400
+
+    ext = attachment_extension(filename)
+    if not ext:
+        return jsonify({'error': 'Invalid file type. Allowed types: mp3, jpeg, jpg, png, txt'}), 400
+    if folder_name not in ATTACHMENT_FOLDERS:
+        return jsonify({'error': f'Invalid folder. Allowed folders: {", ".join(ATTACHMENT_FOLDERS)}'}), 400
+
+    try:
+        object_key = direct_upload_key(folder_name, user_id, ext)
+        upload = presign_attachment_upload(ATTACHMENT_BUCKET, object_key)
+        return jsonify({
+            'object_key': object_key,
+            'upload': upload,
+            'max_bytes': Config.ATTACHMENT_MAX_BYTES,
+            'expires_in': Config.ATTACHMENT_PRESIGN_EXPIRES_IN
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@posts_bp.route('/posts/<post_id>/attachment', methods=['POST'])
+def finalize_attachment(post_id):
+    """
+    Attach a directly uploaded object (see presign_attachment) to a post.
+    Expects JSON with:
+      - user_id: the owner of the post (and uploader of the object)
+      - object_key: the key returned by the presign endpoint
+    The object must exist in storage and be within the size limit.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
     user_id = data.get('user_id')
-    content = data.get('content')
-    if not user_id or content is None:
-        return jsonify({'error': 'user_id and content are required'}), 400
+    object_key = data.get('object_key')
+    if not user_id or not object_key:
+        return jsonify({'error': 'user_id and object_key are required'}), 400
 
     try:
         uuid.UUID(post_id)
         uuid.UUID(user_id)
-    except ValueError:
+    except (ValueError, TypeError, AttributeError):
         return jsonify({'error': 'Invalid UUID format'}), 400
 
+    if not isinstance(object_key, str) or not is_direct_upload_key(object_key, user_id):
+        return jsonify({'error': 'Invalid object_key'}), 400
+
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        # Verify post ownership.
-        cur.execute("SELECT user_id FROM relyexchange.posts WHERE post_id = %s AND is_deleted = false", (post_id,))
-        row = cur.fetchone()
-        if not row or row[0] != user_id:
-            return jsonify({'error': 'Post not found or unauthorized'}), 403
-
-        if 'attachment_url' in data:
-            update_query = """
-                UPDATE relyexchange.posts
-                SET content = %s, attachment_url = %s
-                WHERE post_id = %s
-                RETURNING post_id, user_id, content, attachment_url, created_at
-            """
-            cur.execute(update_query, (content, data['attachment_url'], post_id))
-        else:
-            update_query = """
+        size = head_attachment(ATTACHMENT_BUCKET, object_key)
+        if size is None:
+            return jsonify({'error': 'Uploaded object not found'}), 404
+        if size > Config.ATTACHMENT_MAX_BYTES:
+            return jsonify({'error': f'Attachment exceeds the {Config.ATTACHMENT_MAX_BYTES} byte limit'}), 413
+
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Verify post ownership.
+            cur.execute("""
+                SELECT user_id, attachment_key FROM relyexchange.posts
+                WHERE post_id = %s AND is_deleted = false
+                FOR UPDATE
+            """, (post_id,))
+            row = cur.fetchone()
+            if not row or row[0] != user_id:
+                return jsonify({'error': 'Post not found or unauthorized'}), 403
+
+            acquire_attachment_object(cur, object_key, None, size, status='ready')
+            release_attachment_object(cur, row[1])
+            cur.execute("""
                 UPDATE relyexchange.posts
-                SET content = %s
+                SET attachment_url = %s, attachment_key = %s, attachment_status = 'ready',
+                    version = version + 1
                 WHERE post_id = %s
-                RETURNING post_id, user_id, content, attachment_url, created_at
-            """
-            cur.execute(update_query, (content, post_id))
-        updated_post = cur.fetchone()
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        return jsonify({
-            'message': 'Post updated successfully',
-            'post': {
-                'post_id': updated_post[0],
-                'user_id': updated_post[1],
-                'content': updated_post[2],
-                'attachment_url': updated_post[3],
-                'created_at': updated_post[4]
-            }
-        }), 200
+                RETURNING post_id, user_id, content, attachment_url, created_at, attachment_status
+            """, (object_url(ATTACHMENT_BUCKET, object_key), object_key, post_id))
+            updated_post = cur.fetchone()
+            conn.commit()
+            invalidate_post_documents([post_id])
+
+            schedule_media_processing(current_app._get_current_object(), ATTACHMENT_BUCKET, object_key)
+
+            return jsonify({
+                'message': 'Attachment added successfully',
+                'post': {
+                    'post_id': updated_post[0],
+                    'user_id': updated_post[1],
+                    'content': updated_post[2],
+                    'attachment_url': updated_post[3],
+                    'created_at': updated_post[4],
+                    'attachment_status': updated_post[5]
+                }
+            }), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -471,29 +808,30 @@ def delete_post(post_id):
         return jsonify({'error': 'Invalid UUID format'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("SELECT user_id FROM relyexchange.posts WHERE post_id = %s AND is_deleted = false", (post_id,))
-        row = cur.fetchone()
-        if not row or row[0] != user_id:
-            return jsonify({'error': 'Post not found or unauthorized'}), 403
-
-        # Soft delete the post.
-        cur.execute("""
-            UPDATE relyexchange.posts 
-            SET is_deleted = true, deleted_at = NOW() 
-            WHERE post_id = %s
-        """, (post_id,))
-        # Also soft delete its comments.
-        cur.execute("""
-            UPDATE relyexchange.comments 
-            SET is_deleted = true, deleted_at = NOW() 
-            WHERE post_id = %s
-        """, (post_id,))
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({'message': 'Post soft deleted successfully'}), 200
+        with get_db_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT user_id FROM relyexchange.posts WHERE post_id = %s AND is_deleted = false", (post_id,))
+            row = cur.fetchone()
+            if not row or row[0] != user_id:
+                return jsonify({'error': 'Post not found or unauthorized'}), 403
+
+            # Soft delete the post.
+            cur.execute("""
+                UPDATE relyexchange.posts 
+                SET is_deleted = true, deleted_at = NOW(), version = version + 1, comment_count = 0
+                WHERE post_id = %s
+            """, (post_id,))
+            # Also soft delete its comments.
+            cur.execute("""
+                UPDATE relyexchange.comments 
+                SET is_deleted = true, deleted_at = NOW() 
+                WHERE post_id = %s
+            """, (post_id,))
+            # Drop it from the feeds it was fanned out to.
+            cur.execute("DELETE FROM relyexchange.post_inbox WHERE post_id = %s", (post_id,))
+            conn.commit()
+            invalidate_post_commenters([str(uuid.UUID(post_id))])
+            invalidate_post_documents([post_id])
+            return jsonify({'message': 'Post soft deleted successfully'}), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -501,12 +839,20 @@ def delete_post(post_id):
 @posts_bp.route('/posts/user/<user_id>', methods=['GET'])
 def get_posts_by_user(user_id):
     """
-    Retrieve all posts created by a specific user.
+    Retrieve the posts created by a specific user, newest first, one page at a time.
+    Query parameters:
+      - limit: page size (defaults to POSTS_PAGE_DEFAULT_LIMIT, at most POSTS_PAGE_MAX_LIMIT).
+      - cursor: the next_cursor value from the previous page.
     For each post, return:
       - Content, attachment_url, created_at.
       - Mentions (with details of whether the tag is a registered user or contact, and the person’s name).
       - Shares (similarly).
       - Comments (all non-deleted comments with commenter details).
+      - comment_count, mention_count and share_count.
+    With view=counts the mentions, shares and comments lists are left out and only
+    the counters are returned, which keeps list payloads small.
+    The response carries next_cursor, which is null on the last page, and an ETag;
+    a matching If-None-Match is answered with 304.
     """
     try:
         uuid.UUID(user_id)
@@ -514,102 +860,123 @@ def get_posts_by_user(user_id):
         return jsonify({'error': 'Invalid user_id format'}), 400
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        # Get posts for the user (non-deleted).
-        cur.execute("""
-            SELECT post_id, user_id, content, attachment_url, created_at 
-            FROM relyexchange.posts
-            WHERE user_id = %s AND is_deleted = false
-            ORDER BY created_at DESC
-        """, (user_id,))
-        rows = cur.fetchall()
-        posts = []
-        for row in rows:
-            post_id = row[0]
-            # Get mentions.
-            cur.execute("""
-                SELECT pm.mentioned_user_id, u.name,
-                       pm.mentioned_contact_id, c."firstname", c."lastname"
-                FROM relyexchange.post_mentions pm
-                LEFT JOIN relyexchange.users u ON pm.mentioned_user_id = u.id
-                LEFT JOIN relyexchange.contacts c ON pm.mentioned_contact_id = c.id
-                WHERE pm.post_id = %s
-            """, (post_id,))
-            mention_rows = cur.fetchall()
-            mentions = []
-            for m in mention_rows:
-                if m[0]:  # Registered user mention.
-                    mentions.append({
-                        'user_id': m[0],
-                        'name': m[1],  # Use the single 'name' column.
-                        'type': 'registered'
-                    })
-                elif m[2]:  # Contact mention.
-                    mentions.append({
-                        'contact_id': m[2],
-                        'name': f"{m[3]} {m[4]}" if m[3] and m[4] else None,
-                        'type': 'contact'
-                    })
-            # Get shares.
-            cur.execute("""
-                SELECT ps.shared_with_user_id, u.name,
-                       ps.shared_contact_id, c."firstname", c."lastname"
-                FROM relyexchange.post_shares ps
-                LEFT JOIN relyexchange.users u ON ps.shared_with_user_id = u.id
-                LEFT JOIN relyexchange.contacts c ON ps.shared_contact_id = c.id
-                WHERE ps.post_id = %s
-            """, (post_id,))
-            share_rows = cur.fetchall()
-            shares = []
-            for s in share_rows:
-                if s[0]:
-                    shares.append({
-                        'user_id': s[0],
-                        'name': s[1],
-                        'type': 'registered'
-                    })
-                elif s[2]:
-                    shares.append({
-                        'contact_id': s[2],
-                        'name': f"{s[3]} {s[4]}" if s[3] and s[4] else None,
-                        'type': 'contact'
-                    })
-            # Get comments.
-            cur.execute("""
-                SELECT c.comment_id, c.post_id, c.user_id, u.name, c.content, c.created_at 
-                FROM relyexchange.comments c
-                LEFT JOIN relyexchange.users u ON c.user_id = u.id
-                WHERE c.post_id = %s AND c.is_deleted = false
-                ORDER BY c.created_at ASC
-            """, (post_id,))
-            comment_rows = cur.fetchall()
-            comments = []
-            for cm in comment_rows:
-                print(cm)
-                comments.append({
-                    'comment_id': cm[0],
-                    'post_id': cm[1],
-                    'user_id': cm[2],
-                    'user_name': cm[3],
-                    'content': cm[4],
-                    'created_at': cm[5]
-                })
-            attachment_url = row[3]
-            presigned_url = convert_to_presigned_url(attachment_url, bucket="relyexchange", expires_in=3600)
-            posts.append({
-                'post_id': row[0],
-                'user_id': row[1],
-                'content': row[2],
-                'attachment_url': presigned_url,
-                'created_at': row[4],
-                'mentions': mentions,
-                'shares': shares,
-                'comments': comments
-            })
-        cur.close()
-        conn.close()
-        return jsonify({'posts': posts}), 200
+        limit = parse_page_limit(request.args, Config.POSTS_PAGE_DEFAULT_LIMIT, Config.POSTS_PAGE_MAX_LIMIT)
+        view = parse_post_view(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cursor = request.args.get('cursor')
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    try:
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Get one page of posts for the user (non-deleted). One extra row tells us
+            # whether another page exists.
+            if after:
+                cur.execute("""
+                    SELECT p.post_id, p.user_id, p.content, p.attachment_url, p.created_at,
+                           p.attachment_status, ao.media, p.comment_count, p.mention_count,
+                           p.share_count, p.version
+                    FROM relyexchange.posts p
+                    LEFT JOIN relyexchange.attachment_objects ao ON ao.object_key = p.attachment_key
+                    WHERE p.user_id = %s AND p.is_deleted = false
+                      AND (p.created_at, p.post_id) < (%s, %s::uuid)
+                    ORDER BY p.created_at DESC, p.post_id DESC
+                    LIMIT %s
+                """, (user_id, after[0], after[1], limit + 1))
+            else:
+                cur.execute("""
+                    SELECT p.post_id, p.user_id, p.content, p.attachment_url, p.created_at,
+                           p.attachment_status, ao.media, p.comment_count, p.mention_count,
+                           p.share_count, p.version
+                    FROM relyexchange.posts p
+                    LEFT JOIN relyexchange.attachment_objects ao ON ao.object_key = p.attachment_key
+                    WHERE p.user_id = %s AND p.is_deleted = false
+                    ORDER BY p.created_at DESC, p.post_id DESC
+                    LIMIT %s
+                """, (user_id, limit + 1))
+            rows = cur.fetchall()
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1][4], rows[-1][0])
+            # The page's post IDs and versions decide the body; check them before
+            # loading relations and presigning anything.
+            etag = make_etag('user-posts', user_id, cursor, limit, view,
+                             [(str(row[0]), row[10]) for row in rows], next_cursor, presign_epoch())
+            response = not_modified(etag)
+            if response:
+                return response
+            posts = posts_from_rows(rows, cur, view)
+            return with_etag(jsonify({'posts': posts, 'next_cursor': next_cursor}), etag), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@posts_bp.route('/posts/feed/<user_id>', methods=['GET'])
+def get_feed(user_id):
+    """
+    Retrieve the posts a user was mentioned in or shared with, newest first, one page at a time.
+    Served from relyexchange.post_inbox, which create_post fills in as posts are written.
+    Query parameters:
+      - limit: page size (defaults to POSTS_PAGE_DEFAULT_LIMIT, at most POSTS_PAGE_MAX_LIMIT).
+      - cursor: the next_cursor value from the previous page.
+      - view: 'full' (default) or 'counts', as in get_posts_by_user.
+    Each post has the same shape as in get_posts_by_user, plus:
+      - reasons: 'mention' and/or 'share'.
+    The response carries next_cursor, which is null on the last page.
+    """
+    try:
+        uuid.UUID(user_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid user_id format'}), 400
+
+    try:
+        limit = parse_page_limit(request.args, Config.POSTS_PAGE_DEFAULT_LIMIT, Config.POSTS_PAGE_MAX_LIMIT)
+        view = parse_post_view(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    cursor = request.args.get('cursor')
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    try:
+        with get_db_connection() as conn, conn.cursor() as cur:
+            # Page on the inbox index; deleted posts are pruned from the inbox, the
+            # is_deleted check only covers rows written before the prune.
+            keyset = "AND (i.created_at, i.post_id) < (%s, %s::uuid)" if after else ""
+            params = (user_id,) + (tuple(after) if after else ()) + (limit + 1,)
+            cur.execute(f"""
+                SELECT p.post_id, p.user_id, p.content, p.attachment_url, i.created_at,
+                       p.attachment_status, ao.media, p.comment_count, p.mention_count,
+                       p.share_count, i.mentioned, i.shared
+                FROM relyexchange.post_inbox i
+                JOIN relyexchange.posts p ON p.post_id = i.post_id
+                LEFT JOIN relyexchange.attachment_objects ao ON ao.object_key = p.attachment_key
+                WHERE i.user_id = %s AND p.is_deleted = false
+                  {keyset}
+                ORDER BY i.created_at DESC, i.post_id DESC
+                LIMIT %s
+            """, params)
+            rows = cur.fetchall()
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1][4], rows[-1][0])
+            posts = posts_from_rows(rows, cur, view)
+            for post, row in zip(posts, rows):
+                post['reasons'] = [reason for reason, flag in (('mention', row[10]), ('share', row[11])) if flag]
+            return jsonify({'posts': posts, 'next_cursor': next_cursor}), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,68 @@
+import hashlib
+import time
+
+from flask import current_app, request
+
+from app.config import Config
+
+
+def bump_post_versions(cur, post_ids, comment_delta=0):
+    """
+    Increment relyexchange.posts.version for every given post, in the caller's transaction.
+    Call this from any write that changes a post, its comments or its attachment.
+    comment_delta is added to each post's comment_count in the same statement.
+    The posts stay locked until the transaction ends, so a post's versions are
+    handed out in commit order.
+
+    Returns:
+      dict: The new version of each updated post, keyed by post_id string.
+    """
+    post_ids = [str(post_id) for post_id in post_ids if post_id]
+    if not post_ids:
+        return {}
+    cur.execute("""
+        UPDATE relyexchange.posts
+        SET version = version + 1, comment_count = GREATEST(comment_count + %s, 0)
+        WHERE post_id = ANY(%s::uuid[])
+        RETURNING post_id, version
+    """, (comment_delta, post_ids))
+    return {str(post_id): version for post_id, version in cur.fetchall()}
+
+
+def presign_epoch(expires_in=3600):
+    """
+    Number of the current presigned URL reuse window. A presigned URL handed out during
+    a window stays valid until the window ends (see convert_to_presigned_url), so it is
+    part of every ETag of a response that embeds such URLs. A 304 can keep a URL in
+    use for up to two windows after it was signed, which is why
+    PRESIGNED_URL_REUSE_FRACTION is capped at 0.5.
+    """
+    return int(time.time() // (expires_in * Config.PRESIGNED_URL_REUSE_FRACTION))
+
+
+def make_etag(*parts):
+    """
+    Build a strong ETag value (unquoted) from the values that determine a response body.
+    """
+    digest = hashlib.sha1(repr(parts).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def not_modified(etag):
+    """
+    Return a 304 response if the request's If-None-Match matches etag, else None.
+    """
+    if etag not in request.if_none_match:
+        return None
+    response = current_app.response_class(status=304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    """
+    Attach etag to response and ask clients to revalidate before reusing it.
+    """
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,204 @@
+import json
+import os
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from flask import current_app
+
+from app.pagination import encode_since_cursor
+
+# Postgres caps NOTIFY payloads at 8000 bytes; leave room for the JSON envelope.
+MAX_NOTIFY_CONTENT_BYTES = 7000
+
+
+def notify_comment_event(cur, event, comment, channel=None):
+    """
+    Queue a comment event on the comment events channel in the caller's transaction.
+    Postgres delivers it to listeners only if and when the transaction commits.
+
+    Parameters:
+      event (str): 'created', 'updated' or 'deleted'.
+      comment (tuple): (comment_id, post_id, user_id, content, created_at, seq) as
+                       returned by the comment queries.
+    """
+    notify_comment_events(cur, event, [comment], channel)
+
+
+def notify_comment_events(cur, event, comments, channel=None):
+    """
+    Like notify_comment_event() for several comments, in a single statement.
+    """
+    if not comments:
+        return
+    channel = channel or current_app.config['COMMENT_EVENTS_CHANNEL']
+    payloads = [json.dumps(_comment_event_payload(event, comment)) for comment in comments]
+    cur.execute(
+        "SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) WITH ORDINALITY AS t(payload, n) ORDER BY n",
+        (channel, payloads)
+    )
+
+
+def _comment_event_payload(event, comment):
+    comment_id, post_id, user_id, content, created_at, seq = comment
+    payload = {
+        'event': event,
+        'comment_id': str(comment_id),
+        'post_id': str(post_id),
+        'user_id': str(user_id),
+        'created_at': created_at.isoformat(),
+    }
+    if event == 'created':
+        # A since cursor: ?since= it returns the comments committed after this one.
+        payload['cursor'] = encode_since_cursor(seq, comment_id)
+    if event != 'deleted':
+        if len(content.encode('utf-8')) <= MAX_NOTIFY_CONTENT_BYTES:
+            payload['content'] = content
+        else:
+            # Too large for NOTIFY; watchers fetch it with ?since=<previous created cursor>.
+            payload['truncated'] = True
+    return payload
+
+
+class CommentEventHub:
+    """
+    Fans comment events out to the SSE streams of this worker.
+
+    One listener thread per process holds a dedicated LISTEN connection and
+    dispatches every notification to the queues subscribed to its post. The
+    thread is started on the first subscription (and again after a fork). LISTEN
+    needs a session-mode connection, so it connects to DB_LISTEN_HOST/PORT rather
+    than the transaction-mode pooler used by the connection pool.
+    """
+
+    def __init__(self, dsn_kwargs, channel, queue_size=100, poll_interval=5):
+        self.dsn_kwargs = dsn_kwargs
+        self.channel = channel
+        self.queue_size = queue_size
+        self.poll_interval = poll_interval
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            dsn_kwargs={
+                'host': config['DB_LISTEN_HOST'],
+                'port': config['DB_LISTEN_PORT'],
+                'dbname': config['DB_NAME'],
+                'user': config['DB_USER'],
+                'password': config['DB_PASSWORD'],
+                'connect_timeout': config['DB_CONNECT_TIMEOUT'],
+            },
+            channel=config['COMMENT_EVENTS_CHANNEL'],
+            queue_size=config['COMMENT_STREAM_QUEUE_SIZE'],
+        )
+
+    def subscribe(self, post_id):
+        """
+        Register a watcher of post_id and return the queue its events are put on.
+        A None item means the queue overflowed and events were dropped.
+        """
+        events = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self._pid != os.getpid():
+                # Subscriptions and the listener thread do not survive a fork.
+                self._subscribers = {}
+                self._thread = None
+                self._pid = os.getpid()
+            self._subscribers.setdefault(post_id, set()).add(events)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='comment-events', daemon=True
+                )
+                self._thread.start()
+        return events
+
+    def unsubscribe(self, post_id, events):
+        with self._lock:
+            watchers = self._subscribers.get(post_id)
+            if watchers:
+                watchers.discard(events)
+                if not watchers:
+                    del self._subscribers[post_id]
+
+    def _dispatch(self, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        with self._lock:
+            watchers = list(self._subscribers.get(event.get('post_id'), ()))
+        for events in watchers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                # A stalled client: tell it to resynchronise instead of blocking the listener.
+                try:
+                    events.get_nowait()
+                except queue.Empty:
+                    pass
+                events.put_nowait(None)
+
+    def _listen(self):
+        conn = psycopg2.connect(**self.dsn_kwargs)
+        try:
+            conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f'LISTEN "{self.channel}"')
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        return
+                if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._dispatch(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+    def _run(self):
+        backoff = 1
+        while True:
+            try:
+                self._listen()
+                # No watchers left. Exit unless one subscribed while we were shutting down.
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                backoff = 1
+            except Exception as e:
+                print(f"Comment event listener error: {e}")
+                # Watchers may have missed events while disconnected.
+                with self._lock:
+                    watchers = [events for group in self._subscribers.values() for events in group]
+                for events in watchers:
+                    try:
+                        events.put_nowait(None)
+                    except queue.Full:
+                        pass
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+def init_comment_events(app):
+    """
+    Create the worker's comment event hub from the app config.
+    """
+    hub = CommentEventHub.from_config(app.config)
+    app.extensions['comment_events'] = hub
+    return hub
+
+
+def comment_events(app=None):
+    """
+    The application's comment event hub (see init_comment_events).
+    """
+    return (app or current_app).extensions['comment_events']
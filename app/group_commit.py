@@ -0,0 +1,125 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import psycopg2
+
+from app.db import get_db_connection
+
+
+class GroupCommitter:
+    """
+    Coalesces concurrent writes into shared transactions (group commit).
+
+    Callers submit() an item and wait on the returned Future. A single writer
+    thread per process takes the first queued item, keeps collecting for up to
+    `window` seconds or `max_batch` items, and hands the whole batch to
+    write_batch(cur, items) on one pooled connection, followed by one commit.
+    While a batch is being written new items queue up, so batches grow with load
+    and the number of connections used stays at one.
+
+    write_batch returns one result per item, in order; an Exception instance as a
+    result fails only that item's Future. If the batch is rejected with a data or
+    integrity error, its items are retried one by one so a single bad row cannot
+    fail its neighbours; any other error (connection, pool) fails the whole batch.
+    after_commit(items, results) runs after each successful commit.
+
+    A caller that gives up waiting should cancel() its Future: items cancelled
+    before the writer picks them up are never written.
+    """
+
+    def __init__(self, app, write_batch, window=0.005, max_batch=100, after_commit=None, name='group-commit'):
+        self.app = app
+        self.write_batch = write_batch
+        self.window = window
+        self.max_batch = max_batch
+        self.after_commit = after_commit
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, item):
+        """
+        Queue item for the next batch and return a Future for its result.
+        """
+        future = Future()
+        with self._lock:
+            if self._pid != os.getpid():
+                # Neither the writer thread nor queued items survive a fork.
+                self._queue = queue.Queue()
+                self._thread = None
+                self._pid = os.getpid()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._queue.put((item, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = [(item, future) for item, future in self._collect()
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._write(batch)
+            except Exception as e:
+                # Never let the writer die with callers waiting on it.
+                self._fail([entry for entry in batch if not entry[1].done()], e)
+
+    def _fail(self, batch, e):
+        if len(batch) == 1:
+            batch[0][1].set_exception(e)
+            return
+        # Each caller gets its own exception, so raising one does not touch the others.
+        for _, future in batch:
+            error = RuntimeError(f"{self.name} writer failed: {e}")
+            error.__cause__ = e
+            future.set_exception(error)
+
+    def _write(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            with self.app.app_context(), get_db_connection(self.app) as conn, conn.cursor() as cur:
+                results = self.write_batch(cur, items)
+                conn.commit()
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            if len(batch) > 1:
+                for entry in batch:
+                    self._write([entry])
+                return
+            batch[0][1].set_exception(e)
+            return
+        except Exception as e:
+            # Retrying one by one would only wait out the same outage once per item.
+            self._fail(batch, e)
+            return
+
+        if self.after_commit:
+            try:
+                with self.app.app_context():
+                    self.after_commit(items, results)
+            except Exception as e:
+                print(f"Error in {self.name} after-commit hook: {e}")
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -0,0 +1,122 @@
+import functools
+import hashlib
+
+from flask import current_app, jsonify, make_response, request
+from psycopg2.extras import Json
+
+from app.db import get_db_connection
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint():
+    """
+    Identify what a request asks for, to catch an Idempotency-Key reused for a
+    different request. Multipart bodies are not read here (that would buffer the
+    attachment before the endpoint sets its size limit); their length stands in.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.path} {request.content_length}".encode('utf-8'))
+    if request.is_json:
+        digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _claim(scope, key, fingerprint):
+    """
+    Take the key for this request, or return the stored row if another request has it.
+
+    Returns:
+      tuple: None if claimed, else (fingerprint, status, response_status, response_body).
+    """
+    config = current_app.config
+    with get_db_connection() as conn, conn.cursor() as cur:
+        # Expired keys, and keys whose request died mid-flight, can be taken over.
+        cur.execute("""
+            INSERT INTO relyexchange.idempotency_keys (scope, key, fingerprint, expires_at)
+            VALUES (%s, %s, %s, NOW() + make_interval(secs => %s))
+            ON CONFLICT (scope, key) DO UPDATE
+            SET fingerprint = EXCLUDED.fingerprint, status = 'in_progress', response_status = NULL,
+                response_body = NULL, locked_at = NOW(), expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at < NOW()
+               OR (idempotency_keys.status = 'in_progress'
+                   AND idempotency_keys.locked_at < NOW() - make_interval(secs => %s))
+            RETURNING key
+        """, (scope, key, fingerprint, config['IDEMPOTENCY_KEY_TTL'], config['IDEMPOTENCY_LOCK_TIMEOUT']))
+        claimed = cur.fetchone()
+        if not claimed:
+            cur.execute("""
+                SELECT fingerprint, status, response_status, response_body
+                FROM relyexchange.idempotency_keys
+                WHERE scope = %s AND key = %s
+            """, (scope, key))
+            existing = cur.fetchone()
+        conn.commit()
+    return None if claimed else existing
+
+
+def _finish(scope, key, response):
+    with get_db_connection() as conn, conn.cursor() as cur:
+        if response is not None and response.status_code < 500 and response.is_json:
+            cur.execute("""
+                UPDATE relyexchange.idempotency_keys
+                SET status = 'done', response_status = %s, response_body = %s
+                WHERE scope = %s AND key = %s
+            """, (response.status_code, Json(response.get_json()), scope, key))
+        else:
+            # Server errors are not final: free the key so the client can retry.
+            cur.execute(
+                "DELETE FROM relyexchange.idempotency_keys WHERE scope = %s AND key = %s",
+                (scope, key)
+            )
+        conn.commit()
+
+
+def idempotent(view):
+    """
+    Make a write endpoint safe to retry. A request carrying an Idempotency-Key header
+    runs once; repeats with the same key within IDEMPOTENCY_KEY_TTL get the stored
+    response (marked Idempotent-Replayed: true) without running the endpoint again.
+    Reusing a key for a different request is answered with 422, and a repeat that
+    arrives while the first request is still running with 409.
+    Requests without the header are not affected.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        scope = request.endpoint
+        fingerprint = request_fingerprint()
+        try:
+            existing = _claim(scope, key, fingerprint)
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+        if existing:
+            stored_fingerprint, status, response_status, response_body = existing
+            if stored_fingerprint != fingerprint:
+                return jsonify({'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'}), 422
+            if status != 'done':
+                response = jsonify({'error': 'A request with this Idempotency-Key is still in progress'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            response = make_response(jsonify(response_body), response_status)
+            response.headers['Idempotent-Replayed'] = 'true'
+            return response
+
+        response = None
+        try:
+            response = make_response(view(*args, **kwargs))
+            return response
+        finally:
+            try:
+                _finish(scope, key, response)
+            except Exception as e:
+                print(f"Error recording idempotent response for {scope} {key}: {e}")
+
+    return wrapper
@@ -0,0 +1,151 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from psycopg2.extras import Json
+
+from app.cache import invalidate_post_documents
+from app.config import Config
+from app.db import get_db_connection
+from app.storage import convert_to_presigned_url, object_url, s3_client
+
+IMAGE_EXTENSIONS = ['jpeg', 'jpg', 'png']
+AUDIO_EXTENSIONS = ['mp3']
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    """
+    Process pool for CPU-bound media work, created on first use. Workers are spawned
+    rather than forked so they do not inherit the web process's threads and sockets.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=Config.MEDIA_PROCESSING_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _executor
+
+
+def rendition_key(object_key, name):
+    """
+    Key of a derived image stored next to the original, e.g. content/<sha>_thumbnail.jpg.
+    """
+    return f"{object_key.rsplit('.', 1)[0]}_{name}.jpg"
+
+
+def _process_image(bucket_name, object_key, path):
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original).convert('RGB')
+    media = {'type': 'image', 'width': image.width, 'height': image.height, 'renditions': {}}
+
+    sizes = [('thumbnail', Config.MEDIA_THUMBNAIL_SIZE), ('display', Config.MEDIA_DISPLAY_SIZE)]
+    for name, size in sizes:
+        # Never upscale: the display rendition is only useful for large originals.
+        if name != 'thumbnail' and max(image.size) <= size:
+            continue
+        rendition = image.copy()
+        rendition.thumbnail((size, size))
+        rendition_path = f"{path}_{name}.jpg"
+        rendition.save(rendition_path, 'JPEG', quality=85, optimize=True, progressive=True)
+        key = rendition_key(object_key, name)
+        s3_client.upload_file(rendition_path, bucket_name, key, ExtraArgs={'ContentType': 'image/jpeg'})
+        media['renditions'][name] = {
+            'key': key,
+            'width': rendition.width,
+            'height': rendition.height,
+            'size': os.path.getsize(rendition_path)
+        }
+    return media
+
+
+def _process_audio(path):
+    from mutagen.mp3 import MP3
+
+    info = MP3(path).info
+    return {
+        'type': 'audio',
+        'duration': round(info.length, 3),
+        'bitrate': info.bitrate,
+        'sample_rate': info.sample_rate,
+        'channels': info.channels
+    }
+
+
+def process_attachment_media(bucket_name, object_key):
+    """
+    Process-pool job: download a stored attachment, build image renditions and
+    thumbnails or read mp3 metadata, and return the media description.
+    """
+    ext = object_key.rsplit('.', 1)[-1].lower()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, f"original.{ext}")
+        s3_client.download_file(bucket_name, object_key, path)
+        if ext in IMAGE_EXTENSIONS:
+            return _process_image(bucket_name, object_key, path)
+        return _process_audio(path)
+
+
+def _store_media(app, object_key, future):
+    try:
+        media = future.result()
+    except Exception as e:
+        print(f"Error processing media for {object_key}: {e}")
+        return
+    try:
+        with get_db_connection(app) as conn, conn.cursor() as cur:
+            cur.execute("""
+                UPDATE relyexchange.attachment_objects
+                SET media = %s
+                WHERE object_key = %s
+            """, (Json(media), object_key))
+            cur.execute("""
+                UPDATE relyexchange.posts
+                SET version = version + 1
+                WHERE attachment_key = %s
+                RETURNING post_id
+            """, (object_key,))
+            post_ids = [row[0] for row in cur.fetchall()]
+            conn.commit()
+        invalidate_post_documents(post_ids, app)
+    except Exception as e:
+        print(f"Error recording media for {object_key}: {e}")
+
+
+def schedule_media_processing(app, bucket_name, object_key):
+    """
+    Queue an uploaded image or mp3 for background processing. The result is stored
+    in relyexchange.attachment_objects.media. Other file types are ignored.
+    """
+    ext = object_key.rsplit('.', 1)[-1].lower() if '.' in object_key else ''
+    if not Config.MEDIA_PROCESSING_ENABLED or ext not in IMAGE_EXTENSIONS + AUDIO_EXTENSIONS:
+        return None
+    future = _get_executor().submit(process_attachment_media, bucket_name, object_key)
+    future.add_done_callback(lambda f: _store_media(app, object_key, f))
+    return future
+
+
+def media_for_response(media, bucket_name, expires_in=3600):
+    """
+    Copy of a stored media description with presigned URLs for every rendition.
+    """
+    if not media:
+        return None
+    result = dict(media)
+    if 'renditions' in media:
+        result['renditions'] = {
+            name: dict(rendition, url=convert_to_presigned_url(
+                object_url(bucket_name, rendition['key']), bucket=bucket_name, expires_in=expires_in
+            ))
+            for name, rendition in media['renditions'].items()
+        }
+    return result
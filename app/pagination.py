@@ -0,0 +1,90 @@
+import base64
+import json
+import uuid
+from datetime import datetime
+
+
+def encode_cursor(created_at, row_id):
+    """
+    Build an opaque keyset cursor from the sort key of the last row of a page.
+
+    Parameters:
+      created_at (datetime): The created_at value of the row.
+      row_id (str): The row's UUID primary key, used as a tie-breaker.
+
+    Returns:
+      str: A URL-safe token to hand back to the client.
+    """
+    payload = json.dumps([created_at.isoformat(), str(row_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Reverse encode_cursor().
+
+    Returns:
+      tuple: (created_at, row_id)
+
+    Raises:
+      ValueError: If the cursor was not produced by encode_cursor().
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        uuid.UUID(row_id)
+        return datetime.fromisoformat(created_at), row_id
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def encode_since_cursor(seq, row_id):
+    """
+    Build an opaque `since` cursor from the commit-ordered position of the newest
+    row a client holds (see relyexchange.comments.seq).
+    """
+    payload = json.dumps(['since', seq, str(row_id)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_since_cursor(cursor):
+    """
+    Reverse encode_since_cursor().
+
+    Returns:
+      tuple: (seq, row_id)
+
+    Raises:
+      ValueError: If the cursor was not produced by encode_since_cursor().
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        kind, seq, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if kind != 'since' or not isinstance(seq, int):
+            raise ValueError('Not a since cursor')
+        uuid.UUID(row_id)
+        return seq, row_id
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def parse_page_limit(args, default, maximum):
+    """
+    Read and validate the `limit` query parameter.
+
+    Returns:
+      int: The requested page size.
+
+    Raises:
+      ValueError: If the limit is not an integer between 1 and maximum.
+    """
+    raw = args.get('limit')
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise ValueError(f'limit must be an integer between 1 and {maximum}') from None
+    if limit < 1 or limit > maximum:
+        raise ValueError(f'limit must be between 1 and {maximum}')
+    return limit
@@ -0,0 +1,249 @@
+import time
+
+import click
+from flask import current_app
+
+from app.db import get_db_connection
+from app.storage import ATTACHMENT_BUCKET, release_attachment_object, s3_client
+
+POSTS_JOB = 'posts'
+# S3 DeleteObjects accepts at most 1000 keys per call.
+S3_DELETE_BATCH = 1000
+
+
+def _load_checkpoint(cur, job):
+    cur.execute(
+        "SELECT last_deleted_at, last_key FROM relyexchange.purge_checkpoints WHERE job = %s",
+        (job,)
+    )
+    return cur.fetchone()
+
+
+def _save_checkpoint(cur, job, last_deleted_at, last_key):
+    cur.execute("""
+        INSERT INTO relyexchange.purge_checkpoints (job, last_deleted_at, last_key, updated_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (job) DO UPDATE
+        SET last_deleted_at = EXCLUDED.last_deleted_at, last_key = EXCLUDED.last_key, updated_at = NOW()
+    """, (job, last_deleted_at, last_key))
+
+
+def purge_deleted_posts_batch(cur, retention_days, batch_size):
+    """
+    Archive and delete one batch of posts soft-deleted more than retention_days ago,
+    together with their mentions, shares, comments and inbox rows, and release their
+    attachment references. Runs in the caller's transaction; the checkpoint is
+    advanced in the same transaction, so a batch is either fully done or not at all.
+    Posts locked by another transaction are skipped and never passed by the checkpoint.
+
+    Returns:
+      int: Number of posts purged.
+    """
+    checkpoint = _load_checkpoint(cur, POSTS_JOB)
+    if checkpoint and checkpoint[0]:
+        cur.execute("""
+            SELECT post_id, deleted_at, attachment_key
+            FROM relyexchange.posts
+            WHERE is_deleted = true AND deleted_at < NOW() - make_interval(days => %s)
+              AND (deleted_at, post_id) > (%s, %s::uuid)
+            ORDER BY deleted_at, post_id
+            LIMIT %s
+        """, (retention_days, checkpoint[0], checkpoint[1], batch_size))
+    else:
+        cur.execute("""
+            SELECT post_id, deleted_at, attachment_key
+            FROM relyexchange.posts
+            WHERE is_deleted = true AND deleted_at < NOW() - make_interval(days => %s)
+            ORDER BY deleted_at, post_id
+            LIMIT %s
+        """, (retention_days, batch_size))
+    candidates = cur.fetchall()
+    if not candidates:
+        return 0
+
+    # Skip posts another transaction holds; they are retried on the next batch.
+    cur.execute("""
+        SELECT post_id FROM relyexchange.posts
+        WHERE post_id = ANY(%s::uuid[])
+          AND is_deleted = true AND deleted_at < NOW() - make_interval(days => %s)
+        FOR UPDATE SKIP LOCKED
+    """, ([str(row[0]) for row in candidates], retention_days))
+    locked = {str(row[0]) for row in cur.fetchall()}
+    rows = [row for row in candidates if str(row[0]) in locked]
+    if not rows:
+        return 0
+    post_ids = [str(row[0]) for row in rows]
+
+    cur.execute("""
+        INSERT INTO relyexchange.archived_posts (post_id, user_id, deleted_at, document)
+        SELECT p.post_id, p.user_id, p.deleted_at, jsonb_build_object(
+            'post', to_jsonb(p),
+            'mentions', COALESCE((SELECT jsonb_agg(to_jsonb(pm)) FROM relyexchange.post_mentions pm
+                                  WHERE pm.post_id = p.post_id), '[]'::jsonb),
+            'shares', COALESCE((SELECT jsonb_agg(to_jsonb(ps)) FROM relyexchange.post_shares ps
+                                WHERE ps.post_id = p.post_id), '[]'::jsonb),
+            'comments', COALESCE((SELECT jsonb_agg(to_jsonb(c) ORDER BY c.created_at)
+                                  FROM relyexchange.comments c
+                                  WHERE c.post_id = p.post_id), '[]'::jsonb)
+        )
+        FROM relyexchange.posts p
+        WHERE p.post_id = ANY(%s::uuid[])
+        ON CONFLICT (post_id) DO NOTHING
+    """, (post_ids,))
+    for table in ('post_mentions', 'post_shares', 'comments', 'post_inbox'):
+        cur.execute(f"DELETE FROM relyexchange.{table} WHERE post_id = ANY(%s::uuid[])", (post_ids,))
+    cur.execute("DELETE FROM relyexchange.posts WHERE post_id = ANY(%s::uuid[])", (post_ids,))
+
+    # Deleted posts keep their attachment reference until they are purged.
+    for row in rows:
+        release_attachment_object(cur, row[2])
+
+    # Advance only past the leading run of purged candidates, so a skipped post
+    # stays ahead of the checkpoint and is not passed over for good.
+    purged_prefix = []
+    for row in candidates:
+        if str(row[0]) not in locked:
+            break
+        purged_prefix.append(row)
+    if purged_prefix:
+        last = purged_prefix[-1]
+        _save_checkpoint(cur, POSTS_JOB, last[1], str(last[0]))
+    return len(rows)
+
+
+def _delete_stored_objects(bucket_name, object_keys):
+    for start in range(0, len(object_keys), S3_DELETE_BATCH):
+        chunk = object_keys[start:start + S3_DELETE_BATCH]
+        response = s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={'Objects': [{'Key': key} for key in chunk], 'Quiet': True}
+        )
+        errors = response.get('Errors') or []
+        if errors:
+            raise RuntimeError(f"Could not delete {len(errors)} stored objects, e.g. {errors[0]}")
+
+
+def purge_orphaned_objects_batch(cur, grace_hours, batch_size, bucket_name=ATTACHMENT_BUCKET):
+    """
+    Delete one batch of attachment objects that have had no references for
+    grace_hours, together with their image renditions, from storage and from
+    relyexchange.attachment_objects. The rows stay locked until the caller commits,
+    so a concurrent acquire_attachment_object() waits and then registers the
+    object afresh. Objects still 'pending' are skipped unless their upload started
+    more than grace_hours ago, i.e. was lost.
+
+    Returns:
+      int: Number of objects purged.
+    """
+    cur.execute("""
+        SELECT object_key, media
+        FROM relyexchange.attachment_objects
+        WHERE ref_count = 0
+          AND (status <> 'pending' OR pending_since < NOW() - make_interval(hours => %s))
+          AND orphaned_at < NOW() - make_interval(hours => %s)
+        ORDER BY orphaned_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (grace_hours, grace_hours, batch_size))
+    rows = cur.fetchall()
+    if not rows:
+        return 0
+
+    object_keys = []
+    for object_key, media in rows:
+        object_keys.append(object_key)
+        for rendition in ((media or {}).get('renditions') or {}).values():
+            object_keys.append(rendition['key'])
+    # Storage first: if this fails the rows survive and the next run retries.
+    _delete_stored_objects(bucket_name, object_keys)
+
+    cur.execute(
+        "DELETE FROM relyexchange.attachment_objects WHERE object_key = ANY(%s)",
+        ([row[0] for row in rows],)
+    )
+    return len(rows)
+
+
+def purge_expired_idempotency_keys_batch(cur, batch_size):
+    """
+    Delete one batch of expired Idempotency-Key records.
+
+    Returns:
+      int: Number of records deleted.
+    """
+    cur.execute("""
+        DELETE FROM relyexchange.idempotency_keys
+        WHERE (scope, key) IN (
+            SELECT scope, key FROM relyexchange.idempotency_keys
+            WHERE expires_at < NOW()
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+    """, (batch_size,))
+    return cur.rowcount
+
+
+def _run_batches(app, purge_batch, pause, max_batches, label):
+    total = 0
+    batches = 0
+    while not max_batches or batches < max_batches:
+        with get_db_connection(app) as conn, conn.cursor() as cur:
+            purged = purge_batch(cur)
+            conn.commit()
+        if not purged:
+            break
+        total += purged
+        batches += 1
+        click.echo(f"Purged {total} {label} so far")
+        # Throttle so the purge does not starve request traffic of I/O and pool slots.
+        time.sleep(pause)
+    return total
+
+
+def purge_deleted(app, retention_days, grace_hours, batch_size, pause, max_batches=0):
+    """
+    Run the purge phases: archive and remove soft-deleted posts past the retention
+    window, delete attachment objects nothing references any more, and drop expired
+    Idempotency-Key records.
+
+    Returns:
+      tuple: (posts purged, objects purged)
+    """
+    posts = _run_batches(
+        app, lambda cur: purge_deleted_posts_batch(cur, retention_days, batch_size),
+        pause, max_batches, 'posts'
+    )
+    objects = _run_batches(
+        app, lambda cur: purge_orphaned_objects_batch(cur, grace_hours, batch_size),
+        pause, max_batches, 'attachment objects'
+    )
+    _run_batches(
+        app, lambda cur: purge_expired_idempotency_keys_batch(cur, batch_size),
+        pause, max_batches, 'idempotency keys'
+    )
+    return posts, objects
+
+
+@click.command('purge-deleted')
+@click.option('--retention-days', type=int, default=None,
+              help='Keep soft-deleted posts this long (default PURGE_RETENTION_DAYS).')
+@click.option('--grace-hours', type=int, default=None,
+              help='Keep unreferenced objects this long (default PURGE_ORPHAN_GRACE_HOURS).')
+@click.option('--batch-size', type=int, default=None,
+              help='Rows per transaction (default PURGE_BATCH_SIZE).')
+@click.option('--pause', type=float, default=None,
+              help='Seconds to sleep between batches (default PURGE_BATCH_PAUSE).')
+@click.option('--max-batches', type=int, default=0,
+              help='Stop each phase after this many batches; 0 runs until done.')
+def purge_deleted_command(retention_days, grace_hours, batch_size, pause, max_batches):
+    """Archive soft-deleted posts and delete orphaned attachments in batches."""
+    config = current_app.config
+    posts, objects = purge_deleted(
+        current_app._get_current_object(),
+        retention_days if retention_days is not None else config['PURGE_RETENTION_DAYS'],
+        grace_hours if grace_hours is not None else config['PURGE_ORPHAN_GRACE_HOURS'],
+        batch_size or config['PURGE_BATCH_SIZE'],
+        pause if pause is not None else config['PURGE_BATCH_PAUSE'],
+        max_batches
+    )
+    click.echo(f"Purged {posts} posts and {objects} attachment objects")
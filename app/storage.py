@@ -0,0 +1,348 @@
+import hashlib
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from flask import current_app
+
+from app.cache import TTLCache, invalidate_post_documents
+from app.config import Config
+from app.db import get_db_connection
+
+# --- Supabase Storage / S3 configuration ---
+
+ATTACHMENT_BUCKET = "relyexchange"
+ALLOWED_ATTACHMENT_EXTENSIONS = ['mp3', 'jpeg', 'jpg', 'png', 'txt']
+# Key prefixes attachments may be stored under (create_post uses voicenotes, update_post posts).
+ATTACHMENT_FOLDERS = ['voicenotes', 'posts']
+# Room for the non-file form fields (content, mentions, shares, ...) of a post upload.
+FORM_FIELDS_MAX_BYTES = 64 * 1024
+
+s3_url = Config.S3_URL
+access_key = Config.S3_ACCESS_KEY
+secret_key = Config.S3_SECRET_KEY
+session = boto3.session.Session()
+s3_client = session.client(
+    's3',
+    endpoint_url=s3_url,
+    aws_access_key_id=access_key,
+    aws_secret_access_key=secret_key
+)
+
+# Presigned URLs keyed by (bucket, object_key, expires_in); see convert_to_presigned_url.
+presigned_url_cache = TTLCache(maxsize=Config.PRESIGNED_URL_CACHE_SIZE)
+
+# Attachment uploads run here so request workers are not pinned by slow transfers.
+upload_executor = ThreadPoolExecutor(
+    max_workers=Config.ATTACHMENT_UPLOAD_WORKERS,
+    thread_name_prefix='attachment-upload'
+)
+transfer_config = TransferConfig(
+    multipart_threshold=Config.ATTACHMENT_MULTIPART_THRESHOLD,
+    multipart_chunksize=Config.ATTACHMENT_MULTIPART_CHUNKSIZE
+)
+
+
+class AttachmentTooLarge(Exception):
+    """Raised when an uploaded attachment exceeds ATTACHMENT_MAX_BYTES."""
+
+
+class SpooledAttachment:
+    """
+    An uploaded file copied off the request into a bounded temporary file,
+    so it can outlive the request and be uploaded in the background.
+    """
+
+    def __init__(self, file, filename, extension, size, sha256):
+        self.file = file
+        self.filename = filename
+        self.extension = extension
+        self.size = size
+        self.sha256 = sha256
+
+    @property
+    def object_key(self):
+        return content_attachment_key(self.sha256, self.extension)
+
+    def close(self):
+        self.file.close()
+
+
+def attachment_extension(filename):
+    """
+    Return the lower-cased extension of filename if it is an allowed attachment type, else None.
+    """
+    ext = filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else ''
+    return ext if ext in ALLOWED_ATTACHMENT_EXTENSIONS else None
+
+
+def attachment_request_limit():
+    """
+    Largest request body accepted by endpoints that take an attachment.
+    """
+    return Config.ATTACHMENT_MAX_BYTES + FORM_FIELDS_MAX_BYTES
+
+
+def spool_attachment(file_storage, max_bytes=None, chunk_size=64 * 1024):
+    """
+    Stream an uploaded file into a SpooledTemporaryFile, enforcing the size limit
+    while copying so an oversized body is rejected before it is fully buffered.
+    The SHA-256 of the content is computed on the way through.
+
+    Raises:
+      AttachmentTooLarge: If more than max_bytes (default ATTACHMENT_MAX_BYTES) are read.
+    """
+    max_bytes = Config.ATTACHMENT_MAX_BYTES if max_bytes is None else max_bytes
+    spool = tempfile.SpooledTemporaryFile(max_size=Config.ATTACHMENT_SPOOL_MEMORY_BYTES)
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        while True:
+            chunk = file_storage.stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise AttachmentTooLarge(f'Attachment exceeds the {max_bytes} byte limit')
+            digest.update(chunk)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return SpooledAttachment(
+        spool, file_storage.filename, attachment_extension(file_storage.filename), size,
+        digest.hexdigest()
+    )
+
+
+def content_attachment_key(sha256, extension):
+    """
+    Content-addressed object key: identical uploads share one object, and different
+    files can no longer overwrite each other because they happen to share a name.
+    """
+    return f"content/{sha256}.{extension}"
+
+
+def acquire_attachment_object(cur, object_key, sha256, size, status='pending', stale_after=None):
+    """
+    Take a reference on the stored object behind object_key, registering it in
+    relyexchange.attachment_objects on first use. Runs in the caller's transaction.
+    An upload still pending after stale_after seconds (default
+    ATTACHMENT_UPLOAD_STALE_SECONDS) is taken to be lost, like a failed one.
+
+    Returns:
+      tuple: (status, needs_upload) where status is the attachment_status the referencing
+             post should get and needs_upload tells the caller to upload the bytes itself.
+             needs_upload is False when the object is already stored or being uploaded.
+    """
+    stale_after = Config.ATTACHMENT_UPLOAD_STALE_SECONDS if stale_after is None else stale_after
+    while True:
+        cur.execute("""
+            INSERT INTO relyexchange.attachment_objects
+                (object_key, sha256, size, ref_count, status, pending_since)
+            VALUES (%s, %s, %s, 1, %s, CASE WHEN %s = 'pending' THEN NOW() END)
+            ON CONFLICT (object_key) DO NOTHING
+            RETURNING status
+        """, (object_key, sha256, size, status, status))
+        row = cur.fetchone()
+        if row:
+            return row[0], status == 'pending'
+
+        cur.execute("""
+            SELECT status, pending_since < NOW() - make_interval(secs => %s)
+            FROM relyexchange.attachment_objects
+            WHERE object_key = %s
+            FOR UPDATE
+        """, (stale_after, object_key))
+        row = cur.fetchone()
+        if row:
+            break
+        # The purge job removed the orphaned object in between; register it afresh.
+
+    previous_status, stale = row
+    # A failed or lost earlier upload is retried by whoever references the object next.
+    retry = previous_status == 'failed' or (previous_status == 'pending' and bool(stale))
+    new_status = 'pending' if retry else previous_status
+    cur.execute("""
+        UPDATE relyexchange.attachment_objects
+        SET ref_count = ref_count + 1, status = %s, orphaned_at = NULL,
+            pending_since = CASE WHEN %s THEN NOW() ELSE pending_since END
+        WHERE object_key = %s
+    """, (new_status, retry, object_key))
+    return new_status, retry
+
+
+def release_attachment_object(cur, object_key):
+    """
+    Drop a reference taken with acquire_attachment_object(). Objects whose count reaches
+    zero are left for the purge job (app/purge.py) to delete from storage.
+    """
+    if not object_key:
+        return
+    cur.execute("""
+        UPDATE relyexchange.attachment_objects
+        SET ref_count = ref_count - 1,
+            orphaned_at = CASE WHEN ref_count = 1 THEN NOW() ELSE orphaned_at END
+        WHERE object_key = %s AND ref_count > 0
+    """, (object_key,))
+
+
+def object_url(bucket_name, object_key):
+    """
+    URL under which an object is recorded in the database (see convert_to_presigned_url).
+    """
+    return f"{s3_client.meta.endpoint_url}/{bucket_name}/{object_key}"
+
+
+def direct_upload_key(folder_name, user_id, extension):
+    """
+    Object key for a client-side upload: a fresh name under the folder and the uploader's ID,
+    so direct uploads can neither collide nor overwrite each other.
+    """
+    return f"{folder_name}/{user_id}/{uuid.uuid4()}.{extension}"
+
+
+def is_direct_upload_key(object_key, user_id):
+    """
+    Check that object_key has the shape produced by direct_upload_key() for this user.
+    """
+    parts = object_key.split('/') if object_key else []
+    return (
+        len(parts) == 3
+        and parts[0] in ATTACHMENT_FOLDERS
+        and parts[1] == user_id
+        and attachment_extension(parts[2]) is not None
+    )
+
+
+def presign_attachment_upload(bucket_name, object_key, max_bytes=None, expires_in=None):
+    """
+    Build a presigned POST policy that lets a client upload exactly one object
+    (object_key) of at most max_bytes directly to storage.
+
+    Returns:
+      dict: {'url': ..., 'fields': {...}} to be sent as a multipart form by the client.
+    """
+    max_bytes = Config.ATTACHMENT_MAX_BYTES if max_bytes is None else max_bytes
+    expires_in = Config.ATTACHMENT_PRESIGN_EXPIRES_IN if expires_in is None else expires_in
+    return s3_client.generate_presigned_post(
+        Bucket=bucket_name,
+        Key=object_key,
+        Conditions=[
+            ['content-length-range', 1, max_bytes],
+        ],
+        ExpiresIn=expires_in
+    )
+
+
+def head_attachment(bucket_name, object_key):
+    """
+    Return the stored size of an object in bytes, or None if it does not exist.
+    """
+    try:
+        response = s3_client.head_object(Bucket=bucket_name, Key=object_key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    return response['ContentLength']
+
+
+def _upload_attachment(app, attachment, bucket_name, object_key, on_ready):
+    """
+    Executor job: upload a spooled attachment (multipart above the threshold) and
+    flip the object's status, and that of every post still waiting on it, to
+    'ready' or 'failed'. on_ready(app, bucket_name, object_key) runs after a
+    successful upload.
+    """
+    status = 'ready'
+    try:
+        attachment.file.seek(0)
+        s3_client.upload_fileobj(attachment.file, bucket_name, object_key, Config=transfer_config)
+    except Exception as e:
+        print(f"Error uploading attachment {object_key}: {e}")
+        status = 'failed'
+    finally:
+        attachment.close()
+
+    try:
+        with get_db_connection(app) as conn, conn.cursor() as cur:
+            # An upload that was taken over as stale must not undo its successor's success.
+            cur.execute("""
+                UPDATE relyexchange.attachment_objects
+                SET status = %s
+                WHERE object_key = %s AND (status <> 'ready' OR %s = 'ready')
+            """, (status, object_key, status))
+            # Posts that reused the object while this upload was in flight are waiting too.
+            cur.execute("""
+                UPDATE relyexchange.posts
+                SET attachment_status = %s, version = version + 1
+                WHERE attachment_key = %s AND attachment_status = 'pending'
+                RETURNING post_id
+            """, (status, object_key))
+            post_ids = [row[0] for row in cur.fetchall()]
+            conn.commit()
+        invalidate_post_documents(post_ids, app)
+    except Exception as e:
+        print(f"Error recording attachment status for {object_key}: {e}")
+        return
+
+    if status == 'ready' and on_ready:
+        on_ready(app, bucket_name, object_key)
+
+
+def start_attachment_upload(attachment, bucket_name, object_key, on_ready=None):
+    """
+    Hand a spooled attachment to the upload executor. The executor owns (and closes)
+    the attachment from here on. Call this only after the referencing post is committed.
+    """
+    app = current_app._get_current_object()
+    return upload_executor.submit(_upload_attachment, app, attachment, bucket_name, object_key, on_ready)
+
+
+def convert_to_presigned_url(url, bucket, expires_in=3600):
+    """
+    Convert a stored S3 URL to a presigned URL.
+    
+    Parameters:
+      url (str): The original S3 URL.
+      bucket (str): The name of the S3 bucket.
+      expires_in (int): Time in seconds for the presigned URL to remain valid.
+    
+    Returns:
+      str: A presigned URL if url is not None and the object key can be determined; otherwise, the original URL or None.
+
+    A URL is reused for PRESIGNED_URL_REUSE_FRACTION of its lifetime, so repeated reads of
+    the same attachment return an identical (and therefore client/CDN cacheable) URL.
+    """
+    if not url:
+        return None
+
+    try:
+        # Assume the URL is formatted as: <endpoint_url>/<bucket>/<object_key>
+        parts = url.split(f"/{bucket}/")
+        if len(parts) < 2:
+            # If the URL doesn't match our expected format, return it unchanged.
+            return url
+        
+        object_key = parts[-1]
+        cache_key = (bucket, object_key, expires_in)
+        presigned_url = presigned_url_cache.get(cache_key)
+        if presigned_url:
+            return presigned_url
+
+        # Generate a presigned URL using the globally configured s3_client.
+        presigned_url = s3_client.generate_presigned_url(
+            ClientMethod="get_object",
+            Params={"Bucket": bucket, "Key": object_key},
+            ExpiresIn=expires_in
+        )
+        presigned_url_cache.set(cache_key, presigned_url, ttl=expires_in * Config.PRESIGNED_URL_REUSE_FRACTION)
+        return presigned_url
+    except Exception as e:
+        print(f"Error generating presigned URL: {e}")
+        return url
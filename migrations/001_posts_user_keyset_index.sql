@@ -0,0 +1,6 @@
+-- Supports keyset pagination in GET /posts/posts/user/<user_id>:
+--   WHERE user_id = ? AND is_deleted = false AND (created_at, post_id) < (?, ?)
+--   ORDER BY created_at DESC, post_id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_user_created_at_idx
+    ON relyexchange.posts (user_id, created_at DESC, post_id DESC)
+    WHERE is_deleted = false;
@@ -0,0 +1,13 @@
+-- Attachments are uploaded after the post row is committed (app/storage.py).
+-- attachment_key is the S3 object key behind attachment_url; attachment_status is
+-- NULL for posts without an attachment, otherwise 'pending', 'ready' or 'failed'.
+ALTER TABLE relyexchange.posts
+    ADD COLUMN IF NOT EXISTS attachment_key text,
+    ADD COLUMN IF NOT EXISTS attachment_status text
+        CHECK (attachment_status IN ('pending', 'ready', 'failed'));
+
+-- Everything uploaded before this migration was stored synchronously.
+UPDATE relyexchange.posts
+SET attachment_status = 'ready',
+    attachment_key = substring(attachment_url FROM '/relyexchange/(.*)$')
+WHERE attachment_url IS NOT NULL AND attachment_status IS NULL;
@@ -0,0 +1,21 @@
+-- Stored attachment objects and how many posts reference them (app/storage.py).
+-- Uploads through the API are keyed by content hash (content/<sha256>.<ext>), so
+-- a re-posted file is stored once; ref_count tells the purge job when an object
+-- is no longer referenced and may be deleted from storage.
+CREATE TABLE IF NOT EXISTS relyexchange.attachment_objects (
+    object_key  text PRIMARY KEY,
+    sha256      text,
+    size        bigint,
+    ref_count   integer NOT NULL DEFAULT 0 CHECK (ref_count >= 0),
+    status      text NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'ready', 'failed')),
+    created_at  timestamptz NOT NULL DEFAULT NOW()
+);
+
+-- Register objects referenced by existing posts.
+INSERT INTO relyexchange.attachment_objects (object_key, ref_count, status)
+SELECT attachment_key, COUNT(*), 'ready'
+FROM relyexchange.posts
+WHERE attachment_key IS NOT NULL
+GROUP BY attachment_key
+ON CONFLICT (object_key) DO NOTHING;
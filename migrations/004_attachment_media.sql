@@ -0,0 +1,4 @@
+-- Output of the background media pipeline (app/media.py): image dimensions and
+-- rendition keys, or mp3 duration/bitrate. NULL until processing has finished.
+ALTER TABLE relyexchange.attachment_objects
+    ADD COLUMN IF NOT EXISTS media jsonb;
@@ -0,0 +1,35 @@
+-- Per-user inbox of posts the user was mentioned in or shared with, written by
+-- create_post (fan-out on write) and read by GET /posts/posts/feed/<user_id>.
+-- created_at is the post's creation time so the feed pages on this table alone.
+CREATE TABLE IF NOT EXISTS relyexchange.post_inbox (
+    user_id     uuid NOT NULL,
+    post_id     uuid NOT NULL,
+    author_id   uuid NOT NULL,
+    created_at  timestamptz NOT NULL,
+    mentioned   boolean NOT NULL DEFAULT false,
+    shared      boolean NOT NULL DEFAULT false,
+    PRIMARY KEY (user_id, post_id)
+);
+
+CREATE INDEX IF NOT EXISTS post_inbox_user_keyset_idx
+    ON relyexchange.post_inbox (user_id, created_at DESC, post_id DESC);
+
+CREATE INDEX IF NOT EXISTS post_inbox_post_idx
+    ON relyexchange.post_inbox (post_id);
+
+-- Backfill from the mentions and shares of existing posts.
+INSERT INTO relyexchange.post_inbox (user_id, post_id, author_id, created_at, mentioned, shared)
+SELECT t.user_id, p.post_id, p.user_id, p.created_at, bool_or(t.mentioned), bool_or(t.shared)
+FROM (
+    SELECT post_id, mentioned_user_id AS user_id, true AS mentioned, false AS shared
+    FROM relyexchange.post_mentions
+    WHERE mentioned_user_id IS NOT NULL
+    UNION ALL
+    SELECT post_id, shared_with_user_id, false, true
+    FROM relyexchange.post_shares
+    WHERE shared_with_user_id IS NOT NULL
+) t
+JOIN relyexchange.posts p ON p.post_id = t.post_id
+WHERE p.is_deleted = false
+GROUP BY t.user_id, p.post_id, p.user_id, p.created_at
+ON CONFLICT (user_id, post_id) DO NOTHING;
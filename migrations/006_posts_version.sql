@@ -0,0 +1,5 @@
+-- Per-post version, bumped by every write that changes what the post, its comments
+-- or its attachment look like to readers. Read endpoints derive ETags from it
+-- (app/etags.py) so unchanged polls can be answered with 304 Not Modified.
+ALTER TABLE relyexchange.posts
+    ADD COLUMN IF NOT EXISTS version bigint NOT NULL DEFAULT 1;
@@ -0,0 +1,6 @@
+-- Supports keyset pagination in GET /comments/posts/<post_id>/comments:
+--   WHERE post_id = ? AND (created_at, comment_id) > (?, ?)   -- after / since
+--   WHERE post_id = ? AND (created_at, comment_id) < (?, ?)   -- before
+--   ORDER BY created_at, comment_id (ASC or DESC)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS comments_post_created_at_idx
+    ON relyexchange.comments (post_id, created_at, comment_id);
@@ -0,0 +1,19 @@
+-- Denormalized counters kept up to date by the write paths (create_post, delete_post,
+-- add_comment, delete_comment), so listings can show counts without reading the rows.
+-- comment_count counts non-deleted comments.
+ALTER TABLE relyexchange.posts
+    ADD COLUMN IF NOT EXISTS comment_count integer NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS mention_count integer NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS share_count integer NOT NULL DEFAULT 0;
+
+UPDATE relyexchange.posts p
+SET comment_count = (
+        SELECT COUNT(*) FROM relyexchange.comments c
+        WHERE c.post_id = p.post_id AND c.is_deleted = false
+    ),
+    mention_count = (
+        SELECT COUNT(*) FROM relyexchange.post_mentions pm WHERE pm.post_id = p.post_id
+    ),
+    share_count = (
+        SELECT COUNT(*) FROM relyexchange.post_shares ps WHERE ps.post_id = p.post_id
+    );
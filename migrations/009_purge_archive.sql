@@ -0,0 +1,33 @@
+-- Support for the purge job (app/purge.py, `flask --app run purge-deleted`).
+
+-- Soft-deleted posts past the retention window, archived with their mentions,
+-- shares and comments before the live rows are removed.
+CREATE TABLE IF NOT EXISTS relyexchange.archived_posts (
+    post_id      uuid PRIMARY KEY,
+    user_id      uuid,
+    deleted_at   timestamptz,
+    archived_at  timestamptz NOT NULL DEFAULT NOW(),
+    document     jsonb NOT NULL
+);
+
+-- Position of each purge phase, so an interrupted run resumes where it stopped
+-- instead of rescanning dead rows.
+CREATE TABLE IF NOT EXISTS relyexchange.purge_checkpoints (
+    job              text PRIMARY KEY,
+    last_deleted_at  timestamptz,
+    last_key         text,
+    updated_at       timestamptz NOT NULL DEFAULT NOW()
+);
+
+-- When an object lost its last reference; objects are only deleted from storage
+-- after PURGE_ORPHAN_GRACE_HOURS, so URLs handed out just before stay valid.
+ALTER TABLE relyexchange.attachment_objects
+    ADD COLUMN IF NOT EXISTS orphaned_at timestamptz;
+
+UPDATE relyexchange.attachment_objects
+SET orphaned_at = NOW()
+WHERE ref_count = 0 AND orphaned_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS attachment_objects_orphaned_idx
+    ON relyexchange.attachment_objects (orphaned_at)
+    WHERE ref_count = 0;
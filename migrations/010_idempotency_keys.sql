@@ -0,0 +1,18 @@
+-- Responses of create_post / add_comment requests sent with an Idempotency-Key
+-- header (app/idempotency.py). A retry with the same key replays the stored response
+-- instead of running the request again. Expired rows are removed by the purge job.
+CREATE TABLE IF NOT EXISTS relyexchange.idempotency_keys (
+    scope            text NOT NULL,
+    key              text NOT NULL,
+    fingerprint      text NOT NULL,
+    status           text NOT NULL DEFAULT 'in_progress'
+        CHECK (status IN ('in_progress', 'done')),
+    response_status  integer,
+    response_body    jsonb,
+    locked_at        timestamptz NOT NULL DEFAULT NOW(),
+    expires_at       timestamptz NOT NULL,
+    PRIMARY KEY (scope, key)
+);
+
+CREATE INDEX IF NOT EXISTS idempotency_keys_expires_at_idx
+    ON relyexchange.idempotency_keys (expires_at);
@@ -0,0 +1,62 @@
+-- Dedup keys for CSV imports into relyexchange.contacts (POST /contacts/upload/<user_id>):
+-- a contact is identified by its owner and normalised phone number, a connection by
+-- its owner and profile URL. Imports insert with ON CONFLICT DO NOTHING against these
+-- indexes instead of loading every existing key first.
+-- phone_key must match normalize_phone() in app/endpoints/contacts.py.
+ALTER TABLE relyexchange.contacts
+    ADD COLUMN IF NOT EXISTS phone_key text
+    GENERATED ALWAYS AS (NULLIF(regexp_replace(phonenumbers, '[^0-9+]', '', 'g'), '')) STORED;
+
+-- Existing duplicates: keep the first row of each key and point mentions and shares at it.
+CREATE TEMP TABLE contact_duplicates AS
+SELECT c.id AS duplicate_id, k.keep_id
+FROM relyexchange.contacts c
+JOIN (
+    SELECT DISTINCT ON (user_id, phone_key) user_id, phone_key, id AS keep_id
+    FROM relyexchange.contacts
+    WHERE phone_key IS NOT NULL
+    ORDER BY user_id, phone_key, id
+) k ON k.user_id = c.user_id AND k.phone_key = c.phone_key AND k.keep_id <> c.id;
+
+INSERT INTO contact_duplicates (duplicate_id, keep_id)
+SELECT c.id, k.keep_id
+FROM relyexchange.contacts c
+JOIN (
+    -- Rows the phone pass already removes cannot be kept.
+    SELECT DISTINCT ON (user_id, url) user_id, url, id AS keep_id
+    FROM relyexchange.contacts
+    WHERE url <> ''
+      AND id NOT IN (SELECT duplicate_id FROM contact_duplicates)
+    ORDER BY user_id, url, id
+) k ON k.user_id = c.user_id AND k.url = c.url AND k.keep_id <> c.id
+WHERE NOT EXISTS (SELECT 1 FROM contact_duplicates d WHERE d.duplicate_id = c.id);
+
+-- A row kept by the phone pass may itself be a URL duplicate: point its duplicates at
+-- the row the URL pass keeps instead (that row is never a duplicate, so one step is enough).
+UPDATE contact_duplicates d
+SET keep_id = u.keep_id
+FROM contact_duplicates u
+WHERE d.keep_id = u.duplicate_id;
+
+UPDATE relyexchange.post_mentions pm
+SET mentioned_contact_id = d.keep_id
+FROM contact_duplicates d
+WHERE pm.mentioned_contact_id = d.duplicate_id;
+
+UPDATE relyexchange.post_shares ps
+SET shared_contact_id = d.keep_id
+FROM contact_duplicates d
+WHERE ps.shared_contact_id = d.duplicate_id;
+
+DELETE FROM relyexchange.contacts c
+USING contact_duplicates d
+WHERE c.id = d.duplicate_id;
+
+DROP TABLE contact_duplicates;
+
+CREATE UNIQUE INDEX IF NOT EXISTS contacts_user_phone_key_idx
+    ON relyexchange.contacts (user_id, phone_key);
+
+CREATE UNIQUE INDEX IF NOT EXISTS contacts_user_url_idx
+    ON relyexchange.contacts (user_id, url)
+    WHERE url <> '';
@@ -0,0 +1,29 @@
+-- Background contact CSV imports (POST /contacts/imports/<user_id>, app/contact_imports.py).
+-- The upload is stored under imports/ in object storage until its job has run; workers
+-- commit one batch at a time and add to the counters as they go. heartbeat_at lets
+-- another worker take over a job whose worker died.
+CREATE TABLE IF NOT EXISTS relyexchange.contact_import_jobs (
+    job_id          uuid PRIMARY KEY,
+    user_id         uuid NOT NULL,
+    object_key      text NOT NULL,
+    filename        text,
+    status          text NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    csv_type        text,
+    processed_rows  integer NOT NULL DEFAULT 0,
+    inserted_rows   integer NOT NULL DEFAULT 0,
+    skipped_rows    integer NOT NULL DEFAULT 0,
+    errors          jsonb NOT NULL DEFAULT '[]'::jsonb,
+    error           text,
+    created_at      timestamptz NOT NULL DEFAULT NOW(),
+    started_at      timestamptz,
+    heartbeat_at    timestamptz,
+    finished_at     timestamptz
+);
+
+CREATE INDEX IF NOT EXISTS contact_import_jobs_user_created_at_idx
+    ON relyexchange.contact_import_jobs (user_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS contact_import_jobs_active_idx
+    ON relyexchange.contact_import_jobs (created_at)
+    WHERE status IN ('queued', 'running');
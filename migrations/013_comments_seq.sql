@@ -0,0 +1,7 @@
+-- Commit-ordered position of a comment within its post, for GET .../comments?since=.
+-- insert_comments stores the post's new version here while the post row is locked
+-- until commit, so per post seq grows in commit order: a poller that has seen seq N
+-- has seen every comment below it, even ones created earlier that committed late.
+-- Comments written before this migration share seq 0.
+ALTER TABLE relyexchange.comments
+    ADD COLUMN IF NOT EXISTS seq bigint NOT NULL DEFAULT 0;
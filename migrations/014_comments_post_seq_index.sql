@@ -0,0 +1,5 @@
+-- Supports ?since= polling in GET /comments/posts/<post_id>/comments:
+--   WHERE post_id = ? AND (seq, comment_id) > (?, ?)
+--   ORDER BY seq, comment_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS comments_post_seq_idx
+    ON relyexchange.comments (post_id, seq, comment_id);
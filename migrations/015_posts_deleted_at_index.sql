@@ -0,0 +1,7 @@
+-- Supports the purge job's scan of soft-deleted posts (app/purge.py):
+--   WHERE is_deleted = true AND deleted_at < ? AND (deleted_at, post_id) > (?, ?)
+--   ORDER BY deleted_at, post_id
+-- Kept apart from 009 because CREATE INDEX CONCURRENTLY cannot run in a transaction.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS posts_deleted_at_idx
+    ON relyexchange.posts (deleted_at, post_id)
+    WHERE is_deleted = true;
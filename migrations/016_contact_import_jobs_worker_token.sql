@@ -0,0 +1,5 @@
+-- Owner of a running contact import job (app/contact_imports.py). Each claim stores a
+-- new token and every progress or finish update of the worker matches on it, so a
+-- worker whose job was taken over as stale stops instead of writing over the new one.
+ALTER TABLE relyexchange.contact_import_jobs
+    ADD COLUMN IF NOT EXISTS worker_token uuid;
@@ -0,0 +1,10 @@
+-- When an attachment object last went 'pending' (app/storage.py). Uploads run in an
+-- in-process executor, so a process that dies mid-upload leaves the row 'pending';
+-- once pending_since is ATTACHMENT_UPLOAD_STALE_SECONDS old, the next post that
+-- references the object uploads it again.
+ALTER TABLE relyexchange.attachment_objects
+    ADD COLUMN IF NOT EXISTS pending_since timestamptz;
+
+UPDATE relyexchange.attachment_objects
+SET pending_since = created_at
+WHERE status = 'pending' AND pending_since IS NULL;
@@ -0,0 +1,121 @@
+import sys
+import threading
+import types
+
+import pytest
+from flask import Flask
+
+from app.cache import (
+    RedisCache, TTLCache, VersionedCache, init_post_cache, invalidate_post_documents, post_document_cache
+)
+
+
+class FakeRedis:
+    """In-memory stand-in for the parts of redis.Redis that RedisCache uses."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def incr(self, key):
+        # Like Redis, counters are stored as the decimal string of an integer.
+        value = int(self.data.get(key, b'0')) + 1
+        self.data[key] = str(value).encode('ascii')
+        return value
+
+    def expire(self, key, ttl):
+        pass
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def incr(self, key):
+        self.calls.append(lambda: self.client.incr(key))
+
+    def expire(self, key, ttl):
+        self.calls.append(lambda: self.client.expire(key, ttl))
+
+    def execute(self):
+        return [call() for call in self.calls]
+
+
+@pytest.fixture
+def redis_cache(monkeypatch):
+    client = FakeRedis()
+    fake_module = types.SimpleNamespace(Redis=types.SimpleNamespace(from_url=lambda url: client))
+    monkeypatch.setitem(sys.modules, 'redis', fake_module)
+    return RedisCache('redis://localhost:6379/0')
+
+
+def test_redis_get_or_load_after_invalidate(redis_cache):
+    cache = VersionedCache(redis_cache, 'post', ttl=300)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return {'post_id': 'p1', 'content': f'v{len(loads)}'}
+
+    assert cache.get_or_load('p1', loader) == {'post_id': 'p1', 'content': 'v1'}
+    cache.invalidate('p1')
+    assert redis_cache.get_version('post:p1:version') == 1
+    assert cache.get_or_load('p1', loader) == {'post_id': 'p1', 'content': 'v2'}
+    # The reloaded document is served from the cache under the new version.
+    assert cache.get_or_load('p1', loader) == {'post_id': 'p1', 'content': 'v2'}
+    assert len(loads) == 2
+
+
+def test_memory_get_or_load_after_invalidate():
+    cache = VersionedCache(TTLCache(maxsize=10), 'post', ttl=300)
+    assert cache.get_or_load('p1', lambda: 'v1') == 'v1'
+    cache.invalidate('p1')
+    assert cache.get_or_load('p1', lambda: 'v2') == 'v2'
+
+
+def test_memory_incr_is_atomic():
+    backend = TTLCache(maxsize=10)
+    threads = [
+        threading.Thread(target=lambda: [backend.incr('post:p1:version', ttl=60) for _ in range(1000)])
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.get_version('post:p1:version') == 8000
+
+
+def test_memory_versions_survive_lru_eviction():
+    cache = VersionedCache(TTLCache(maxsize=2), 'post', ttl=300)
+    cache.get_or_load('p1', lambda: 'old')
+    cache.invalidate('p1')
+    assert cache.get_or_load('p1', lambda: 'new') == 'new'
+    # Fill the cache so every older entry is evicted.
+    for i in range(5):
+        cache.get_or_load(f'other{i}', lambda: 'x')
+    assert cache.backend.get_version('post:p1:version') == 1
+
+
+def test_invalidate_any_spelling_of_a_post_id():
+    app = Flask(__name__)
+    app.config.update(POST_CACHE_BACKEND='memory', POST_CACHE_SIZE=10, POST_CACHE_TTL=300,
+                      COMMENT_PERMISSION_CACHE_TTL=300)
+    init_post_cache(app)
+    post_id = '0f8fad5b-d9cb-469f-a165-70867728950e'
+    cache = post_document_cache(app)
+    assert cache.get_or_load(post_id, lambda: 'old') == 'old'
+    invalidate_post_documents([post_id.upper().replace('-', '')], app)
+    assert cache.get_or_load(post_id, lambda: 'new') == 'new'
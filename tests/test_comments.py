@@ -0,0 +1,27 @@
+import datetime
+
+import app.endpoints.comments as comments
+
+POST_ID = '0f8fad5b-d9cb-469f-a165-70867728950e'
+USER_ID = '7c9e6679-7425-40de-944b-e07fc1f90ae7'
+
+
+def test_created_events_follow_since_cursor_order(monkeypatch):
+    created_at = datetime.datetime(2026, 1, 1)
+    # RETURNING hands the rows back in no particular order.
+    inserted = [
+        ('cccccccc-0000-0000-0000-000000000000', POST_ID, USER_ID, 'one', created_at, 7),
+        ('aaaaaaaa-0000-0000-0000-000000000000', POST_ID, USER_ID, 'two', created_at, 7),
+        ('bbbbbbbb-0000-0000-0000-000000000000', POST_ID, USER_ID, 'three', created_at, 7),
+    ]
+    events = []
+    monkeypatch.setattr(comments, 'is_user_allowed_to_comment', lambda post_id, user_id, cur: True)
+    monkeypatch.setattr(comments, 'bump_post_versions', lambda cur, post_ids, comment_delta: {POST_ID: 7})
+    monkeypatch.setattr(comments, 'execute_values', lambda *args, **kwargs: list(inserted))
+    monkeypatch.setattr(comments, 'notify_comment_events',
+                        lambda cur, event, rows: events.extend(row[0] for row in rows))
+
+    results = comments.insert_comments(None, [(POST_ID, USER_ID, text) for text in ('one', 'two', 'three')])
+
+    assert [row[3] for row in results] == ['one', 'two', 'three']
+    assert events == sorted(row[0] for row in inserted)
@@ -0,0 +1,67 @@
+import io
+
+import pytest
+
+import app.endpoints.contacts as contacts
+from app.config import Config
+
+HEADER = ('FirstName,LastName,Companies,Title,Emails,PhoneNumbers,Addresses,Sites,'
+          'InstantMessageHandles,FullName,Birthday,Location,BookmarkedAt,Profiles\n')
+
+
+def contact_rows(count, start=0):
+    return ''.join(
+        f'A{i},"B\n{i}",C,"T ""x""",e{i}@x,+1 555 {i},"addr, {i}",s,im,FN,2020-01-0{i % 9 + 1},L,,P\n'
+        for i in range(start, start + count)
+    )
+
+
+@pytest.fixture
+def parse_workers(monkeypatch):
+    monkeypatch.setattr(Config, 'CONTACT_IMPORT_PARSE_CHUNK_BYTES', 256)
+    yield
+    if contacts._parse_executor is not None:
+        contacts._parse_executor.shutdown()
+        contacts._parse_executor = None
+
+
+def read_records(data, workers, monkeypatch):
+    monkeypatch.setattr(Config, 'CONTACT_IMPORT_PARSE_WORKERS', workers)
+    fieldnames, csv_type, records = contacts.open_csv_records(io.BytesIO(data.encode()), 'u')
+    return fieldnames, csv_type, list(records)
+
+
+@pytest.mark.parametrize('data', [
+    HEADER + contact_rows(100),
+    # A literal quote in an unquoted field makes quote counting misplace every
+    # boundary after it.
+    HEADER + contact_rows(20) + 'A,B,C,27" monitor,e,+1 1,ad,s,im,FN,,L,,P\n' + contact_rows(80, 20),
+    HEADER + 'A,B,C,27" monitor,e,+1 1,ad,s,im,FN,,L,,P\n' + contact_rows(100, 1),
+    HEADER.replace('Profiles', 'Profiles 12"') + contact_rows(50),
+    # The file ends inside a quoted field.
+    HEADER + contact_rows(40) + 'A,"unterminated\n' + contact_rows(5, 40),
+], ids=['clean', 'stray-quote', 'stray-quote-first-row', 'stray-quote-header', 'unterminated'])
+def test_parallel_parse_matches_sequential(data, parse_workers, monkeypatch):
+    expected = read_records(data, 0, monkeypatch)
+    assert expected[1] == 'contacts'
+    assert read_records(data, 3, monkeypatch) == expected
+
+
+def test_chunks_stay_bounded_after_stray_quote():
+    # Without quoted newlines after it, quote counting finds no boundary at all.
+    rows = ''.join(f'A{i},B,C,T,e,+1 {i},ad,s,im,FN,,L,,P\n' for i in range(500))
+    data = (HEADER + 'A,B,C,27" monitor,e,+1 1,ad,s,im,FN,,L,,P\n' + rows).encode()
+    chunks = list(contacts.csv_record_chunks(io.BytesIO(data), 256))
+    assert b''.join(chunks) == data
+    assert max(len(chunk) for chunk in chunks) < 3 * 256
+
+
+def test_chunk_rows_ended_cleanly():
+    fieldnames = ['a', 'b']
+    rows = contacts.ChunkRows('1,"x\ny"\n2,3\n', fieldnames)
+    assert list(rows) == [{'a': '1', 'b': 'x\ny'}, {'a': '2', 'b': '3'}]
+    assert rows.ended_cleanly
+
+    rows = contacts.ChunkRows('1,"x\n', fieldnames)
+    list(rows)
+    assert not rows.ended_cleanly
@@ -0,0 +1,67 @@
+import os
+import time
+
+import psycopg2
+
+from app.db import DatabasePool
+
+
+class FakeConnection:
+    def __init__(self, healthy):
+        self.healthy = healthy
+        self.closed = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def execute(self, query):
+        if not self.conn.healthy:
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+
+class FakePool:
+    """Hands out its idle connections first, then opens healthy new ones."""
+
+    def __init__(self, idle):
+        self.idle = list(idle)
+        self.opened = []
+
+    def getconn(self):
+        if self.idle:
+            return self.idle.pop(0)
+        conn = FakeConnection(healthy=True)
+        self.opened.append(conn)
+        return conn
+
+    def putconn(self, conn, close=False):
+        if close:
+            conn.closed = 1
+        else:
+            self.idle.append(conn)
+
+
+def test_getconn_skips_every_stale_connection():
+    stale = [FakeConnection(healthy=False) for _ in range(3)]
+    db_pool = DatabasePool({}, maxconn=5, healthcheck_interval=0)
+    db_pool._pool = FakePool(stale)
+    db_pool._pid = os.getpid()
+    for conn in stale:
+        db_pool._last_used[id(conn)] = time.monotonic() - 60
+
+    conn = db_pool.getconn()
+    assert conn is db_pool._pool.opened[0]
+    assert all(conn.closed for conn in stale)
@@ -0,0 +1,42 @@
+from flask import Flask
+
+import app.etags as etags
+from app.etags import make_etag, not_modified, presign_epoch, with_etag
+
+app = Flask(__name__)
+
+
+def test_make_etag_depends_on_every_part():
+    assert make_etag('post', 'p1', 3, 10) == make_etag('post', 'p1', 3, 10)
+    assert make_etag('post', 'p1', 3, 10) != make_etag('post', 'p1', 4, 10)
+    assert make_etag('post', 'p1', 3, 10) != make_etag('post', 'p1', 3, 11)
+
+
+def test_matching_if_none_match_gets_304():
+    etag = make_etag('post', 'p1', 3, 10)
+    with app.test_request_context(headers={'If-None-Match': f'"{etag}"'}):
+        response = not_modified(etag)
+        assert response.status_code == 304
+        assert response.headers['ETag'] == f'"{etag}"'
+    with app.test_request_context(headers={'If-None-Match': '"other"'}):
+        assert not_modified(etag) is None
+    with app.test_request_context():
+        assert not_modified(etag) is None
+
+
+def test_with_etag_asks_clients_to_revalidate():
+    with app.test_request_context():
+        response = with_etag(app.response_class('{}'), 'abc')
+        assert response.headers['ETag'] == '"abc"'
+        assert 'no-cache' in response.headers['Cache-Control']
+        assert 'private' in response.headers['Cache-Control']
+
+
+def test_presign_epoch_changes_once_per_reuse_window(monkeypatch):
+    monkeypatch.setattr(etags.Config, 'PRESIGNED_URL_REUSE_FRACTION', 0.5)
+    monkeypatch.setattr(etags.time, 'time', lambda: 3600 * 10)
+    epoch = presign_epoch(expires_in=3600)
+    monkeypatch.setattr(etags.time, 'time', lambda: 3600 * 10 + 1799)
+    assert presign_epoch(expires_in=3600) == epoch
+    monkeypatch.setattr(etags.time, 'time', lambda: 3600 * 10 + 1800)
+    assert presign_epoch(expires_in=3600) == epoch + 1
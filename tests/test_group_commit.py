@@ -0,0 +1,122 @@
+import contextlib
+import threading
+
+import psycopg2
+import pytest
+from flask import Flask
+
+import app.group_commit as group_commit
+from app.group_commit import GroupCommitter
+
+
+class FakeConnection:
+    def __init__(self, log):
+        self.log = log
+
+    def cursor(self):
+        return contextlib.nullcontext(None)
+
+    def commit(self):
+        self.log.append('commit')
+
+
+@pytest.fixture
+def commits(monkeypatch):
+    log = []
+
+    @contextlib.contextmanager
+    def fake_connection(app=None):
+        yield FakeConnection(log)
+
+    monkeypatch.setattr(group_commit, 'get_db_connection', fake_connection)
+    return log
+
+
+def make_committer(write_batch, **kwargs):
+    return GroupCommitter(Flask(__name__), write_batch, window=0.05, **kwargs)
+
+
+def test_concurrent_items_share_one_commit(commits):
+    batches = []
+
+    def write_batch(cur, items):
+        batches.append(list(items))
+        return [item * 2 for item in items]
+
+    committer = make_committer(write_batch)
+    futures = [committer.submit(i) for i in range(5)]
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6, 8]
+    assert batches == [[0, 1, 2, 3, 4]]
+    assert commits == ['commit']
+
+
+def test_exception_result_fails_only_its_item(commits):
+    committer = make_committer(
+        lambda cur, items: [ValueError(item) if item == 'bad' else item for item in items]
+    )
+    good, bad = committer.submit('good'), committer.submit('bad')
+    assert good.result(timeout=5) == 'good'
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
+
+
+def test_integrity_error_splits_the_batch(commits):
+    batches = []
+
+    def write_batch(cur, items):
+        batches.append(list(items))
+        if 'bad' in items:
+            raise psycopg2.IntegrityError('duplicate key')
+        return items
+
+    committer = make_committer(write_batch)
+    futures = [committer.submit(item) for item in ('a', 'bad', 'b')]
+    assert futures[0].result(timeout=5) == 'a'
+    assert futures[2].result(timeout=5) == 'b'
+    with pytest.raises(psycopg2.IntegrityError):
+        futures[1].result(timeout=5)
+    assert batches == [['a', 'bad', 'b'], ['a'], ['bad'], ['b']]
+
+
+def test_connection_error_fails_the_whole_batch(commits):
+    batches = []
+
+    def write_batch(cur, items):
+        batches.append(list(items))
+        raise psycopg2.OperationalError('server closed the connection')
+
+    committer = make_committer(write_batch)
+    futures = [committer.submit(i) for i in range(3)]
+    errors = []
+    for future in futures:
+        with pytest.raises(RuntimeError) as excinfo:
+            future.result(timeout=5)
+        assert isinstance(excinfo.value.__cause__, psycopg2.OperationalError)
+        errors.append(excinfo.value)
+    assert batches == [[0, 1, 2]]
+    assert len({id(error) for error in errors}) == 3
+
+
+def test_cancelled_item_is_not_written(commits):
+    started, release = threading.Event(), threading.Event()
+    written = []
+
+    def write_batch(cur, items):
+        started.set()
+        release.wait(5)
+        written.extend(items)
+        return items
+
+    committer = make_committer(write_batch, max_batch=1)
+    first = committer.submit('first')
+    assert started.wait(5)
+    # Queued behind the running batch; its caller gives up waiting.
+    second = committer.submit('second')
+    with pytest.raises(TimeoutError):
+        second.result(timeout=0.01)
+    assert second.cancel()
+    third = committer.submit('third')
+    release.set()
+    assert first.result(timeout=5) == 'first'
+    assert third.result(timeout=5) == 'third'
+    assert written == ['first', 'third']
@@ -0,0 +1,94 @@
+import pytest
+from flask import Flask, jsonify
+
+import app.idempotency as idempotency
+from app.idempotency import idempotent
+
+
+class FakeKeyStore:
+    """In-memory stand-in for relyexchange.idempotency_keys, as _claim and _finish use it."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def claim(self, scope, key, fingerprint):
+        existing = self.rows.get((scope, key))
+        if existing:
+            return existing
+        self.rows[(scope, key)] = (fingerprint, 'in_progress', None, None)
+        return None
+
+    def finish(self, scope, key, response):
+        if response is not None and response.status_code < 500 and response.is_json:
+            fingerprint = self.rows[(scope, key)][0]
+            self.rows[(scope, key)] = (fingerprint, 'done', response.status_code, response.get_json())
+        else:
+            del self.rows[(scope, key)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = FakeKeyStore()
+    monkeypatch.setattr(idempotency, '_claim', store.claim)
+    monkeypatch.setattr(idempotency, '_finish', store.finish)
+
+    app = Flask(__name__)
+    calls = []
+
+    @app.route('/things', methods=['POST'])
+    @idempotent
+    def create_thing():
+        calls.append(1)
+        if app.config.get('FAIL'):
+            return jsonify({'error': 'boom'}), 500
+        return jsonify({'thing': len(calls)}), 201
+
+    client = app.test_client()
+    client.calls = calls
+    client.store = store
+    client.application = app
+    return client
+
+
+def fingerprint(client, body):
+    with client.application.test_request_context('/things', method='POST', json=body):
+        return idempotency.request_fingerprint()
+
+
+def test_repeat_is_replayed_without_running_again(client):
+    headers = {'Idempotency-Key': 'k1'}
+    first = client.post('/things', json={'name': 'a'}, headers=headers)
+    second = client.post('/things', json={'name': 'a'}, headers=headers)
+    assert first.status_code == second.status_code == 201
+    assert second.get_json() == first.get_json() == {'thing': 1}
+    assert second.headers['Idempotent-Replayed'] == 'true'
+    assert len(client.calls) == 1
+
+
+def test_key_reused_for_another_request_is_rejected(client):
+    client.post('/things', json={'name': 'a'}, headers={'Idempotency-Key': 'k1'})
+    response = client.post('/things', json={'name': 'b'}, headers={'Idempotency-Key': 'k1'})
+    assert response.status_code == 422
+    assert len(client.calls) == 1
+
+
+def test_repeat_while_in_progress_gets_409(client):
+    client.store.rows[('create_thing', 'k1')] = (fingerprint(client, {'name': 'a'}), 'in_progress', None, None)
+    response = client.post('/things', json={'name': 'a'}, headers={'Idempotency-Key': 'k1'})
+    assert response.status_code == 409
+    assert response.headers['Retry-After'] == '1'
+    assert not client.calls
+
+
+def test_server_error_frees_the_key(client):
+    client.application.config['FAIL'] = True
+    assert client.post('/things', json={}, headers={'Idempotency-Key': 'k1'}).status_code == 500
+    client.application.config['FAIL'] = False
+    assert client.post('/things', json={}, headers={'Idempotency-Key': 'k1'}).status_code == 201
+    assert len(client.calls) == 2
+
+
+def test_requests_without_a_key_always_run(client):
+    client.post('/things', json={})
+    client.post('/things', json={})
+    assert len(client.calls) == 2
@@ -0,0 +1,50 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.pagination import (
+    decode_cursor, decode_since_cursor, encode_cursor, encode_since_cursor, parse_page_limit
+)
+
+ROW_ID = '0f8fad5b-d9cb-469f-a165-70867728950e'
+
+
+def test_keyset_cursor_round_trip():
+    created_at = datetime(2026, 3, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    cursor = encode_cursor(created_at, ROW_ID)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (created_at, ROW_ID)
+
+
+def test_since_cursor_round_trip():
+    assert decode_since_cursor(encode_since_cursor(42, ROW_ID)) == (42, ROW_ID)
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor',
+    '',
+    encode_since_cursor(1, ROW_ID),
+    encode_cursor(datetime(2026, 1, 1), 'not-a-uuid'),
+])
+def test_decode_cursor_rejects_foreign_tokens(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor',
+    encode_cursor(datetime(2026, 1, 1), ROW_ID),
+    encode_since_cursor('1', ROW_ID),
+    encode_since_cursor(1, 'not-a-uuid'),
+])
+def test_decode_since_cursor_rejects_foreign_tokens(cursor):
+    with pytest.raises(ValueError):
+        decode_since_cursor(cursor)
+
+
+def test_parse_page_limit():
+    assert parse_page_limit({}, 20, 100) == 20
+    assert parse_page_limit({'limit': '100'}, 20, 100) == 100
+    for raw in ('0', '101', 'ten', '2.5'):
+        with pytest.raises(ValueError):
+            parse_page_limit({'limit': raw}, 20, 100)